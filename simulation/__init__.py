@@ -0,0 +1,7 @@
+"""
+Hardware-free simulation of the thermostat: a thermal model of a room, a relay and sensor wired to it, and a virtual clock that makes
+`asyncio.sleep` instant so long runs finish in seconds. Used for tests and for benchmarking control strategies.
+"""
+from .clock import VirtualClock, VirtualClockEventLoop, run_simulation
+from .plant import ThermalPlant, daily_outdoor_temperature
+from .devices import SimulatedRelay, SimulatedSensor
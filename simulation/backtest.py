@@ -0,0 +1,209 @@
+import argparse
+import itertools
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import NamedTuple, Optional
+import numpy as np
+from utils.control_strategy import create_strategy
+from utils.protected_relay import ProtectedRelay
+from utils.thermal_model import ThermalModelFitter, ThermalModelParameters, load_thermal_model
+
+"""
+Backtests control strategies against a zone's recorded `temperature_logs`.
+
+The recorded outdoor temperatures and target changes are replayed through a thermal model of the room (fitted by `utils.thermal_model`),
+with each strategy deciding when the simulated relay is on. As in the service, the relay is held for the zone's minimum on and off times by
+a `ProtectedRelay`, and the predictive strategy coasts for the model's lag unless given a `coast_time`. This answers "how would this strategy, or this hysteresis, have done over the
+last winter?" from real data rather than guesswork.
+
+The replay is prepared with NumPy: the recorded series are resampled onto the control grid and the model's per-step decay factors are
+precomputed, leaving only the strategy decisions in the sequential inner loop. Every strategy and hysteresis combination is replayed in
+parallel in a process pool.
+
+Usage:
+    python -m simulation.backtest --zone 3 --strategy hysteresis predictive --hysteresis 0.2 0.3 0.5 0.8
+"""
+
+class ReplayData(NamedTuple):
+    times: np.ndarray # Seconds since the start of the replay, one per control tick.
+    outdoor: np.ndarray # Recorded outdoor temperature at each tick.
+    target: np.ndarray # Recorded target temperature at each tick.
+    initial_temperature: float # The recorded indoor temperature at the start.
+    recorded_heating_hours: float # How long the relay was actually on over the same period.
+
+class BacktestResult(NamedTuple):
+    strategy: str
+    options: dict
+    heating_hours: float # Simulated relay-on time.
+    max_overshoot: float # The furthest the room rose above target, in °C.
+    mean_overshoot: float # The mean excess above target while above it, in °C.
+    hours_out_of_band: float # Time spent further than the hysteresis from the target.
+    switch_count: int # Number of times the relay changed state.
+
+def prepare_replay(history: dict, control_interval: float = 60.0) -> ReplayData:
+    """Resamples recorded history (as returned by `database.fetch_temperature_history`) onto a fixed control grid."""
+    timestamps = np.asarray(history['timestamp'], dtype=np.float64)
+    if len(timestamps) < 2:
+        raise ValueError("Not enough history to backtest.")
+
+    times = np.arange(0.0, timestamps[-1] - timestamps[0], control_interval)
+    grid = timestamps[0] + times
+
+    # Outdoor temperature is interpolated, skipping rows where it wasn't recorded. Targets are held until they next change.
+    outdoor = np.asarray(history['outdoor_temp'], dtype=np.float64)
+    known = np.isfinite(outdoor)
+    if not np.any(known):
+        raise ValueError("No outdoor temperatures were logged in this history, so it can't be replayed through the thermal model.")
+    outdoor_on_grid = np.interp(grid, timestamps[known], outdoor[known])
+    target = np.asarray(history['target_temp'], dtype=np.float64)
+    target_on_grid = target[np.searchsorted(timestamps, grid, side='right') - 1]
+
+    # Each recorded heating state lasts until the next row, ignoring gaps where the thermostat wasn't running.
+    heating = np.asarray(history['heating_status'], dtype=np.float64)
+    durations = np.minimum(np.diff(timestamps), 2 * np.median(np.diff(timestamps)))
+    recorded_heating_hours = float(np.dot(heating[:-1], durations) / 3600.0)
+
+    return ReplayData(times, outdoor_on_grid, target_on_grid, float(history['indoor_temp'][0]), recorded_heating_hours)
+
+class _SimulatedRelay:
+    """The relay behind the replay's `ProtectedRelay`, which just records its state."""
+    is_active = False
+
+    def turn_on(self):
+        self.is_active = True
+
+    def turn_off(self):
+        self.is_active = False
+
+    def force_off(self):
+        self.is_active = False
+
+    def cleanup(self):
+        pass
+
+def replay(data: ReplayData, model: ThermalModelParameters, strategy_name: str, options: dict, min_on_time: float = 0.0, min_off_time: float = 0.0) -> BacktestResult:
+    """
+    Replays recorded conditions through the thermal model with a strategy controlling the simulated relay.
+
+    Parameters:
+    options (dict): Passed to the strategy. The predictive strategy's `coast_time` defaults to the model's lag, as in the service.
+    min_on_time (float): Seconds the simulated relay must stay on before switching off (the zone's `min_on_time`).
+    min_off_time (float): Seconds the simulated relay must stay off before switching on.
+    """
+    strategy = create_strategy(strategy_name, **options)
+    if strategy_name == 'predictive' and 'coast_time' not in options:
+        strategy.coast_time = model.lag_minutes * 60
+    step = float(data.times[1] - data.times[0]) if len(data.times) > 1 else 60.0
+
+    # The exact solution of the first-order model over one step: T' = T_eq + (T - T_eq) * decay, with T_eq depending on the heating.
+    decay = math.exp(-model.heat_loss_per_hour * step / 3600.0)
+    heating_offset = model.heating_gain_per_hour / model.heat_loss_per_hour if model.heat_loss_per_hour > 0 else 0.0
+    lag_steps = int(round(model.lag_minutes * 60.0 / step))
+    outdoor = data.outdoor.tolist()
+    target = data.target.tolist()
+    times = data.times.tolist()
+
+    # A ring of past relay states provides the lagged heating input.
+    relay_history = [False] * (lag_steps + 1)
+    is_active = False
+    clock = [0.0]
+    relay = ProtectedRelay(_SimulatedRelay(), name='backtest', min_on_time=min_on_time, min_off_time=min_off_time, stats_path=None, clock=lambda: clock[0])
+    temperature = data.initial_temperature
+    temperatures = np.empty(len(times))
+    relay_states = np.empty(len(times), dtype=bool)
+
+    for i, now in enumerate(times):
+        temperatures[i] = temperature
+        clock[0] = now
+        if strategy.should_heat(temperature, target[i], is_active, now):
+            relay.turn_on()
+        else:
+            relay.turn_off()
+        is_active = relay.is_active
+        relay_states[i] = is_active
+        relay_history[i % (lag_steps + 1)] = is_active
+        lagged_heating = relay_history[(i + 1) % (lag_steps + 1)] if lag_steps else is_active
+        equilibrium = outdoor[i] + (heating_offset if lagged_heating else 0.0)
+        temperature = equilibrium + (temperature - equilibrium) * decay
+
+    # Scoring is vectorized over the whole replay.
+    excess = temperatures - data.target
+    overshoot = excess[excess > 0]
+    return BacktestResult(
+        strategy=strategy_name,
+        options=options,
+        heating_hours=float(relay_states.sum() * step / 3600.0),
+        max_overshoot=float(overshoot.max()) if len(overshoot) else 0.0,
+        mean_overshoot=float(overshoot.mean()) if len(overshoot) else 0.0,
+        hours_out_of_band=float((np.abs(excess) > strategy.hysteresis).sum() * step / 3600.0),
+        switch_count=int(np.count_nonzero(np.diff(relay_states.astype(np.int8))))
+    )
+
+# The replay data is sent to each worker process once, rather than with every task.
+_worker_data = None
+_worker_model = None
+_worker_relay_times = (0.0, 0.0)
+
+def _initialise_worker(data, model, relay_times):
+    global _worker_data, _worker_model, _worker_relay_times
+    _worker_data = data
+    _worker_model = model
+    _worker_relay_times = relay_times
+
+def _replay_in_worker(strategy_name, options):
+    return replay(_worker_data, _worker_model, strategy_name, options, *_worker_relay_times)
+
+def backtest(data: ReplayData, model: ThermalModelParameters, candidates: list, max_workers: Optional[int] = None, min_on_time: float = 0.0, min_off_time: float = 0.0) -> list:
+    """Replays every (strategy name, options) candidate in parallel, returning results in the same order."""
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_initialise_worker, initargs=(data, model, (min_on_time, min_off_time))) as executor:
+        futures = [executor.submit(_replay_in_worker, name, options) for name, options in candidates]
+        return [future.result() for future in futures]
+
+def main():
+    from utils.database import DatabasePool, fetch_temperature_history
+    from utils.zones import Zone, load_zones
+
+    parser = argparse.ArgumentParser(description="Backtest control strategies against a zone's recorded history.")
+    parser.add_argument('--zone', type=int, required=True, help="The zone to replay.")
+    parser.add_argument('--since', type=datetime.fromisoformat, help="Only replay history from this date (i.e. 2024-01-01).")
+    parser.add_argument('--strategy', nargs='+', default=['hysteresis', 'predictive'], help="Strategies to compare.")
+    parser.add_argument('--hysteresis', nargs='+', type=float, default=[0.5], help="Hysteresis values to try with each strategy.")
+    parser.add_argument('--control-interval', type=float, default=60, help="Seconds between simulated control decisions.")
+    parser.add_argument('--workers', type=int, help="Worker processes. Defaults to one per CPU.")
+    parser.add_argument('--min-on-time', type=float, help="Seconds the relay must stay on. Defaults to the zone's `min_on_time` in the zone registry.")
+    parser.add_argument('--min-off-time', type=float, help="Seconds the relay must stay off. Defaults to the zone's `min_off_time` in the zone registry.")
+    args = parser.parse_args()
+
+    zone = next((zone for zone in load_zones() if zone.zone == args.zone), None)
+    min_on_time = args.min_on_time if args.min_on_time is not None else zone.min_on_time if zone else Zone._field_defaults['min_on_time']
+    min_off_time = args.min_off_time if args.min_off_time is not None else zone.min_off_time if zone else Zone._field_defaults['min_off_time']
+
+    pool = DatabasePool(max_connections=1)
+    try:
+        history = fetch_temperature_history(pool, args.zone, since=args.since)
+    finally:
+        pool.close()
+
+    # Use the zone's stored thermal model, fitting one from this history if there isn't one yet.
+    model = load_thermal_model(args.zone)
+    if model is None:
+        fitter = ThermalModelFitter()
+        fitter.add(history['timestamp'], history['indoor_temp'], history['outdoor_temp'], history['heating_status'])
+        model = fitter.solve()
+        if model is None:
+            raise SystemExit(f"Not enough history to fit a thermal model for zone {args.zone}.")
+
+    start = time.monotonic()
+    data = prepare_replay(history, args.control_interval)
+    candidates = [(name, {'hysteresis': hysteresis}) for name, hysteresis in itertools.product(args.strategy, args.hysteresis)]
+    results = backtest(data, model, candidates, args.workers, min_on_time, min_off_time)
+
+    print(f"Replayed {len(data.times) * args.control_interval / 86400:.1f} days of zone {args.zone} in {time.monotonic() - start:.1f}s. Recorded heating: {data.recorded_heating_hours:.1f}h.")
+    print(f"{'Strategy':<12} {'Hyst.':>6} {'Heating':>9} {'Max over':>9} {'Mean over':>10} {'Out of band':>12} {'Switches':>9}")
+    for result in results:
+        print(f"{result.strategy:<12} {result.options['hysteresis']:>6.2f} {result.heating_hours:>8.1f}h {result.max_overshoot:>8.2f}° {result.mean_overshoot:>9.2f}° {result.hours_out_of_band:>11.1f}h {result.switch_count:>9}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import asyncio
+import logging
+import time
+from typing import NamedTuple
+from utils.control_strategy import ControlStrategy, create_strategy
+from utils.temperature_sampler import TemperatureSampler
+from utils.thermostat import Thermostat
+from .clock import run_simulation
+from .devices import SimulatedRelay, SimulatedSensor
+from .plant import ThermalPlant
+
+"""
+Benchmarks control strategies against a simulated room on a virtual clock, so a month of control runs in seconds on any Linux box.
+
+Usage:
+    python -m simulation.benchmark --days 30 --strategy hysteresis predictive
+
+The control loop ticks every `control_interval` seconds of virtual time. It defaults to 60 seconds rather than the live 5 seconds: each tick
+costs the same real time however little virtual time passes, and underfloor heating changes far too slowly for the difference to show.
+"""
+
+class BenchmarkResult(NamedTuple):
+    strategy: str
+    days: float
+    max_overshoot: float # The furthest the room rose above target, in °C.
+    mean_overshoot: float # The mean excess above target while above it, in °C.
+    hours_out_of_band: float # Time spent further than the strategy's hysteresis from the target.
+    relay_cycles: int # Number of times the relay switched on.
+    heating_hours: float # Time the relay was on; a proxy for boiler energy.
+    wall_seconds: float # Real time the simulation took.
+
+async def _simulate(strategy: ControlStrategy, days: float, target_temperature: float, plant_options: dict, noise: float, monitor_interval: float, control_interval: float):
+    loop = asyncio.get_running_loop()
+    clock = loop.clock
+    plant = ThermalPlant(**plant_options)
+    relay = SimulatedRelay(plant, clock)
+    sensor = SimulatedSensor({None: plant}, clock, noise=noise)
+    sampler = TemperatureSampler(sensor.read_temp, interval=control_interval, clock=clock)
+    thermostat = Thermostat(relay, target_temperature, sampler=sampler, strategy=strategy, control_interval=control_interval)
+
+    await sampler.start()
+    await thermostat.start()
+
+    samples = 0
+    overshoot_total = 0.0
+    overshoot_samples = 0
+    max_overshoot = 0.0
+    out_of_band_samples = 0
+    end = clock.now + days * 86400
+    while clock.now < end:
+        await asyncio.sleep(monitor_interval)
+        excess = plant.temperature_at(clock.now) - target_temperature
+        samples += 1
+        if excess > 0:
+            max_overshoot = max(max_overshoot, excess)
+            overshoot_total += excess
+            overshoot_samples += 1
+        if abs(excess) > strategy.hysteresis:
+            out_of_band_samples += 1
+
+    await thermostat.stop()
+    await sampler.stop()
+
+    return max_overshoot, overshoot_total / max(overshoot_samples, 1), out_of_band_samples * monitor_interval / 3600.0, relay.cycle_count, relay.on_seconds / 3600.0
+
+def benchmark_strategy(strategy: ControlStrategy, name: str = None, days: float = 30, target_temperature: float = 20.0, plant_options: dict = None, noise: float = 0.02, monitor_interval: float = 60, control_interval: float = 60) -> BenchmarkResult:
+    """Runs a strategy against a simulated room for `days` of virtual time and measures how well it held the target."""
+    # The control loop logs every tick, which would dominate a month long run.
+    thermostat_logger = logging.getLogger('utils.thermostat')
+    previous_level = thermostat_logger.level
+    thermostat_logger.setLevel(logging.WARNING)
+    start = time.monotonic()
+    try:
+        metrics = run_simulation(_simulate(strategy, days, target_temperature, plant_options or {}, noise, monitor_interval, control_interval))
+    finally:
+        thermostat_logger.setLevel(previous_level)
+    return BenchmarkResult(name or type(strategy).__name__, days, *metrics, wall_seconds=time.monotonic() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark thermostat control strategies against a simulated room.")
+    parser.add_argument('--days', type=float, default=30, help="Days of virtual time to simulate.")
+    parser.add_argument('--strategy', nargs='+', default=['hysteresis', 'predictive'], help="Strategies to compare.")
+    parser.add_argument('--target', type=float, default=20.0, help="Target temperature in °C.")
+    parser.add_argument('--lag', type=float, default=60, help="Underfloor heating lag in minutes.")
+    parser.add_argument('--control-interval', type=float, default=60, help="Seconds of virtual time between control loop ticks.")
+    args = parser.parse_args()
+
+    print(f"{'Strategy':<12} {'Max over':>9} {'Mean over':>10} {'Out of band':>12} {'Cycles':>7} {'Heating':>9} {'Wall':>6}")
+    for name in args.strategy:
+        result = benchmark_strategy(create_strategy(name), name=name, days=args.days, target_temperature=args.target, plant_options={'lag_minutes': args.lag}, control_interval=args.control_interval)
+        print(f"{result.strategy:<12} {result.max_overshoot:>8.2f}° {result.mean_overshoot:>9.2f}° {result.hours_out_of_band:>11.1f}h {result.relay_cycles:>7} {result.heating_hours:>8.1f}h {result.wall_seconds:>5.1f}s")
+
+if __name__ == "__main__":
+    main()
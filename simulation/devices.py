@@ -0,0 +1,62 @@
+import random
+from utils.relay_protocol import RelayProtocol
+from utils.temperature_utils import TemperatureInfo
+from .clock import VirtualClock
+from .plant import ThermalPlant
+
+class SimulatedRelay(RelayProtocol):
+    """
+    A relay wired to a `ThermalPlant` instead of a GPIO pin. It counts switch cycles and on-time, which stand in for relay wear and the
+    energy used by the boiler.
+    """
+    def __init__(self, plant: ThermalPlant, clock: VirtualClock):
+        self._plant = plant
+        self._clock = clock
+        self._is_active = False
+        self._switched_on_at = None
+        self.cycle_count = 0
+        self._completed_on_seconds = 0.0
+
+    @property
+    def is_active(self) -> bool:
+        return self._is_active
+
+    @property
+    def on_seconds(self) -> float:
+        running = self._clock.now - self._switched_on_at if self._is_active else 0.0
+        return self._completed_on_seconds + running
+
+    def turn_on(self) -> None:
+        if not self._is_active:
+            self._is_active = True
+            self._switched_on_at = self._clock.now
+            self.cycle_count += 1
+            self._plant.set_heating(True, self._clock.now)
+
+    def turn_off(self) -> None:
+        if self._is_active:
+            self._is_active = False
+            self._completed_on_seconds += self._clock.now - self._switched_on_at
+            self._plant.set_heating(False, self._clock.now)
+
+    def cleanup(self) -> None:
+        self.turn_off()
+
+class SimulatedSensor:
+    """
+    A DS18B20 reading a `ThermalPlant`. It's a drop-in for `temperature_utils.read_temp` when building a `TemperatureSampler`, and quantizes
+    to the sensor's 1/16°C resolution with optional seeded noise so runs are repeatable.
+    """
+    RESOLUTION = 0.0625
+
+    def __init__(self, plants: dict, clock: VirtualClock, noise: float = 0.0, seed: int = 0):
+        self._plants = plants # Sensor ID to ThermalPlant.
+        self._clock = clock
+        self._noise = noise
+        self._random = random.Random(seed)
+
+    async def read_temp(self, sensor_id=None) -> TemperatureInfo:
+        plant = self._plants[sensor_id]
+        temperature = plant.temperature_at(self._clock.now) + (self._random.gauss(0, self._noise) if self._noise else 0.0)
+        celcius = round(temperature / self.RESOLUTION) * self.RESOLUTION
+        return TemperatureInfo(celcius=celcius, fahrenheit=celcius * 9.0 / 5.0 + 32.0)
@@ -0,0 +1,53 @@
+import bisect
+import math
+from typing import Callable
+
+class ThermalPlant:
+    """
+    A deterministic simulated room, following the same first-order RC model as `utils.thermal_model`:
+
+        dT/dt = -heat_loss * (T - T_outdoor) + heating_gain * heating(t - lag)
+
+    with time in hours. The model is integrated in small fixed steps whenever its temperature is read, so it can be driven by any clock.
+
+    Key Attributes:
+        _temperature (float): The room temperature at `_last_update`.
+        _switches (list): Times the relay switched, and `_states` what it switched to, for looking up the lagged heating state.
+        _outdoor_temperature (callable): Outdoor temperature in °C given the time in seconds.
+
+    Methods:
+        set_heating(on, now): Records the relay switching at `now`.
+        temperature_at(now): Advances the model to `now` and returns the room temperature.
+    """
+    def __init__(self, initial_temperature: float = 18.0, heat_loss_per_hour: float = 0.1, heating_gain_per_hour: float = 2.0, lag_minutes: float = 60, outdoor_temperature: Callable[[float], float] = None, step_seconds: float = 30.0):
+        self._temperature = initial_temperature
+        self._heat_loss = heat_loss_per_hour
+        self._heating_gain = heating_gain_per_hour
+        self._lag = lag_minutes * 60.0
+        self._outdoor_temperature = outdoor_temperature if outdoor_temperature is not None else daily_outdoor_temperature()
+        self._step = step_seconds
+        self._last_update = 0.0
+        self._switches = [-math.inf]
+        self._states = [False]
+
+    def heating_at(self, time: float) -> bool:
+        return self._states[bisect.bisect_right(self._switches, time) - 1]
+
+    def set_heating(self, on: bool, now: float):
+        self.temperature_at(now)
+        if self._states[-1] != on:
+            self._switches.append(now)
+            self._states.append(on)
+
+    def temperature_at(self, now: float) -> float:
+        while self._last_update < now:
+            step = min(self._step, now - self._last_update)
+            heating = self._heating_gain if self.heating_at(self._last_update - self._lag) else 0.0
+            rate_per_hour = -self._heat_loss * (self._temperature - self._outdoor_temperature(self._last_update)) + heating
+            self._temperature += rate_per_hour * step / 3600.0
+            self._last_update += step
+        return self._temperature
+
+def daily_outdoor_temperature(mean: float = 5.0, swing: float = 4.0) -> Callable[[float], float]:
+    """An outdoor temperature that's coldest at 4am and warmest at 4pm."""
+    return lambda time: mean - swing * math.cos((time / 3600.0 - 4.0) / 24.0 * 2 * math.pi)
@@ -1,110 +1,436 @@
+from utils.startup import StartupTimer
+startup_timer = StartupTimer() # Started before anything else is imported, so the timings include imports.
+
 import argparse
 import asyncio
-from utils.thermostat import Thermostat
+from utils.thermostat import MAX_MONITOR_INTERVAL, Thermostat
 from utils.relay import Relay
-from utils.homekit_thermostat import HKThermostat, TargetHeatingCoolingState
-from utils.data_logger import DataLogger
+from utils.protected_relay import ProtectedRelay
+from utils.temperature_sampler import TemperatureSampler
+from utils.temperature_utils import default_backend
+from utils.zones import load_zones
+from utils.control_strategy import create_strategy
+from utils.tick_scheduler import AdaptiveTickScheduler
+from utils.history import ZoneHistory
+from utils.schedule import ScheduleRunner
+from utils.snapshot import DEFAULT_SNAPSHOT_FILE, ZoneSnapshot, load_snapshot, save_snapshot
+from utils.structured_logging import configure_logging, stop_logging
+from utils.event_bus import EventBus, COALESCE, ControlDecision, ModeChanged, ModeRequested, RelaySwitched, TargetTemperatureChanged, TargetTemperatureRequested, TemperatureSampled
 import time
-from pyhap.accessory_driver import AccessoryDriver
 import signal
+from datetime import datetime, timezone
+import os
 from enum import Enum, unique
 import logging
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+# Days of full resolution history kept in memory per zone (see `history.py`).
+HISTORY_DAYS = 7
+
+# State snapshots (see `snapshot.py`) are saved this often, and shortly after the target, mode or relay changes.
+SNAPSHOT_INTERVAL = 300
+SNAPSHOT_DEBOUNCE = 5
+# How much recent history is kept in each snapshot.
+SNAPSHOT_HISTORY_SECONDS = 6 * 3600
+
+configure_logging()
+
+def _import_services():
+    """
+    Imports the 'smart' subsystems: HomeKit, database logging, weather and email. Between them they pull in pyhap, aiohttp, psycopg2, dotenv
+    and smtplib, which take seconds to import from a cold SD card on a Pi 3, so they're imported in a worker thread once the control loop is
+    already running.
+    """
+    import utils.homekit_thermostat
+    import utils.homekit_sync
+    import utils.data_logger
+    import utils.database
+    import utils.log_buffer
+    import utils.error_reporter
+    import utils.weather_api
+    import utils.thermal_model
+    import utils.optimal_start
 
 class SmartThermostat:
     """
-    Sets up a smart thermostat. The key purpose is to coordinate between the 'dumb' thermostat (`thermostat.py`) and the HomeKit integration (`homekit_thermostat.py`).
+    Sets up a smart thermostat. The key purpose is to coordinate between the 'dumb' thermostats (`thermostat.py`) and the HomeKit integration (`homekit_thermostat.py`).
+    
+    Each zone in the zone registry (`zones.py`) gets its own `Thermostat`, relay channel and HomeKit accessory. The accessories are exposed
+    through a single HomeKit bridge and every thermostat shares one `TemperatureSampler`, so all sensors are read together each tick.
+
+    The components don't call each other: thermostats publish samples, decisions and relay switches to an `EventBus`, and HomeKit publishes
+    requested changes. Each subscriber (the history, the HomeKit sync, the data logger) has its own bounded queue, so none of them can hold up a control loop.
+
+    Startup is in two stages so the heating recovers quickly after a power cut. The core (zones, relays, sensors and control loops) only
+    imports local modules and starts first; sensors are discovered on their first read and retried every tick until they appear. The 'smart'
+    services (HomeKit, data logging, weather and error emails) are then imported and started in the background. `startup_timer` logs how long
+    each stage took, including the time to the first control decision.
+
+    The zones' state is snapshotted to disk (`snapshot.py`) and restored when the core starts, so after a restart each zone resumes with its
+    target, heating mode, relay timings and recent history, and HomeKit starts out reporting them rather than its own defaults.
     
     Note: All temperature is handled in celcius.
 
     Key Attributes:
-        _heating_relay (Relay): Relay object controlling the heating element.
-        _target_temperature_celcius (float): Desired temperature in Celsius. Defaults to 20.0°C.
-        _hysteresis (float): Temperature leeway in determining when to activate/deactivate the relay. Set to 0.5°C.
+        zones (list): The `Zone`s being controlled.
+        sampler (TemperatureSampler): Sampler shared by every zone's thermostat.
+        event_bus (EventBus): Connects the thermostats, HomeKit, the data logger and the history.
+        thermostats (dict): Maps each zone identifier to its `Thermostat`.
+        relays (dict): Maps each zone identifier to its `ProtectedRelay`, which tracks relay wear and boiler runtime.
+        homekit_thermostats (dict): Maps each zone identifier to its `HKThermostat` accessory, once HomeKit has started.
+        homekit_sync (HomeKitSync): Sends meaningful temperature changes and the relay state to the accessories.
+        histories (dict): Maps each zone identifier to its in-memory `ZoneHistory`, recorded every time the temperature is monitored.
+        schedule_runner (ScheduleRunner): Sets each scheduled zone's target temperature as its schedule (`schedule.py`) comes due.
+        optimal_start (OptimalStart): Brings scheduled rises forward for zones with `optimal_start`, once the services have started.
+        services_task (asyncio.Task): Imports and runs the 'smart' services.
 
     Methods:
-        set_target_temperature_celcius(temperature): Sets a new target temperature.
-        start_thermostat(): Starts the control loop in an asynchronous task to monitor and control temperature.
-        register_for_temperature_did_change_notification(callback): Registers a callback to be invoked with the latest temperature reading.
-        start_monitoring_current_temperature(): If you've registed for notifcations, this starts the observation process for current temperature.
-        shutdown(): Performs cleanup actions, particularly for GPIO resources used by the relay. Once shutdown has been called, you cannot restart.
+        start_thermostat(): Starts the temperature monitoring, then HomeKit and the data logger.
+        shutdown(): Stops all zones and cleans up resources. Once shutdown has been called, you cannot restart.
     """
     
     # Initialization
 
-    def __init__(self, loop):
+    def __init__(self, loop, startup_timer: StartupTimer = None):
         self._logger = logging.getLogger(__name__)
         self.loop = loop
-        self.thermostat_task = None
+        self._startup_timer = startup_timer if startup_timer is not None else StartupTimer()
+        self.thermostat_tasks = {}
+        self.subscriber_tasks = []
         self.driver_task = None
+        self.services_task = None
+        self.zones = load_zones()
 
-        # Setup thermostat
-        relay = Relay(pin=26)
-        self.thermostat = Thermostat(relay)
-        self.thermostat.register_for_temperature_did_change_notification(self.thermostat_temperature_did_change)
-        
-        # Setup HomeKit integration
-        self.driver = AccessoryDriver(port=51826, loop=self.loop)
-        self.homekit_thermostat = HKThermostat(self.driver, "Office Thermostat")
-        self.homekit_thermostat.register_for_heating_cooling_state_did_change_notifications(self.heating_cooling_state_did_change)
-        self.homekit_thermostat.register_for_target_temperature_did_change_notifications(self.target_temperature_did_change)
-        self.driver.add_accessory(accessory=self.homekit_thermostat)
-        signal.signal(signal.SIGTERM, self.driver.signal_handler)
-        
-        self.data_logger = DataLogger(zone=3)
+        # The sampler owns the sensors so every zone's control loop, monitor loop and the data logger share one reading per tick, and the
+        # backend converts every sensor at once. The zones' loops read as often as they need to, so the background read is only a backstop.
+        self.sampler = TemperatureSampler(default_backend.read, sensor_ids=[zone.sensor_id for zone in self.zones], interval=MAX_MONITOR_INTERVAL, read_many_function=default_backend.read_many)
+        self.event_bus = EventBus()
+
+        self.thermostats = {}
+        self.strategies = {}
+        self.relays = {}
+        self.homekit_thermostats = {}
+        self.histories = {}
+        self.thermal_models = {}
+
+        # Created in the background by `_start_services()`.
+        self.driver = None
+        self.bridge = None
+        self.homekit_sync = None
+        self.optimal_start = None
+        self.log_buffer = None
+        self.error_reporter = None
+        self.log_writer = None
+        self.weather_client = None
+        self.data_logger = None
+        self.http_server = None
+        self.read_pool = None
+
+        for zone in self.zones:
+            strategy = create_strategy(zone.strategy, **(zone.strategy_options or {}))
+            relay = ProtectedRelay(Relay(pin=zone.relay_pin), name=str(zone.relay_pin), min_on_time=zone.min_on_time, min_off_time=zone.min_off_time)
+            tick_scheduler = AdaptiveTickScheduler(min_interval=zone.min_interval, max_interval=zone.max_interval)
+            thermostat = Thermostat(relay, sampler=self.sampler, sensor_id=zone.sensor_id, strategy=strategy, zone=zone.zone, event_bus=self.event_bus, tick_scheduler=tick_scheduler)
+            self.strategies[zone.zone] = strategy
+            self.relays[zone.zone] = relay
+            self.thermostats[zone.zone] = thermostat
+            self.histories[zone.zone] = ZoneHistory(days=HISTORY_DAYS, sample_interval=10) # The monitor loop reports at most every 10 seconds.
+
+        # Like `ZONES_FILE`, `SCHEDULE_FILE` is read before `.env` is loaded, so the scheduled targets apply straight after a power cut.
+        self.schedule_runner = ScheduleRunner(self.scheduled_target_did_change)
+
+        # Like `ZONES_FILE`, `SNAPSHOT_FILE` is read before `.env` is loaded.
+        self._snapshot_path = os.getenv("SNAPSHOT_FILE", DEFAULT_SNAPSHOT_FILE)
+        self.restored_at = None
+        self.restored_state = self._restore_snapshot()
+
+        # Until HomeKit's driver takes over SIGTERM, treat it like Ctrl+C so the relays are still cleaned up.
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        self._startup_timer.mark("Zones configured")
         
     # Public Methods
         
     async def start_thermostat(self):
+        # Subscribe before anything publishes, so the first sample and decision aren't missed.
+        self.subscriber_tasks = [
+            asyncio.create_task(self._handle_temperature_samples(self.event_bus.subscribe([TemperatureSampled]))),
+            asyncio.create_task(self._handle_control_decisions(self.event_bus.subscribe([ControlDecision], policy=COALESCE))),
+            # Only the latest request per zone matters if HomeKit sends several before they're applied.
+            asyncio.create_task(self._handle_homekit_requests(self.event_bus.subscribe([TargetTemperatureRequested, ModeRequested], policy=COALESCE)))
+        ]
+        await self.sampler.start()
+        for thermostat in self.thermostats.values():
+            await thermostat.start_monitoring_current_temperature()
+        # Restored targets are kept unless the schedule changed while the service was down.
+        self.subscriber_tasks.append(asyncio.create_task(self.schedule_runner.run(self.restored_at, set(self.restored_state))))
+        # Resume heating in the zones it was enabled in, without waiting for HomeKit.
+        for zone, snapshot in self.restored_state.items():
+            if snapshot.heating_enabled:
+                self.thermostat_tasks[zone] = asyncio.create_task(self.thermostats[zone].start())
+        self.subscriber_tasks.append(asyncio.create_task(self._snapshot_periodically(self.event_bus.subscribe([TargetTemperatureChanged, ModeChanged, RelaySwitched], policy=COALESCE))))
+        self._startup_timer.mark("Control loops ready")
+
         self._logger.info("Starting HomeKit integration...")
-        self.driver_task = asyncio.create_task(self.driver.async_start())  
-        await self.thermostat.start_monitoring_current_temperature()
-        
-        self.data_logger.set_temperature_callback(self.thermostat.current_temperature_celcius)
-        self.data_logger.set_target_temperature_callback(self.thermostat.target_temperature_celcius)
-        self.data_logger.set_is_active_callback(self.thermostat.is_active)
-        await self.data_logger.log_data_periodically()
-        
+        self.services_task = asyncio.create_task(self._start_services())
+        await self.services_task
         
     async def shutdown(self):
         self._logger.info("Shutting down thermostat...")
+        await self._save_snapshot() # Before anything's stopped, so it records the running state.
+        await self._cancel_and_await_task(self.services_task, "Services")
+        self.services_task = None
+        for task in self.subscriber_tasks:
+            await self._cancel_and_await_task(task, "Event subscriber")
+        self.subscriber_tasks = []
+
+        # Cancel and await each zone's thermostat task if it exists
+        for zone, thermostat in self.thermostats.items():
+            await self._cancel_and_await_task(self.thermostat_tasks.pop(zone, None), f"Zone {zone} thermostat")
+            await thermostat.shutdown()
+        await self.sampler.stop()
 
-      # Cancel and await the thermostat task if it exists
-        await self._cancel_and_await_task(self.thermostat_task, "Thermostat")
-        await self.thermostat.shutdown()
-        self.thermostat_task = None  # Reset the task to None after cancellation
+        # The services may not have finished starting.
+        if self.log_writer is not None:
+            await asyncio.to_thread(self.log_writer.stop) # Flushes any logs still waiting to be written.
+        if self.weather_client is not None:
+            await self.weather_client.close()
+        if self.error_reporter is not None:
+            await self.error_reporter.stop()
+        if self.http_server is not None:
+            await self.http_server.stop()
+        if self.read_pool is not None:
+            self.read_pool.close()
             
         # Cancel and await the driver task if it exists
         await self._cancel_and_await_task(self.driver_task, "Driver")
         self.driver_task = None  # Ensure the task reference is cleared
         
-    def thermostat_temperature_did_change(self, new_temperature):
-        self._logger.info("Current temperature did change to: %s°C. Updating HomeKit.", new_temperature)
-        self.homekit_thermostat.set_current_temperature(new_temperature)
-    
-    def heating_cooling_state_did_change(self, new_state):
-        self._logger.info("HomeKit heating cooling state did change to: %s. Updating Thermostat.", new_state)
+    def zone_states(self) -> list:
+        """The current state of every zone, as served by the history API."""
+        states = []
+        for zone in self.zones:
+            thermostat = self.thermostats[zone.zone]
+            latest = self.histories[zone.zone].latest()
+            states.append({
+                'zone': zone.zone,
+                'name': zone.name,
+                'current_temperature': latest['indoor_temp'] if latest else None,
+                'target_temperature': thermostat.target_temperature_celcius(),
+                'heating': thermostat.is_active(),
+                'relay_cycles': self.relays[zone.zone].cycle_count,
+                'heating_hours': round(self.relays[zone.zone].on_seconds / 3600, 2),
+                'updated_at': latest['timestamp'] if latest else None
+            })
+        return states
+
+    def thermostat_temperature_did_change(self, sample: TemperatureSampled):
+        self._startup_timer.mark("First temperature reading")
+        outdoor_temperature = self.weather_client.cached_temperature() if self.weather_client is not None else None
+        self.histories[sample.zone].append(sample.timestamp, sample.temperature, outdoor_temperature, sample.target_temperature, sample.heating)
+
+    def heating_mode_was_requested(self, zone, heating_enabled):
+        self._logger.info("Zone %s HomeKit heating %s. Updating Thermostat.", zone, "enabled" if heating_enabled else "disabled")
+        thermostat = self.thermostats[zone]
         
         # Cancel any existing thermostat task before starting a new action
-        if self.thermostat_task:
-            self.thermostat_task.cancel()
-            self.thermostat_task = None  # Clear the existing task
+        existing_task = self.thermostat_tasks.pop(zone, None)
+        if existing_task:
+            existing_task.cancel()
             
-        # Depending on the new state, schedule the start or stop coroutine
-        if new_state in (TargetHeatingCoolingState.HEAT, TargetHeatingCoolingState.AUTO):
-            # Schedule the thermostat start coroutine without waiting for it
-            self.thermostat_task = asyncio.create_task(self.thermostat.start())
-        elif new_state in (TargetHeatingCoolingState.OFF, TargetHeatingCoolingState.COOL):
-            # Schedule the thermostat stop coroutine without waiting for it
-            self.thermostat_task = asyncio.create_task(self.thermostat.stop())
+        # Schedule the start or stop coroutine without waiting for it
+        self.thermostat_tasks[zone] = asyncio.create_task(thermostat.start() if heating_enabled else thermostat.stop())
             
-    def target_temperature_did_change(self, new_temperature):
-        self._logger.info("HomeKit target temperature did change to: %s. Updating Thermostat.", new_temperature)
-        self.thermostat.set_target_temperature_celcius(new_temperature)
+    def target_temperature_was_requested(self, zone, new_temperature):
+        self._logger.info("Zone %s HomeKit target temperature did change to: %s. Updating Thermostat.", zone, new_temperature)
+        self.thermostats[zone].set_target_temperature_celcius(new_temperature)
+
+    def scheduled_target_did_change(self, zone, new_temperature):
+        thermostat = self.thermostats.get(zone)
+        if thermostat is None:
+            self._logger.warning("Zone %s is in the schedule but isn't configured. Ignoring it.", zone)
+            return
+        thermostat.set_target_temperature_celcius(new_temperature)
         
     # Private Methods
+
+    async def _start_services(self):
+        """Imports the 'smart' services in a worker thread, so the control loop keeps running, then starts them."""
+        await asyncio.to_thread(_import_services)
+        self._startup_timer.mark("Services imported")
+        from pyhap.accessory import Bridge
+        from pyhap.accessory_driver import AccessoryDriver
+        from utils.homekit_thermostat import HKThermostat
+        from utils.homekit_sync import HomeKitSync
+        from utils.data_logger import DataLogger
+        from utils.database import TemperatureLogWriter
+        from utils.log_buffer import LogBuffer
+        from utils.error_reporter import ErrorReporter
+        from utils.weather_api import WeatherClient
+        from utils.thermal_model import ThermalModelParameters, load_thermal_model
+        from utils.optimal_start import OptimalStart
+        from utils.database import DatabasePool
+        from utils.http_server import HttpServer
+        from utils.history_api import HistoryApi
+        from utils.metrics import add_metrics_route
+
+        # Setup HomeKit integration. Each zone is an accessory on the bridge.
+        self.driver = AccessoryDriver(port=51826, loop=self.loop)
+        self.bridge = Bridge(self.driver, "ThermoPi Bridge")
+        # Logs go to a local buffer first and are written in batches from a background thread, so they survive the database being down
+        # and can be taken far more often than they're flushed.
+        self.log_buffer = LogBuffer(os.getenv("LOG_BUFFER_DIR", "log_buffer"))
+        self.error_reporter = ErrorReporter()
+        self.log_writer = TemperatureLogWriter(self.log_buffer, batch_size=int(os.getenv("DB_BATCH_SIZE", 50)), flush_interval=float(os.getenv("DB_FLUSH_INTERVAL", 60)), on_error=self.error_reporter.report_error)
+        self.weather_client = WeatherClient(ttl=float(os.getenv("WEATHER_CACHE_TTL", 900)))
+        self.data_logger = DataLogger(self.log_writer, self.weather_client, self.error_reporter, self.event_bus, interval=float(os.getenv("LOG_INTERVAL", 600)))
+
+        for zone in self.zones:
+            # Fitted offline by `python -m utils.thermal_model`. The model's lag is how long the floor keeps heating after the relay turns off.
+            thermal_model = load_thermal_model(zone.zone)
+            if thermal_model is None and zone.zone in self.restored_state and self.restored_state[zone.zone].model is not None:
+                thermal_model = ThermalModelParameters(**self.restored_state[zone.zone].model)
+            self.thermal_models[zone.zone] = thermal_model
+            if zone.strategy == 'predictive' and thermal_model is not None and 'coast_time' not in (zone.strategy_options or {}):
+                self.strategies[zone.zone].coast_time = thermal_model.lag_minutes * 60
+
+            homekit_thermostat = HKThermostat(self.driver, zone.name, zone=zone.zone, event_bus=self.event_bus)
+            # Start out reporting the thermostat's (possibly restored) state, rather than HomeKit's defaults.
+            thermostat = self.thermostats[zone.zone]
+            latest = self.histories[zone.zone].latest()
+            homekit_thermostat.update_state(temperature=latest['indoor_temp'] if latest else None, heating=thermostat.is_active(), target_temperature=thermostat.target_temperature_celcius(), heating_enabled=thermostat.is_running())
+            self.bridge.add_accessory(homekit_thermostat)
+            self.homekit_thermostats[zone.zone] = homekit_thermostat
+
+        # Zones using optimal start pre-heat for scheduled rises in target, using their thermal model and the forecast.
+        optimal_start_models = {zone.zone: self.thermal_models[zone.zone] for zone in self.zones if zone.optimal_start}
+        self.optimal_start = OptimalStart(self.schedule_runner, optimal_start_models, self._forecast_temperature_at, self.scheduled_target_did_change, self.event_bus)
+        self.subscriber_tasks.append(asyncio.create_task(self.optimal_start.run()))
+
+        self.driver.add_accessory(accessory=self.bridge)
+        # Only meaningful changes (and a periodic heartbeat) are sent to paired devices, along with the real relay state.
+        self.homekit_sync = HomeKitSync(self.homekit_thermostats, self.event_bus, temperature_delta=float(os.getenv("HOMEKIT_TEMPERATURE_DELTA", 0.2)), heartbeat=float(os.getenv("HOMEKIT_HEARTBEAT", 600)))
+        self.subscriber_tasks.append(asyncio.create_task(self.homekit_sync.run()))
+        signal.signal(signal.SIGTERM, self.driver.signal_handler)
+
+        # The local API for dashboards, and metrics for scraping. Instrumentation is off (and close to free) unless it's enabled.
+        http_port = os.getenv("HTTP_PORT")
+        if http_port:
+            # Unauthenticated, so it's only served beyond this machine if HTTP_HOST is set (i.e. to 0.0.0.0).
+            self.http_server = HttpServer(host=os.getenv("HTTP_HOST", "127.0.0.1"), port=int(http_port))
+            self.read_pool = DatabasePool(max_connections=1)
+            HistoryApi(self.histories, self.zone_states, pool=self.read_pool).add_routes(self.http_server)
+            if os.getenv("METRICS_ENABLED", "false").lower() == "true":
+                add_metrics_route(self.http_server)
+            await self.http_server.start()
+
+        self.driver_task = asyncio.create_task(self.driver.async_start())
+        await self.error_reporter.start()
+        self.log_writer.start()
+        await self.weather_client.start()
+        self._startup_timer.mark("Services started")
+        self._report_startup_if_complete()
+
+        await self.data_logger.log_data_periodically()
    
+    async def _handle_temperature_samples(self, subscription):
+        async for sample in subscription:
+            try:
+                self.thermostat_temperature_did_change(sample)
+            except Exception as e:
+                self._logger.error(f"Error handling temperature sample for zone {sample.zone}: {e}", exc_info=True)
+
+    async def _handle_control_decisions(self, subscription):
+        # Only the first decision matters, for the startup report.
+        await subscription.get()
+        subscription.close()
+        self._startup_timer.mark("First control decision")
+        self._report_startup_if_complete()
+
+    async def _handle_homekit_requests(self, subscription):
+        async for request in subscription:
+            try:
+                if isinstance(request, TargetTemperatureRequested):
+                    self.target_temperature_was_requested(request.zone, request.temperature)
+                else:
+                    self.heating_mode_was_requested(request.zone, request.heating_enabled)
+            except Exception as e:
+                self._logger.error(f"Error applying HomeKit request {request}: {e}", exc_info=True)
+
+    def snapshot_zones(self) -> list:
+        """Every zone's current state, for a state snapshot."""
+        now = time.time()
+        snapshots = []
+        for zone in self.zones:
+            thermostat = self.thermostats[zone.zone]
+            relay = self.relays[zone.zone]
+            model = self.thermal_models.get(zone.zone)
+            if model is None and zone.zone in self.restored_state:
+                model = self.restored_state[zone.zone].model # The services haven't loaded the models yet.
+            snapshots.append(ZoneSnapshot(
+                zone=zone.zone,
+                target_temperature=thermostat.target_temperature_celcius(),
+                heating_enabled=thermostat.is_running(),
+                relay_active=relay.is_active,
+                relay_seconds_in_state=relay.seconds_in_state,
+                model=model._asdict() if hasattr(model, '_asdict') else model,
+                history=self.histories[zone.zone].samples(since=now - SNAPSHOT_HISTORY_SECONDS)
+            ))
+        return snapshots
+
+    def _restore_snapshot(self) -> dict:
+        """Restores each zone's state from the last snapshot, returning the restored `ZoneSnapshot`s by zone identifier."""
+        snapshot = load_snapshot(self._snapshot_path)
+        if snapshot is None:
+            return {}
+        saved_at, zones = snapshot
+        self.restored_at = saved_at
+        seconds_since_saved = max(time.time() - saved_at, 0.0)
+        zones_by_id = {zone.zone: zone for zone in self.zones}
+        restored = {}
+        for zone_snapshot in zones:
+            if zone_snapshot.zone not in self.thermostats:
+                continue # The zone has since been removed from the zones file.
+            zone = zone_snapshot.zone
+            self.thermostats[zone].set_target_temperature_celcius(zone_snapshot.target_temperature)
+            self.relays[zone].restore(zone_snapshot.relay_active, zone_snapshot.relay_seconds_in_state, seconds_since_saved)
+            history = zone_snapshot.history
+            for row in zip(history['timestamp'], history['indoor_temp'], history['outdoor_temp'], history['target_temp'], history['heating_status']):
+                self.histories[zone].append(*row)
+            model = zone_snapshot.model
+            if model is not None and zones_by_id[zone].strategy == 'predictive' and 'coast_time' not in (zones_by_id[zone].strategy_options or {}):
+                self.strategies[zone].coast_time = model['lag_minutes'] * 60
+            restored[zone] = zone_snapshot
+        self._logger.info("Restored state for %s zone(s) from a snapshot taken %.0f seconds ago.", len(restored), seconds_since_saved)
+        return restored
+
+    async def _save_snapshot(self):
+        try:
+            zones = self.snapshot_zones()
+            await asyncio.to_thread(save_snapshot, time.time(), zones, self._snapshot_path)
+        except Exception as e:
+            self._logger.error(f"Failed to save state snapshot: {e}", exc_info=True)
+        # Relay stats are saved on the same schedule (and by `cleanup()` at shutdown) rather than on the event loop at every switch.
+        for relay in self.relays.values():
+            await asyncio.to_thread(relay.save_stats)
+
+    async def _snapshot_periodically(self, subscription):
+        while True:
+            try:
+                await asyncio.wait_for(subscription.get(), timeout=SNAPSHOT_INTERVAL)
+                # Changes come in bursts (i.e. dragging the target in the Home app), so let them settle before saving.
+                await asyncio.sleep(SNAPSHOT_DEBOUNCE)
+                subscription.drain()
+            except asyncio.TimeoutError:
+                pass
+            await self._save_snapshot()
+
+    def _forecast_temperature_at(self, timestamp: float):
+        return self.weather_client.cached_temperature(datetime.fromtimestamp(timestamp, timezone.utc))
+
+    def _report_startup_if_complete(self):
+        # The first control decision can come before or after the services start (it waits on HomeKit for the heating mode).
+        if self._startup_timer.elapsed("First control decision") is not None and self._startup_timer.elapsed("Services started") is not None:
+            self._startup_timer.report()
+
     async def _cancel_and_await_task(self, task, task_name):
         """
         Cancels the given asyncio Task and waits for it to finish.
@@ -125,7 +451,7 @@ class SmartThermostat:
 if __name__ == "__main__":
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop) # This sets the global event loop and prevents clashing between HAP-Python asyncio.
-    controller = SmartThermostat(loop)
+    controller = SmartThermostat(loop, startup_timer)
 
     try:
         loop.run_until_complete(controller.start_thermostat())
@@ -138,4 +464,5 @@ if __name__ == "__main__":
     finally:
         logging.info("Shutting down gracefully...")
         loop.run_until_complete(controller.shutdown())  # Ensure everything is stopped properly
-        loop.close()
\ No newline at end of file
+        loop.close()
+        stop_logging() # Writes out anything still queued.
\ No newline at end of file
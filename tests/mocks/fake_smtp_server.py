@@ -0,0 +1,71 @@
+import socketserver
+import threading
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Speaks just enough plain SMTP for smtplib to send a message."""
+
+    def handle(self):
+        server = self.server
+        server.connection_count += 1
+        self._reply('220 fake-smtp ready')
+        in_data = False
+        lines = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            line = line.decode('utf-8').rstrip('\r\n')
+            if in_data:
+                if line == '.':
+                    in_data = False
+                    server.messages.append('\n'.join(lines))
+                    lines = []
+                    self._reply('250 OK')
+                else:
+                    lines.append(line[1:] if line.startswith('..') else line)
+                continue
+
+            command = line.split(' ', 1)[0].upper()
+            if command == 'EHLO':
+                self._reply('250 fake-smtp')
+            elif command in ('HELO', 'MAIL', 'RCPT', 'RSET', 'NOOP'):
+                self._reply('250 OK')
+            elif command == 'DATA':
+                in_data = True
+                self._reply('354 End data with <CR><LF>.<CR><LF>')
+            elif command == 'QUIT':
+                self._reply('221 Bye')
+                return
+            else:
+                self._reply('502 Command not implemented')
+
+    def _reply(self, message):
+        self.wfile.write((message + '\r\n').encode('utf-8'))
+
+class FakeSMTPServer(socketserver.ThreadingTCPServer):
+    """
+    A local SMTP server that records every message it receives, so emails can be tested without a network or a Gmail account.
+
+    Attributes:
+        messages (list): The raw message of every email received.
+        connection_count (int): Number of SMTP connections made.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _SMTPHandler)
+        self.messages = []
+        self.connection_count = 0
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
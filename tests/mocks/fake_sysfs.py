@@ -0,0 +1,35 @@
+import os
+import tempfile
+
+class FakeSysfs:
+    """A temporary directory laid out like `/sys/bus/w1/devices/` with a w1-therm bus master and DS18B20s."""
+
+    def __init__(self, bulk_read: bool = True):
+        self._directory = tempfile.TemporaryDirectory()
+        self.base_dir = self._directory.name
+        self.bus_master = os.path.join(self.base_dir, 'w1_bus_master1')
+        os.mkdir(self.bus_master)
+        if bulk_read:
+            self._write(os.path.join(self.bus_master, 'therm_bulk_read'), '0\n')
+
+    def add_sensor(self, sensor_id: str, celcius: float, temperature_attribute: bool = True, crc_ok: bool = True):
+        os.makedirs(os.path.join(self.base_dir, sensor_id), exist_ok=True)
+        self.set_temperature(sensor_id, celcius, temperature_attribute, crc_ok)
+
+    def set_temperature(self, sensor_id: str, celcius: float, temperature_attribute: bool = True, crc_ok: bool = True):
+        millidegrees = round(celcius * 1000)
+        if temperature_attribute:
+            self._write(os.path.join(self.base_dir, sensor_id, 'temperature'), f'{millidegrees}\n')
+        self._write(os.path.join(self.base_dir, sensor_id, 'w1_slave'),
+            f"54 01 4b 46 7f ff 0c 10 fd : crc=fd {'YES' if crc_ok else 'NO'}\n54 01 4b 46 7f ff 0c 10 fd t={millidegrees}\n")
+
+    def bulk_read_contents(self) -> str:
+        with open(os.path.join(self.bus_master, 'therm_bulk_read')) as f:
+            return f.read()
+
+    def cleanup(self):
+        self._directory.cleanup()
+
+    def _write(self, path: str, contents: str):
+        with open(path, 'w') as f:
+            f.write(contents)
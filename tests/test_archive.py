@@ -0,0 +1,86 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from utils.archive import export_zone, load_export_state, part_path, save_export_state, split_by_month
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+def row(day, month=1, hour=0):
+    return (datetime(2024, month, day, hour), 20.0, None if hour % 2 else 5.0, bool(hour % 3), 21.0)
+
+class FakePartWriter:
+    written = {}
+
+    def __init__(self, path, file_format, compression):
+        self.path = path
+        self.last_timestamp = None
+        FakePartWriter.written[path] = []
+
+    def write(self, rows):
+        FakePartWriter.written[self.path].extend(rows)
+        self.last_timestamp = rows[-1][0]
+
+    def close(self):
+        pass
+
+class ArchiveTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        FakePartWriter.written = {}
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_split_by_month(self):
+        rows = [row(30), row(31), row(1, month=2), row(2, month=2)]
+
+        self.assertEqual([len(run) for run in split_by_month(rows)], [2, 2])
+
+    def test_export_state_round_trips(self):
+        save_export_state(self.directory.name, {3: datetime(2024, 1, 31, 23, 50)})
+
+        self.assertEqual(load_export_state(self.directory.name), {3: datetime(2024, 1, 31, 23, 50)})
+        self.assertEqual(load_export_state(os.path.join(self.directory.name, 'missing')), {})
+
+    def test_writes_one_part_per_month_and_records_progress_as_each_closes(self):
+        progress = []
+        batches = [[row(30), row(31)], [row(31, hour=12), row(1, month=2)], [row(2, month=2)]]
+
+        count = export_zone(batches, 3, self.directory.name, on_file_closed=progress.append, writer_factory=FakePartWriter)
+
+        self.assertEqual(count, 5)
+        self.assertEqual(list(FakePartWriter.written), [part_path(self.directory.name, 3, datetime(2024, 1, 30)), part_path(self.directory.name, 3, datetime(2024, 2, 1))])
+        self.assertEqual(progress, [datetime(2024, 1, 31, 12), datetime(2024, 2, 2)])
+
+    def test_interrupted_export_only_records_finished_files(self):
+        progress = []
+
+        def batches():
+            yield [row(30), row(1, month=2)]
+            raise ConnectionError("Database went away")
+
+        with self.assertLogs('utils.archive', level='WARNING'), self.assertRaises(ConnectionError):
+            export_zone(batches(), 3, self.directory.name, on_file_closed=progress.append, writer_factory=FakePartWriter)
+        self.assertEqual(progress, [datetime(2024, 1, 30)], "February's file wasn't finished, so it should be exported again next time.")
+
+    @unittest.skipUnless(pyarrow, "pyarrow isn't installed.")
+    def test_parquet_and_arrow_files_read_back_as_a_hive_dataset(self):
+        import pyarrow.dataset as ds
+        rows = [row(31, hour=hour) for hour in range(4)]
+        for file_format in ('parquet', 'arrow'):
+            output = os.path.join(self.directory.name, file_format)
+            export_zone([rows], 3, output, file_format=file_format, compression='zstd')
+
+            table = ds.dataset(output, format='parquet' if file_format == 'parquet' else 'ipc', partitioning='hive').to_table()
+
+            self.assertEqual(table.column('zone').to_pylist(), [3] * 4)
+            self.assertEqual(table.column('outdoor_temp').to_pylist(), [5.0, None, 5.0, None])
+            self.assertEqual(table.column('timestamp').to_pylist(), [r[0] for r in rows])
+
+if __name__ == '__main__':
+    unittest.main()
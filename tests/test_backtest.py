@@ -0,0 +1,77 @@
+import unittest
+import numpy as np
+from simulation.backtest import backtest, prepare_replay, replay
+from utils.thermal_model import ThermalModelParameters
+
+MODEL = ThermalModelParameters(heat_loss_per_hour=0.1, heating_gain_per_hour=2.0, lag_minutes=60, rmse=0.0, samples=0)
+
+def make_history(days=3, step_minutes=10):
+    timestamps = np.arange(0, days * 86400, step_minutes * 60.0)
+    return {
+        'timestamp': timestamps.tolist(),
+        'indoor_temp': [19.0] * len(timestamps),
+        'outdoor_temp': [5.0 if i % 5 else float('nan') for i in range(len(timestamps))], # Some outdoor readings missing.
+        'heating_status': [i % 2 for i in range(len(timestamps))],
+        'target_temp': [20.0 if t < 86400 else 21.0 for t in timestamps], # The target changes after a day.
+    }
+
+class BacktestTests(unittest.TestCase):
+
+    def test_replay_is_resampled_onto_control_grid(self):
+        data = prepare_replay(make_history(), control_interval=60)
+
+        self.assertEqual(data.times[1] - data.times[0], 60, "The replay should tick at the control interval.")
+        self.assertFalse(np.any(np.isnan(data.outdoor)), "Missing outdoor readings should be interpolated.")
+        self.assertEqual(data.target[-1], 21.0, "Target changes should be replayed.")
+
+    def test_replay_holds_the_target(self):
+        data = prepare_replay(make_history(), control_interval=60)
+
+        result = replay(data, MODEL, 'hysteresis', {'hysteresis': 0.5})
+
+        self.assertGreater(result.switch_count, 0, "The simulated relay should switch.")
+        self.assertGreater(result.heating_hours, 0, "The simulated relay should spend time on.")
+        self.assertLess(result.max_overshoot, 3.0, "The room should be held near the target.")
+
+    def test_predictive_strategy_reduces_overshoot(self):
+        data = prepare_replay(make_history(), control_interval=60)
+
+        hysteresis = replay(data, MODEL, 'hysteresis', {'hysteresis': 0.5})
+        predictive = replay(data, MODEL, 'predictive', {'hysteresis': 0.5, 'coast_time': 3600})
+
+        self.assertLess(predictive.max_overshoot, hysteresis.max_overshoot, "Predictive control should overshoot less on the replay.")
+
+    def test_predictive_strategy_coasts_for_the_model_lag_by_default(self):
+        data = prepare_replay(make_history(), control_interval=60)
+
+        default = replay(data, MODEL, 'predictive', {'hysteresis': 0.5})
+        lag = replay(data, MODEL, 'predictive', {'hysteresis': 0.5, 'coast_time': MODEL.lag_minutes * 60})
+
+        self.assertEqual(default, lag._replace(options=default.options), "The coast time should default to the model's lag, as in the service.")
+
+    def test_minimum_on_and_off_times_hold_the_relay(self):
+        data = prepare_replay(make_history(), control_interval=60)
+
+        free = replay(data, MODEL, 'hysteresis', {'hysteresis': 0.1})
+        held = replay(data, MODEL, 'hysteresis', {'hysteresis': 0.1}, min_on_time=7200, min_off_time=7200)
+
+        self.assertLess(held.switch_count, free.switch_count, "The relay shouldn't switch faster than its minimum on and off times allow.")
+
+    def test_history_without_outdoor_temperatures_is_rejected(self):
+        history = make_history()
+        history['outdoor_temp'] = [float('nan')] * len(history['timestamp'])
+
+        with self.assertRaises(ValueError):
+            prepare_replay(history)
+
+    def test_candidates_are_replayed_in_parallel_in_order(self):
+        data = prepare_replay(make_history(days=1), control_interval=60)
+        candidates = [('hysteresis', {'hysteresis': 0.2}), ('hysteresis', {'hysteresis': 0.8})]
+
+        results = backtest(data, MODEL, candidates, max_workers=2)
+
+        self.assertEqual([result.options['hysteresis'] for result in results], [0.2, 0.8], "Results should match the order of the candidates.")
+        self.assertGreater(results[0].switch_count, results[1].switch_count, "A tighter hysteresis should switch the relay more often.")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import unittest
+from utils.control_strategy import HysteresisStrategy, PredictiveStrategy, RollingSlope, create_strategy
+
+class HysteresisStrategyTests(unittest.TestCase):
+
+    def setUp(self):
+        self.sut = HysteresisStrategy(hysteresis=0.5)
+
+    def test_turns_on_below_target_minus_hysteresis(self):
+        self.assertTrue(self.sut.should_heat(19.4, 20.0, False, 0), "The heating should turn on below the lower threshold.")
+
+    def test_stays_off_within_hysteresis(self):
+        self.assertFalse(self.sut.should_heat(19.6, 20.0, False, 0), "The heating should stay off within the hysteresis band.")
+
+    def test_stays_on_within_hysteresis(self):
+        self.assertTrue(self.sut.should_heat(20.4, 20.0, True, 0), "The heating should stay on within the hysteresis band.")
+
+    def test_turns_off_above_target_plus_hysteresis(self):
+        self.assertFalse(self.sut.should_heat(20.6, 20.0, True, 0), "The heating should turn off above the upper threshold.")
+
+class RollingSlopeTests(unittest.TestCase):
+
+    def test_slope_of_linear_readings(self):
+        sut = RollingSlope(window=100)
+        for t in range(10):
+            sut.add(t * 10, 20 + t * 0.1)
+
+        self.assertAlmostEqual(sut.slope, 0.01, msg="The slope should match the rate of change per second.")
+
+    def test_old_readings_leave_the_window(self):
+        sut = RollingSlope(window=30)
+        for t in range(10):
+            sut.add(t * 10, 20.0) # Flat...
+        for t in range(10, 14):
+            sut.add(t * 10, 20 + (t - 9) * 0.5) # ...then rising.
+
+        self.assertAlmostEqual(sut.slope, 0.05, msg="Only readings within the window should count towards the slope.")
+
+    def test_no_slope_until_enough_readings(self):
+        sut = RollingSlope(window=100)
+        sut.add(0, 20.0)
+
+        self.assertIsNone(sut.slope, "A single reading has no slope.")
+
+class PredictiveStrategyTests(unittest.TestCase):
+
+    def test_turns_off_early_when_coast_will_reach_target(self):
+        sut = PredictiveStrategy(hysteresis=0.5, window=900, coast_time=1800)
+        decisions = [sut.should_heat(19.0 + t * 0.001 * 60, 20.0, True, t * 60) for t in range(10)] # Rising 0.06°C a minute.
+
+        self.assertFalse(decisions[-1], "The relay should turn off while still below target because the floor will coast past it.")
+        self.assertTrue(decisions[0], "The relay should stay on before there's enough history to predict.")
+
+    def test_keeps_heating_when_rising_slowly(self):
+        sut = PredictiveStrategy(hysteresis=0.5, window=900, coast_time=1800)
+        decisions = [sut.should_heat(18.0 + t * 0.00001 * 60, 20.0, True, t * 60) for t in range(10)]
+
+        self.assertTrue(decisions[-1], "The relay should stay on when the coast won't reach the target.")
+
+    def test_create_strategy_by_name(self):
+        self.assertIsInstance(create_strategy('predictive', coast_time=60), PredictiveStrategy, "Strategies should be created from their zone config name.")
+        with self.assertRaises(ValueError):
+            create_strategy('unknown')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import asyncio
+import time
+import unittest
+from utils.data_logger import DataLogger
+from utils.event_bus import EventBus, TemperatureSampled
+
+class FakeWriter:
+    def __init__(self):
+        self.rows = []
+
+    def write(self, row):
+        self.rows.append(row)
+
+class UnavailableWeather:
+    async def get_temperature(self):
+        raise RuntimeError("No forecast.")
+
+class FakeErrorReporter:
+    def __init__(self):
+        self.errors = []
+
+    def report_error(self, error_message):
+        self.errors.append(error_message)
+
+class DataLoggerTests(unittest.IsolatedAsyncioTestCase):
+
+    async def test_samples_are_logged_without_an_outdoor_temperature_when_the_weather_is_unavailable(self):
+        bus = EventBus()
+        writer = FakeWriter()
+        errors = FakeErrorReporter()
+        sut = DataLogger(writer, UnavailableWeather(), errors, bus, interval=0.05)
+
+        task = asyncio.create_task(sut.log_data_periodically())
+        await asyncio.sleep(0)
+        bus.publish(TemperatureSampled(1, 19.5, 20.0, True, time.time()))
+        await asyncio.sleep(0.08)
+        task.cancel()
+
+        self.assertEqual(len(writer.rows), 1, "The sample shouldn't be lost when the weather API is down.")
+        self.assertIsNone(writer.rows[0].outdoor_temp)
+        self.assertEqual(writer.rows[0].indoor_temp, 19.5)
+        self.assertEqual(errors.errors, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import tempfile
+import threading
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+from utils.database import TemperatureLog, TemperatureLogWriter
+from utils.log_buffer import LogBuffer
+
+def make_log(zone=3):
+    return TemperatureLog(zone=zone, indoor_temp=20.0, outdoor_temp=5.0, heating_status=False, target_temp=21.0, timestamp=datetime.now())
+
+class FakePool:
+    def close(self):
+        pass
+
+class TemperatureLogWriterTests(unittest.TestCase):
+
+    def setUp(self):
+        self.batches = []
+        self.failures_remaining = 0
+        self.written = threading.Event()
+        self.directory = tempfile.TemporaryDirectory()
+        self.buffer = LogBuffer(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _fake_insert(self, pool, rows):
+        if self.failures_remaining > 0:
+            self.failures_remaining -= 1
+            raise Exception("Database write failed: connection refused")
+        self.batches.append(list(rows))
+        self.written.set()
+
+    # Patch where the writer looks up insert_temperature_logs, so no database is needed.
+    @patch('utils.database.insert_temperature_logs')
+    def test_rows_are_flushed_in_one_batch_when_batch_size_reached(self, mock_insert):
+        mock_insert.side_effect = self._fake_insert
+        sut = TemperatureLogWriter(self.buffer, pool=FakePool(), sync_interval=0.05, batch_size=3, flush_interval=60, manage_schema=False)
+        for zone in (1, 2, 3):
+            sut.write(make_log(zone))
+
+        sut.start()
+        self.written.wait(2)
+        sut.stop()
+
+        self.assertEqual(len(self.batches), 1, "The rows should be written in a single batch.")
+        self.assertEqual([row.zone for row in self.batches[0]], [1, 2, 3], "Every queued row should be written in order.")
+
+    @patch('utils.database.insert_temperature_logs')
+    def test_rows_are_flushed_after_flush_interval(self, mock_insert):
+        mock_insert.side_effect = self._fake_insert
+        sut = TemperatureLogWriter(self.buffer, pool=FakePool(), sync_interval=0.05, batch_size=100, flush_interval=0.1, manage_schema=False)
+        sut.start()
+
+        sut.write(make_log())
+
+        self.assertTrue(self.written.wait(2), "A partial batch should be flushed once the flush interval passes.")
+        sut.stop()
+
+    @patch('utils.database.insert_temperature_logs')
+    def test_failed_batch_is_retried(self, mock_insert):
+        mock_insert.side_effect = self._fake_insert
+        self.failures_remaining = 1
+        errors = []
+        sut = TemperatureLogWriter(self.buffer, pool=FakePool(), sync_interval=0.05, batch_size=1, flush_interval=60, on_error=errors.append, manage_schema=False)
+        sut.write(make_log())
+
+        sut.start()
+        self.assertTrue(self.written.wait(3), "The batch should be retried once the database is reachable.")
+        sut.stop()
+
+        self.assertEqual(len(errors), 1, "The failure should be reported.")
+        self.assertEqual(len(self.batches[0]), 1, "The retried batch should still contain the row.")
+
+    @patch('utils.database.insert_temperature_logs')
+    def test_backlog_is_replayed_in_large_batches(self, mock_insert):
+        mock_insert.side_effect = self._fake_insert
+        for zone in range(5):
+            self.buffer.append(make_log(zone))
+        self.buffer.sync()
+        sut = TemperatureLogWriter(self.buffer, pool=FakePool(), batch_size=1, drain_batch_size=2, sync_interval=0.05, manage_schema=False)
+
+        sut.start()
+        sut.stop()
+
+        self.assertEqual([len(batch) for batch in self.batches], [2, 2, 1], "A backlog should be drained in batches of the drain batch size.")
+
+    @patch('utils.database.insert_temperature_logs')
+    def test_stop_flushes_waiting_rows(self, mock_insert):
+        mock_insert.side_effect = self._fake_insert
+        sut = TemperatureLogWriter(self.buffer, pool=FakePool(), sync_interval=0.05, batch_size=100, flush_interval=60, manage_schema=False)
+        sut.start()
+        sut.write(make_log())
+
+        sut.stop()
+
+        self.assertEqual(len(self.batches), 1, "Stopping the writer should flush rows that are still waiting.")
+
+    @patch('utils.schema.maintain')
+    @patch('utils.schema.migrate')
+    @patch('utils.database.insert_temperature_logs')
+    def test_schema_is_migrated_once_before_the_first_write(self, mock_insert, mock_migrate, mock_maintain):
+        calls = []
+        mock_migrate.side_effect = lambda pool: calls.append('migrate') or []
+        mock_insert.side_effect = lambda pool, rows: calls.append('insert')
+        sut = TemperatureLogWriter(self.buffer, pool=FakePool(), sync_interval=0.05, batch_size=1, flush_interval=60)
+        sut.start()
+        sut.write(make_log())
+        sut.write(make_log())
+
+        sut.stop()
+
+        self.assertEqual(calls[0], 'migrate')
+        self.assertEqual(calls.count('migrate'), 1, "Migrations should only be checked before the first write.")
+        self.assertEqual(mock_maintain.call_count, 1, "Maintenance should run daily rather than on every drain.")
+
+if __name__ == '__main__':
+    unittest.main()
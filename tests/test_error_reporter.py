@@ -0,0 +1,104 @@
+import asyncio
+import threading
+import unittest
+from utils.error_reporter import ErrorReporter, FingerprintStore, fingerprint
+from utils.send_email import EmailSender
+from mocks.fake_smtp_server import FakeSMTPServer
+
+class FingerprintTests(unittest.TestCase):
+
+    def test_variable_parts_are_normalised(self):
+        first = fingerprint("Database write failed: could not connect to server on port 5432 (pid 1234)")
+        second = fingerprint("Database write failed: could not connect to server on port 5433 (pid 9876)")
+
+        self.assertEqual(first, second, "Errors differing only by numbers should share a fingerprint.")
+
+    def test_different_zones_are_different_errors(self):
+        self.assertNotEqual(fingerprint("Error reading temperature for zone 1"), fingerprint("Error reading temperature for zone 3"), "Short numbers like zone IDs should be kept.")
+
+    def test_store_is_size_capped(self):
+        sut = FingerprintStore(max_size=2, ttl=100)
+        for key in ('a', 'b', 'c'):
+            sut.should_report(key, 0)
+
+        self.assertEqual(len(sut), 2, "The store shouldn't grow beyond its maximum size.")
+        self.assertTrue(sut.should_report('a', 1), "The least recently reported fingerprint should have been evicted.")
+
+    def test_store_expires_after_ttl(self):
+        sut = FingerprintStore(ttl=100)
+        sut.should_report('a', 0)
+
+        self.assertFalse(sut.should_report('a', 99), "A repeated error within the TTL shouldn't be reported.")
+        self.assertTrue(sut.should_report('a', 100), "A repeated error after the TTL should be reported again.")
+
+class ErrorReporterTests(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.smtp_server = FakeSMTPServer()
+        self.smtp_server.start()
+        sender = EmailSender(host='127.0.0.1', port=self.smtp_server.port, use_ssl=False, from_email='thermopi@example.com', app_password='', to_email='me@example.com')
+        self.sut = ErrorReporter(sender=sender, digest_window=0.2)
+        await self.sut.start()
+
+    async def asyncTearDown(self):
+        await self.sut.stop()
+        self.smtp_server.stop()
+
+    async def test_errors_close_together_are_sent_as_one_digest(self):
+        self.sut.report_error("Sensor unplugged")
+        self.sut.report_error("Weather API unavailable")
+
+        await asyncio.sleep(0.5)
+
+        self.assertEqual(len(self.smtp_server.messages), 1, "Errors arriving together should be sent in one email.")
+        self.assertIn("Error Report (2 errors)", self.smtp_server.messages[0], "The digest should say how many errors it contains.")
+
+    async def test_errors_reported_before_start_are_sent_once_started(self):
+        await self.sut.stop()
+        sender = EmailSender(host='127.0.0.1', port=self.smtp_server.port, use_ssl=False, from_email='thermopi@example.com', app_password='', to_email='me@example.com')
+        self.sut = ErrorReporter(sender=sender, digest_window=0.2)
+
+        self.sut.report_error("Database unreachable during startup")
+        await self.sut.start()
+        await asyncio.sleep(0.5)
+
+        self.assertEqual(len(self.smtp_server.messages), 1, "An error reported while the services start shouldn't be lost.")
+        self.assertIn("Database unreachable during startup", self.smtp_server.messages[0])
+
+    async def test_repeated_errors_are_only_sent_once(self):
+        self.sut.report_error("Database write failed: timeout after 3000ms")
+        self.sut.report_error("Database write failed: timeout after 3001ms")
+
+        await asyncio.sleep(0.5)
+
+        self.assertEqual(len(self.smtp_server.messages), 1, "A repeated error should only be emailed once.")
+        self.assertNotIn("2 errors", self.smtp_server.messages[0], "The duplicate shouldn't be in the digest.")
+
+    async def test_smtp_connection_is_reused_between_digests(self):
+        self.sut.report_error("First error")
+        await asyncio.sleep(0.5)
+        self.sut.report_error("Second error")
+        await asyncio.sleep(0.5)
+
+        self.assertEqual(len(self.smtp_server.messages), 2, "Each digest should be sent.")
+        self.assertEqual(self.smtp_server.connection_count, 1, "Both emails should be sent over the same connection.")
+
+    async def test_errors_can_be_reported_from_other_threads(self):
+        thread = threading.Thread(target=self.sut.report_error, args=("Database write failed",))
+        thread.start()
+        thread.join()
+
+        await asyncio.sleep(0.5)
+
+        self.assertEqual(len(self.smtp_server.messages), 1, "An error reported from a worker thread should be emailed.")
+
+    async def test_report_error_does_not_block(self):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+
+        self.sut.report_error("Slow error")
+
+        self.assertLess(loop.time() - start, 0.05, "Reporting an error shouldn't wait for the email to send.")
+
+if __name__ == '__main__':
+    unittest.main()
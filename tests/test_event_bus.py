@@ -0,0 +1,93 @@
+import asyncio
+import threading
+import unittest
+from utils.event_bus import EventBus, COALESCE, DROP_OLDEST, ModeChanged, RelaySwitched, TargetTemperatureChanged, TemperatureSampled
+
+def _sample(zone, temperature):
+    return TemperatureSampled(zone, temperature, 20.0, False, 0.0)
+
+class EventBusTests(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.sut = EventBus()
+
+    async def test_every_subscriber_receives_events_of_its_types(self):
+        samples = self.sut.subscribe([TemperatureSampled])
+        everything = self.sut.subscribe([TemperatureSampled, RelaySwitched])
+
+        self.sut.publish(_sample(1, 19.0))
+        self.sut.publish(RelaySwitched(1, True, 0.0))
+
+        self.assertEqual(samples.drain(), [_sample(1, 19.0)], "A subscriber should only receive the event types it subscribed to.")
+        self.assertEqual(everything.drain(), [_sample(1, 19.0), RelaySwitched(1, True, 0.0)], "Every subscriber should receive its own copy of each event.")
+
+    async def test_drop_oldest_drops_the_oldest_events_when_full(self):
+        subscription = self.sut.subscribe([TemperatureSampled], policy=DROP_OLDEST, max_size=2)
+
+        for temperature in (18.0, 19.0, 20.0):
+            self.sut.publish(_sample(1, temperature))
+
+        self.assertEqual([event.temperature for event in subscription.drain()], [19.0, 20.0], "The oldest event should be dropped to make room.")
+        self.assertEqual(subscription.dropped_count, 1)
+
+    async def test_coalesce_keeps_the_latest_event_per_zone(self):
+        subscription = self.sut.subscribe([TemperatureSampled], policy=COALESCE)
+
+        self.sut.publish(_sample(1, 18.0))
+        self.sut.publish(_sample(2, 21.0))
+        self.sut.publish(_sample(1, 19.0))
+
+        self.assertEqual([(event.zone, event.temperature) for event in subscription.drain()], [(2, 21.0), (1, 19.0)], "Only the latest event per zone should be kept, in the order they last changed.")
+
+    async def test_coalesce_keeps_different_event_types_apart(self):
+        subscription = self.sut.subscribe([TargetTemperatureChanged, ModeChanged], policy=COALESCE)
+
+        self.sut.publish(TargetTemperatureChanged(1, 20.0))
+        self.sut.publish(ModeChanged(1, True))
+
+        self.assertEqual(len(subscription), 2, "Events of different types for the same zone shouldn't replace each other.")
+
+    async def test_a_slow_subscriber_does_not_hold_up_publishing_or_other_subscribers(self):
+        slow = self.sut.subscribe([TemperatureSampled], max_size=10)
+        fast = self.sut.subscribe([TemperatureSampled])
+        received = []
+
+        async def consume():
+            async for event in fast:
+                received.append(event)
+
+        consumer = asyncio.create_task(consume())
+        for index in range(1000):
+            self.sut.publish(_sample(1, float(index)))
+            await asyncio.sleep(0)
+        fast.close()
+        await consumer
+
+        self.assertEqual(len(received), 1000, "A subscriber keeping up should receive every event.")
+        self.assertEqual(len(slow), 10, "A subscriber that isn't consuming should never hold more than its maximum size.")
+        self.assertEqual(slow.dropped_count, 990)
+
+    async def test_publish_from_another_thread_is_delivered_on_the_loop(self):
+        subscription = self.sut.subscribe([RelaySwitched])
+
+        thread = threading.Thread(target=self.sut.publish, args=(RelaySwitched(2, True, 0.0),))
+        thread.start()
+        thread.join()
+        event = await asyncio.wait_for(subscription.get(), timeout=1)
+
+        self.assertEqual(event, RelaySwitched(2, True, 0.0))
+
+    async def test_get_returns_none_once_closed(self):
+        subscription = self.sut.subscribe([RelaySwitched])
+        subscription.close()
+
+        self.sut.publish(RelaySwitched(1, True, 0.0))
+
+        self.assertIsNone(await subscription.get(), "A closed subscription shouldn't receive further events.")
+
+    async def test_unknown_policy_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.sut.subscribe([RelaySwitched], policy='block')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import math
+import unittest
+from utils.history import ColumnRing, ZoneHistory, SAMPLE_COLUMNS
+
+class ColumnRingTests(unittest.TestCase):
+
+    def test_oldest_rows_are_overwritten_once_full(self):
+        sut = ColumnRing(SAMPLE_COLUMNS, capacity=3)
+        for timestamp in range(5):
+            sut.append((timestamp, 20.0, 5.0, 21.0, 0))
+
+        rows = sut.rows(0, len(sut))
+
+        self.assertEqual(rows['timestamp'], [2, 3, 4], "Only the newest rows should be kept, oldest first.")
+
+    def test_rows_are_found_by_timestamp_across_the_wrap(self):
+        sut = ColumnRing(SAMPLE_COLUMNS, capacity=4)
+        for timestamp in range(0, 60, 10):
+            sut.append((timestamp, timestamp / 10, 5.0, 21.0, 0))
+
+        start, stop = sut.index_at(25), sut.index_at(55)
+
+        self.assertEqual(sut.rows(start, stop)['timestamp'], [30, 40, 50], "Binary search should find rows either side of the wrap.")
+
+    def test_columns_are_packed(self):
+        sut = ColumnRing(SAMPLE_COLUMNS, capacity=100)
+
+        self.assertEqual(sut.nbytes, 1700, "Each sample should take 17 bytes (uint32, four float32s is 16, plus a uint8).")
+
+class ZoneHistoryTests(unittest.TestCase):
+
+    def setUp(self):
+        self.sut = ZoneHistory(days=1, sample_interval=10, rollup_days={60: 1, 3600: 7})
+
+    def test_samples_are_returned_in_a_time_range(self):
+        for timestamp in range(0, 100, 10):
+            self.sut.append(timestamp, 20.0, 5.0, 21.0, False)
+
+        samples = self.sut.samples(since=30, until=60)
+
+        self.assertEqual(samples['timestamp'], [30, 40, 50], "Samples should be filtered to since <= timestamp < until.")
+        self.assertEqual(set(samples), {'timestamp', 'indoor_temp', 'outdoor_temp', 'target_temp', 'heating_status'}, "The keys should match the database history.")
+
+    def test_rollups_are_maintained_incrementally(self):
+        # Two minutes of samples: heating on for the first half of the first minute.
+        for timestamp in range(0, 120, 10):
+            self.sut.append(timestamp, 18.0 + timestamp / 10, 5.0, 21.0, timestamp < 30)
+
+        rollup = self.sut.rollup(60)
+
+        self.assertEqual(rollup['timestamp'], [0, 60], "There should be a bucket per minute, including the one still being filled.")
+        self.assertEqual(rollup['indoor_min'][0], 18.0)
+        self.assertEqual(rollup['indoor_max'][0], 23.0)
+        self.assertAlmostEqual(rollup['indoor_mean'][0], 20.5, places=5)
+        self.assertEqual(rollup['heating_fraction'][0], 0.5, "The heating fraction should be the share of samples with the relay on.")
+        self.assertEqual(rollup['count'], [6, 6])
+
+    def test_missing_outdoor_temperatures_are_ignored_in_rollups(self):
+        self.sut.append(0, 20.0, None, 21.0, False)
+        self.sut.append(10, 20.0, 4.0, 21.0, False)
+
+        rollup = self.sut.rollup(60)
+
+        self.assertTrue(math.isnan(self.sut.samples()['outdoor_temp'][0]), "A missing outdoor temperature should be stored as NaN.")
+        self.assertEqual(rollup['outdoor_mean'], [4.0], "Missing outdoor temperatures shouldn't count towards the mean.")
+
+    def test_memory_is_fixed_up_front(self):
+        nbytes = self.sut.nbytes
+        for timestamp in range(0, 100000, 10):
+            self.sut.append(timestamp, 20.0, 5.0, 21.0, False)
+
+        self.assertEqual(self.sut.nbytes, nbytes, "Recording history shouldn't allocate more memory.")
+        self.assertEqual(len(self.sut), 8640, "A day of 10 second samples should be kept.")
+        self.assertEqual(self.sut.samples()['timestamp'][0], 100000 - 86400, "The oldest samples should be overwritten.")
+
+    def test_out_of_order_samples_are_ignored(self):
+        self.sut.append(100, 20.0, 5.0, 21.0, False)
+        self.sut.append(50, 19.0, 5.0, 21.0, False)
+
+        self.assertEqual(self.sut.samples()['timestamp'], [100], "A sample older than the latest should be dropped to keep the ring sorted.")
+
+if __name__ == '__main__':
+    unittest.main()
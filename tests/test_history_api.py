@@ -0,0 +1,144 @@
+import asyncio
+import json
+import math
+import time
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import patch
+from utils.history import ZoneHistory
+from utils.history_api import SERIES_COLUMNS, HistoryApi, lttb_indices, merge_buckets
+from utils.http_server import HttpServer
+
+class DownsamplingTests(unittest.TestCase):
+
+    def test_lttb_keeps_the_ends_and_the_peak(self):
+        xs = list(range(100))
+        ys = [0.0] * 100
+        ys[42] = 10.0
+
+        indices = lttb_indices(xs, ys, 10)
+
+        self.assertEqual(len(indices), 10, "LTTB should return the requested number of points.")
+        self.assertEqual((indices[0], indices[-1]), (0, 99), "The first and last points should always be kept.")
+        self.assertIn(42, indices, "A spike should be kept since it forms the largest triangle.")
+
+    def test_short_series_are_not_downsampled(self):
+        self.assertEqual(lttb_indices([0, 1, 2], [1, 2, 3], 10), [0, 1, 2])
+
+    def test_min_max_buckets_keep_extremes_and_weight_means(self):
+        series = {
+            'timestamp': [0, 10, 60, 70],
+            'indoor_min': [18.0, 19.0, 20.0, 21.0],
+            'indoor_max': [18.5, 25.0, 20.0, 21.0],
+            'indoor_mean': [18.0, 20.0, 20.0, 21.0],
+            'outdoor_mean': [math.nan, 4.0, 5.0, 5.0],
+            'target_mean': [21.0, 21.0, 21.0, 21.0],
+            'heating_fraction': [1.0, 0.0, 0.0, 0.0],
+            'count': [3, 1, 1, 1]
+        }
+
+        merged = merge_buckets(series, 0, 120, 2)
+
+        self.assertEqual(merged['timestamp'], [0, 60])
+        self.assertEqual(merged['indoor_min'][0], 18.0)
+        self.assertEqual(merged['indoor_max'][0], 25.0, "Each bucket should keep the highest reading so peaks aren't lost.")
+        self.assertEqual(merged['indoor_mean'][0], 18.5, "Means should be weighted by the number of readings.")
+        self.assertEqual(merged['outdoor_mean'][0], 4.0, "Missing outdoor temperatures shouldn't count towards the mean.")
+        self.assertEqual(merged['heating_fraction'][0], 0.75)
+
+class HistoryApiTests(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.history = ZoneHistory(days=1, sample_interval=10, rollup_days={60: 1, 3600: 7})
+        self.now = 20000.0
+        for timestamp in range(10000, 20000, 10):
+            self.history.append(timestamp, 18.0 + (timestamp % 600) / 100, 5.0, 21.0, timestamp % 1200 < 600)
+        self.api = HistoryApi({3: self.history}, lambda: [{'zone': 3, 'current_temperature': 20.5}], clock=lambda: self.now)
+        self.server = HttpServer(host='127.0.0.1', port=0)
+        self.api.add_routes(self.server)
+        await self.server.start()
+
+    async def asyncTearDown(self):
+        await self.server.stop()
+
+    async def _get(self, path):
+        reader, writer = await asyncio.open_connection('127.0.0.1', self.server.port)
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+        response = await reader.read()
+        writer.close()
+        headers, _, body = response.decode().partition('\r\n\r\n')
+        return headers, body
+
+    async def test_short_ranges_are_served_at_full_resolution(self):
+        result = await self.api.history(3, 19000, 19500, points=100)
+
+        self.assertEqual(result['source'], 'memory', "A short range should be served from the full resolution samples.")
+        self.assertEqual(len(result['series']['timestamp']), 50)
+
+    async def test_long_ranges_use_the_coarsest_rollup_with_enough_points(self):
+        result = await self.api.history(3, 10000, 20000, points=100)
+
+        self.assertEqual(result['source'], 'rollup', "A long range should be served from a rollup rather than every sample.")
+        self.assertEqual(result['resolution'], 60)
+        self.assertLessEqual(len(result['series']['timestamp']), 100, "The series should be downsampled to the requested points.")
+
+    @patch('utils.database.fetch_temperature_rollup')
+    async def test_older_ranges_merge_the_database_with_memory(self, fetch_temperature_rollup):
+        # Postgres returns local wall clock times converted as if they were UTC.
+        database_timestamp = datetime.fromtimestamp(5000).replace(tzinfo=timezone.utc).timestamp()
+        fetch_temperature_rollup.return_value = {column: [value] for column, value in zip(SERIES_COLUMNS, (database_timestamp, 17.0, 19.0, 18.0, 4.0, 21.0, 0.5, 360))}
+        self.api = HistoryApi({3: self.history}, lambda: [], pool=object(), clock=lambda: self.now)
+
+        result = await self.api.history(3, 0, 20000, points=5000)
+
+        self.assertEqual(result['source'], 'database')
+        boundary = self.history.oldest_timestamp(60)
+        self.assertEqual(fetch_temperature_rollup.call_args.args[4], datetime.fromtimestamp(boundary), "Postgres should only be asked for what memory doesn't hold.")
+        self.assertEqual(result['series']['timestamp'][0], 5000)
+        self.assertEqual(result['series']['timestamp'][1], boundary, "Recent history, which may not be in the database yet, should come from memory.")
+        self.assertEqual(sum(result['series']['count']), 360 + 1000)
+
+    @patch('utils.database.fetch_temperature_rollup')
+    async def test_database_queries_are_made_one_at_a_time(self, fetch_temperature_rollup):
+        running = []
+        overlapped = []
+        def fetch(*args):
+            overlapped.append(bool(running))
+            running.append(True)
+            time.sleep(0.02)
+            running.pop()
+            return {column: [] for column in SERIES_COLUMNS}
+        fetch_temperature_rollup.side_effect = fetch
+        self.api = HistoryApi({3: self.history}, lambda: [], pool=object(), clock=lambda: self.now)
+
+        await asyncio.gather(*(self.api.history(3, 0, 20000, points=5000) for _ in range(3)))
+
+        self.assertEqual(overlapped, [False] * 3, "Concurrent requests shouldn't need more than one pooled connection.")
+
+    async def test_history_is_served_as_json(self):
+        headers, body = await self._get('/api/history?zone=3&since=19000&until=20000&points=20&method=minmax')
+
+        result = json.loads(body)
+        self.assertIn('application/json', headers)
+        self.assertEqual(len(result['series']['timestamp']), 20, "Min/max downsampling should return a bucket per point.")
+
+    async def test_history_is_served_as_csv(self):
+        headers, body = await self._get('/api/history?zone=3&since=19900&until=20000&format=csv')
+
+        lines = body.strip().splitlines()
+        self.assertIn('text/csv', headers)
+        self.assertTrue(lines[0].startswith('timestamp,indoor_min,indoor_max'), "The CSV should start with a header row.")
+        self.assertEqual(len(lines), 11)
+
+    async def test_state_is_served(self):
+        _, body = await self._get('/api/state')
+
+        self.assertEqual(json.loads(body)['zones'][0]['current_temperature'], 20.5)
+
+    async def test_invalid_parameters_are_bad_requests(self):
+        headers, _ = await self._get('/api/history?zone=9')
+
+        self.assertTrue(headers.startswith('HTTP/1.1 400'), "An unknown zone should be a bad request.")
+
+if __name__ == '__main__':
+    unittest.main()
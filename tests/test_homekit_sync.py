@@ -0,0 +1,82 @@
+import asyncio
+import unittest
+from utils.event_bus import EventBus, RelaySwitched, TargetTemperatureChanged, TemperatureSampled
+from utils.homekit_sync import HomeKitSync
+
+class FakeAccessory:
+    def __init__(self):
+        self.updates = []
+
+    def update_state(self, temperature=None, heating=None, target_temperature=None):
+        self.updates.append({key: value for key, value in (('temperature', temperature), ('heating', heating), ('target_temperature', target_temperature)) if value is not None})
+
+def _sample(zone, temperature, heating=False):
+    return TemperatureSampled(zone, temperature, 20.0, heating, 0.0)
+
+class HomeKitSyncTests(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.now = 0.0
+        self.accessories = {1: FakeAccessory(), 2: FakeAccessory()}
+        self.event_bus = EventBus()
+        self.sut = HomeKitSync(self.accessories, self.event_bus, temperature_delta=0.2, heartbeat=600, clock=lambda: self.now)
+
+    def test_first_sample_sends_temperature_and_heating_state(self):
+        self.sut.apply([_sample(1, 19.5)])
+
+        self.assertEqual(self.accessories[1].updates, [{'temperature': 19.5, 'heating': False}])
+
+    def test_small_changes_are_not_sent(self):
+        self.sut.apply([_sample(1, 19.5)])
+        self.sut.apply([_sample(1, 19.6)])
+        self.sut.apply([_sample(1, 19.4375)])
+
+        self.assertEqual(len(self.accessories[1].updates), 1, "Changes smaller than the delta shouldn't be sent to HomeKit.")
+
+    def test_change_of_at_least_the_delta_is_sent(self):
+        self.sut.apply([_sample(1, 19.5)])
+        self.sut.apply([_sample(1, 19.75)])
+
+        self.assertEqual(self.accessories[1].updates[-1], {'temperature': 19.75})
+
+    def test_unchanged_temperature_is_sent_after_the_heartbeat(self):
+        self.sut.apply([_sample(1, 19.5)])
+        self.now = 600
+
+        self.sut.apply([_sample(1, 19.5)])
+
+        self.assertEqual(self.accessories[1].updates[-1], {'temperature': 19.5}, "The temperature should be resent once the heartbeat has passed.")
+
+    def test_relay_switch_is_mirrored(self):
+        self.sut.apply([_sample(1, 19.5)])
+
+        self.sut.apply([RelaySwitched(1, True, 0.0)])
+
+        self.assertEqual(self.accessories[1].updates[-1], {'heating': True})
+
+    def test_each_zone_gets_one_update_per_batch(self):
+        self.sut.apply([_sample(1, 19.5), _sample(2, 21.0), RelaySwitched(1, True, 0.0)])
+
+        self.assertEqual(self.accessories[1].updates, [{'temperature': 19.5, 'heating': True}], "A zone's changes in a batch should be applied together.")
+        self.assertEqual(self.accessories[2].updates, [{'temperature': 21.0, 'heating': False}])
+
+    def test_target_temperature_changes_are_sent(self):
+        self.sut.apply([TargetTemperatureChanged(1, 21.0)])
+        self.sut.apply([TargetTemperatureChanged(1, 21.0)])
+
+        self.assertEqual(self.accessories[1].updates, [{'target_temperature': 21.0}], "A target should only be sent when it changes.")
+
+    async def test_run_applies_published_events(self):
+        task = asyncio.create_task(self.sut.run())
+        await asyncio.sleep(0) # Let it subscribe.
+
+        self.event_bus.publish(_sample(2, 18.0, heating=True))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+
+        self.assertEqual(self.accessories[2].updates, [{'temperature': 18.0, 'heating': True}])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from utils.database import TemperatureLog
+from utils.log_buffer import LogBuffer, RECORD_SIZE
+
+def make_log(zone=3, indoor_temp=20.0, outdoor_temp=5.0):
+    return TemperatureLog(zone=zone, indoor_temp=indoor_temp, outdoor_temp=outdoor_temp, heating_status=True, target_temp=21.0, timestamp=datetime(2024, 1, 1, 12, 0, 0))
+
+class LogBufferTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.sut = LogBuffer(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_synced_logs_are_read_back(self):
+        self.sut.append(make_log(zone=1))
+        self.sut.append(make_log(zone=2, outdoor_temp=None))
+        self.sut.sync()
+
+        logs, _ = self.sut.read(10)
+
+        self.assertEqual([log.zone for log in logs], [1, 2], "Logs should be read back in the order they were appended.")
+        self.assertIsNone(logs[1].outdoor_temp, "A missing outdoor temperature should survive the round trip.")
+        self.assertEqual(logs[0].timestamp, datetime(2024, 1, 1, 12, 0, 0), "The timestamp should survive the round trip.")
+
+    def test_unsynced_logs_are_not_read(self):
+        self.sut.append(make_log())
+
+        logs, _ = self.sut.read(10)
+
+        self.assertEqual(logs, [], "Logs shouldn't be drained before they're durable on disk.")
+
+    def test_committed_logs_are_not_read_again(self):
+        for zone in range(5):
+            self.sut.append(make_log(zone=zone))
+        self.sut.sync()
+
+        first_batch, position = self.sut.read(3)
+        self.sut.commit(position)
+        second_batch, _ = self.sut.read(10)
+
+        self.assertEqual([log.zone for log in first_batch], [0, 1, 2], "The first batch should be limited to the requested size.")
+        self.assertEqual([log.zone for log in second_batch], [3, 4], "Only undrained logs should be read after a commit.")
+
+    def test_undrained_logs_survive_restart(self):
+        self.sut.append(make_log(zone=1))
+        self.sut.sync()
+        logs, position = self.sut.read(10)
+        self.sut.commit(position)
+        self.sut.append(make_log(zone=2))
+        self.sut.sync()
+
+        reopened = LogBuffer(self.directory.name)
+        logs, _ = reopened.read(10)
+
+        self.assertEqual([log.zone for log in logs], [2], "Only the undrained log should be replayed after a restart.")
+
+    def test_oldest_segments_are_evicted_when_full(self):
+        sut = LogBuffer(os.path.join(self.directory.name, 'small'), max_segment_bytes=RECORD_SIZE * 2, max_total_bytes=RECORD_SIZE * 4)
+        for zone in range(6):
+            sut.append(make_log(zone=zone))
+            sut.sync()
+
+        logs, _ = sut.read(10)
+
+        self.assertEqual([log.zone for log in logs], [2, 3, 4, 5], "The oldest logs should be evicted to keep within the size limit.")
+
+    def test_torn_record_is_skipped(self):
+        self.sut.append(make_log(zone=1))
+        self.sut.sync()
+        segment_path = os.path.join(self.directory.name, sorted(os.listdir(self.directory.name))[0])
+        with open(segment_path, 'ab') as f:
+            f.write(b'\x00' * (RECORD_SIZE // 2)) # A power cut mid-write.
+
+        reopened = LogBuffer(self.directory.name)
+        reopened.append(make_log(zone=2))
+        reopened.sync()
+        logs, _ = reopened.read(10)
+
+        self.assertEqual([log.zone for log in logs], [1, 2], "A torn record should be skipped without losing the logs around it.")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import asyncio
+import unittest
+from utils.http_server import HttpServer
+from utils.metrics import MetricsRegistry, add_metrics_route
+
+class MetricsRegistryTests(unittest.TestCase):
+
+    def setUp(self):
+        self.sut = MetricsRegistry(enabled=True)
+
+    def test_disabled_registry_records_nothing(self):
+        self.sut.disable()
+        counter = self.sut.counter('relay_switches_total', "Relay switches.", labels=('state',))
+        histogram = self.sut.histogram('read_seconds', "Read time.")
+
+        counter.inc('on')
+        with histogram.time():
+            pass
+
+        self.assertNotIn('relay_switches_total{', self.sut.render(), "A disabled registry shouldn't record updates.")
+        self.assertNotIn('read_seconds_count', self.sut.render(), "A disabled registry shouldn't time anything.")
+
+    def test_counter_is_rendered_per_label(self):
+        counter = self.sut.counter('relay_switches_total', "Relay switches.", labels=('sensor', 'state'))
+
+        counter.inc('28-01', 'on')
+        counter.inc('28-01', 'on')
+        counter.inc('28-01', 'off')
+
+        output = self.sut.render()
+        self.assertIn('# TYPE relay_switches_total counter', output)
+        self.assertIn('relay_switches_total{sensor="28-01",state="on"} 2.0', output, "Each label combination should be counted separately.")
+        self.assertIn('relay_switches_total{sensor="28-01",state="off"} 1.0', output)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = self.sut.histogram('read_seconds', "Read time.", buckets=(0.1, 1.0))
+
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(value)
+
+        output = self.sut.render()
+        self.assertIn('read_seconds_bucket{le="0.1"} 1', output)
+        self.assertIn('read_seconds_bucket{le="1.0"} 2', output)
+        self.assertIn('read_seconds_bucket{le="+Inf"} 3', output, "The +Inf bucket should count every observation.")
+        self.assertIn('read_seconds_sum 5.55', output)
+        self.assertIn('read_seconds_count 3', output)
+
+    def test_redeclaring_a_metric_returns_the_same_metric(self):
+        first = self.sut.counter('errors_total', "Errors.")
+
+        self.assertIs(self.sut.counter('errors_total', "Errors."), first, "Declaring a metric twice should share it.")
+        with self.assertRaises(ValueError):
+            self.sut.gauge('errors_total', "Errors.")
+
+class MetricsEndpointTests(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.registry = MetricsRegistry()
+        self.server = HttpServer(host='127.0.0.1', port=0)
+        add_metrics_route(self.server, self.registry)
+        await self.server.start()
+
+    async def asyncTearDown(self):
+        await self.server.stop()
+
+    async def _get(self, path):
+        reader, writer = await asyncio.open_connection('127.0.0.1', self.server.port)
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+        response = await reader.read()
+        writer.close()
+        return response.decode()
+
+    async def test_metrics_are_served_in_prometheus_format(self):
+        self.registry.counter('errors_total', "Errors.").inc()
+
+        response = await self._get('/metrics')
+
+        self.assertTrue(response.startswith('HTTP/1.1 200 OK'), "The metrics endpoint should respond successfully.")
+        self.assertIn('text/plain; version=0.0.4', response, "The response should use the Prometheus text format content type.")
+        self.assertIn('errors_total 1.0', response, "Recorded metrics should be served.")
+
+    async def test_unknown_paths_are_not_found(self):
+        response = await self._get('/nothing')
+
+        self.assertTrue(response.startswith('HTTP/1.1 404'), "Unknown paths should return 404.")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import math
+import unittest
+from datetime import datetime
+from utils.event_bus import EventBus, TemperatureSampled
+from utils.optimal_start import OptimalStart, PreheatPlan
+from utils.schedule import parse_schedule
+from utils.thermal_model import ThermalModelParameters
+
+MODEL = ThermalModelParameters(heat_loss_per_hour=0.1, heating_gain_per_hour=3.0, lag_minutes=30, rmse=0.05, samples=1000)
+
+# 06:30 on Monday 1st January 2024, when the schedule rises from 16°C to 21°C.
+TRANSITION = datetime(2024, 1, 1, 6, 30).timestamp()
+
+class FakeScheduleRunner:
+    def __init__(self):
+        self.schedules = parse_schedule({"zones": {"3": {"daily": [["06:30", 21.0], ["22:30", 16.0]]}}})
+
+def _simulate(model, start_time, end_time, temperature, outdoor, step=10.0):
+    """Steps the model forward with the relay switching on at `start_time`, returning the temperature at `end_time`."""
+    time, lag = start_time, model.lag_minutes * 60
+    while time < end_time:
+        heating = time - lag >= start_time
+        temperature += (-model.heat_loss_per_hour * (temperature - outdoor) + (model.heating_gain_per_hour if heating else 0.0)) * step / 3600
+        time += step
+    return temperature
+
+class PreheatPlanTests(unittest.TestCase):
+
+    def _start_time(self, plan, temperature, outdoor):
+        # The first minute at which the plan says to start, as a room cooling from `temperature` an hour before the plan begins.
+        for minute in range(-8 * 60, 0):
+            now = TRANSITION + minute * 60
+            current = outdoor + (temperature - outdoor) * math.exp(-MODEL.heat_loss_per_hour * (now - (TRANSITION - 8 * 3600)) / 3600)
+            if plan.should_start(now, current, outdoor):
+                return now, current
+        return None, None
+
+    def test_room_reaches_target_on_time(self):
+        plan = PreheatPlan(MODEL, TRANSITION, 21.0, lambda _: 5.0, now=TRANSITION - 8 * 3600)
+
+        start_time, temperature = self._start_time(plan, 17.0, 5.0)
+        arrival_temperature = _simulate(MODEL, start_time, TRANSITION, temperature, 5.0)
+
+        self.assertIsNotNone(start_time)
+        self.assertAlmostEqual(arrival_temperature, 21.0, delta=0.1, msg="Starting when the plan says should reach the target at the transition.")
+
+    def test_colder_weather_starts_earlier(self):
+        mild = PreheatPlan(MODEL, TRANSITION, 21.0, lambda _: 10.0, now=TRANSITION - 8 * 3600)
+        cold = PreheatPlan(MODEL, TRANSITION, 21.0, lambda _: -5.0, now=TRANSITION - 8 * 3600)
+
+        mild_start, _ = self._start_time(mild, 17.0, 10.0)
+        cold_start, _ = self._start_time(cold, 17.0, -5.0)
+
+        self.assertLess(cold_start, mild_start)
+
+    def test_does_not_start_before_the_maximum_lead(self):
+        plan = PreheatPlan(MODEL, TRANSITION, 21.0, lambda _: 5.0, now=TRANSITION - 8 * 3600, max_lead=3600)
+
+        self.assertFalse(plan.should_start(TRANSITION - 2 * 3600, 10.0, 5.0))
+        self.assertTrue(plan.should_start(TRANSITION - 1800, 10.0, 5.0), "Starting late is better than not starting at all.")
+
+    def test_past_the_forecast_falls_back_to_the_current_outdoor_temperature(self):
+        now = TRANSITION - 8 * 3600
+        # The forecast ends two hours before the transition, and it's 5°C now.
+        outdoor_at = lambda timestamp: None if timestamp > TRANSITION - 2 * 3600 else 5.0
+        plan = PreheatPlan(MODEL, TRANSITION, 21.0, outdoor_at, now=now)
+        constant = PreheatPlan(MODEL, TRANSITION, 21.0, lambda _: 5.0, now=now)
+
+        self.assertEqual(self._start_time(plan, 17.0, 5.0), self._start_time(constant, 17.0, 5.0))
+
+class OptimalStartTests(unittest.TestCase):
+
+    def setUp(self):
+        self.applied = []
+        self.sut = OptimalStart(FakeScheduleRunner(), {3: MODEL}, lambda _: 5.0, lambda zone, target: self.applied.append((zone, target)), EventBus())
+
+    def _sample(self, minutes_before, temperature, target=16.0):
+        return TemperatureSampled(3, temperature, target, False, TRANSITION - minutes_before * 60)
+
+    def test_applies_the_scheduled_target_once_when_it_is_time_to_start(self):
+        self.sut.handle_sample(self._sample(6 * 60, 18.0))
+        self.assertEqual(self.applied, [], "A warm room shouldn't start pre-heating hours ahead.")
+
+        for minutes_before in range(120, 0, -1):
+            self.sut.handle_sample(self._sample(minutes_before, 16.0))
+
+        self.assertEqual(self.applied, [(3, 21.0)])
+
+    def test_ignores_zones_without_a_usable_model(self):
+        sut = OptimalStart(FakeScheduleRunner(), {3: MODEL._replace(heating_gain_per_hour=-1.0)}, lambda _: 5.0, lambda zone, target: self.applied.append((zone, target)), EventBus())
+
+        sut.handle_sample(self._sample(30, 10.0))
+
+        self.assertEqual(self.applied, [])
+
+    def test_falls_in_target_are_not_brought_forward(self):
+        evening = datetime(2024, 1, 1, 22, 0).timestamp()
+
+        self.sut.handle_sample(TemperatureSampled(3, 15.0, 21.0, False, evening))
+
+        self.assertEqual(self.applied, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import os
+import tempfile
+import unittest
+from utils.protected_relay import ProtectedRelay
+from mocks.mock_relay import MockRelay
+
+class ShadowRelay(MockRelay):
+    """A MockRelay whose state follows the calls made to it."""
+
+    def turn_on(self):
+        super().turn_on()
+        self.value_to_return_for_is_active = True
+
+    def turn_off(self):
+        super().turn_off()
+        self.value_to_return_for_is_active = False
+
+class ProtectedRelayTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.stats_path = os.path.join(self.directory.name, 'relay_stats.json')
+        self.now = 1000.0
+        self.relay = ShadowRelay()
+        self.sut = self._make_relay()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _make_relay(self):
+        return ProtectedRelay(self.relay, name='26', min_on_time=300, min_off_time=600, stats_path=self.stats_path, clock=lambda: self.now)
+
+    def test_redundant_switches_are_skipped(self):
+        self.sut.turn_on()
+        self.sut.turn_on()
+
+        self.assertEqual(self.relay.turn_on_call_count, 1, "Turning on a relay that's already on shouldn't write to it again.")
+
+    def test_relay_is_held_on_for_its_minimum_on_time(self):
+        self.sut.turn_on()
+        self.now += 299
+        self.sut.turn_off()
+
+        self.assertTrue(self.sut.is_active, "The relay shouldn't turn off before its minimum on time.")
+
+        self.now += 1
+        self.sut.turn_off()
+
+        self.assertFalse(self.sut.is_active, "The relay should turn off once its minimum on time has passed.")
+
+    def test_relay_is_held_off_for_its_minimum_off_time(self):
+        self.sut.turn_on()
+        self.now += 300
+        self.sut.turn_off()
+        self.now += 599
+        self.sut.turn_on()
+
+        self.assertFalse(self.sut.is_active, "The relay shouldn't turn back on before its minimum off time.")
+        self.assertEqual(self.sut.cycle_count, 1)
+
+    def test_force_off_ignores_the_minimum_on_time(self):
+        self.sut.turn_on()
+        self.now += 10
+        self.sut.force_off()
+
+        self.assertFalse(self.sut.is_active, "Forcing the relay off should bypass the minimum on time.")
+
+    def test_switching_off_leaves_saving_stats_to_the_owner(self):
+        self.sut.turn_on()
+        self.now += 3600
+        self.sut.turn_off()
+
+        self.assertFalse(os.path.exists(self.stats_path), "Switching shouldn't write to the SD card on the event loop.")
+        self.sut.save_stats()
+        self.assertEqual(self._make_relay().cycle_count, 1)
+
+    def test_cycles_and_on_time_survive_a_restart(self):
+        self.sut.turn_on()
+        self.now += 3600
+        self.sut.turn_off()
+        self.now += 600
+        self.sut.turn_on()
+        self.now += 1800
+        self.sut.cleanup()
+
+        restarted = self._make_relay()
+
+        self.assertEqual(restarted.cycle_count, 2, "The cycle count should be loaded from the stats file.")
+        self.assertEqual(restarted.on_seconds, 5400, "The cumulative on-time should be loaded from the stats file.")
+
+    def test_minimum_off_time_is_kept_across_a_restart(self):
+        # The relay was on when the snapshot was taken 60 seconds ago, so it went off when the service stopped.
+        self.sut.restore(was_active=True, seconds_in_state=1200, seconds_since_saved=60)
+        self.sut.turn_on()
+
+        self.assertFalse(self.sut.is_active, "A quick restart shouldn't let the relay turn back on before its minimum off time.")
+
+        self.now += 540
+        self.sut.turn_on()
+
+        self.assertTrue(self.sut.is_active)
+
+    def test_restore_without_a_known_switch_time_leaves_the_relay_free_to_switch(self):
+        self.sut.restore(was_active=False, seconds_in_state=None, seconds_since_saved=10)
+        self.sut.turn_on()
+
+        self.assertTrue(self.sut.is_active)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,175 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+import unittest
+from datetime import datetime
+from utils.schedule import ScheduleRunner, WeeklyProgram, load_schedule, parse_schedule
+
+# Monday 1st January 2024.
+MONDAY = datetime(2024, 1, 1)
+
+def at(day: int, hour: int, minute: int = 0) -> float:
+    return MONDAY.replace(day=1 + day, hour=hour, minute=minute).timestamp()
+
+SCHEDULE = {
+    "zones": {
+        "3": {
+            "weekdays": [["06:30", 21.0], ["08:30", 17.0], ["17:00", 21.0], ["22:30", 16.0]],
+            "weekends": [["08:00", 20.0], ["23:00", 16.0]],
+            "friday": [["06:30", 21.0], ["08:30", 17.0]]
+        },
+        "1": {"daily": [["07:00", 19.0], ["21:00", 15.0]]}
+    },
+    "holidays": [
+        {"start": "2024-01-03T12:00", "end": "2024-01-05T09:00", "temperature": 12.0, "zones": [3]}
+    ]
+}
+
+class WeeklyProgramTests(unittest.TestCase):
+
+    def test_setpoint_before_the_first_transition_carries_over_from_last_week(self):
+        sut = WeeklyProgram([(3600, 20.0), (7200, 16.0)])
+
+        self.assertEqual(sut.setpoint_at(0), 16.0)
+        self.assertEqual(sut.setpoint_at(3600), 20.0)
+
+    def test_next_offset_wraps_into_next_week(self):
+        sut = WeeklyProgram([(3600, 20.0), (7200, 16.0)])
+
+        self.assertEqual(sut.next_offset(3600), 7200)
+        self.assertEqual(sut.next_offset(7200), 3600 + 7 * 86400)
+
+    def test_empty_program_is_rejected(self):
+        with self.assertRaises(ValueError):
+            WeeklyProgram([])
+
+class ZoneScheduleTests(unittest.TestCase):
+
+    def setUp(self):
+        self.schedules = parse_schedule(SCHEDULE)
+
+    def test_setpoint_follows_the_weekly_program(self):
+        sut = self.schedules[3]
+
+        self.assertEqual(sut.setpoint_at(at(0, 7)), 21.0)
+        self.assertEqual(sut.setpoint_at(at(0, 12)), 17.0)
+        self.assertEqual(sut.setpoint_at(at(0, 5)), 16.0, "Before the first transition, Sunday's last setpoint should still apply.")
+
+    def test_named_day_replaces_group(self):
+        self.assertEqual(self.schedules[3].setpoint_at(at(4, 18)), 17.0, "Friday's own program should replace the weekday one.")
+
+    def test_next_transition(self):
+        self.assertEqual(self.schedules[3].next_transition(at(0, 7)), (at(0, 8, 30), 17.0))
+        self.assertEqual(self.schedules[1].next_transition(at(6, 22)), (at(7, 7), 19.0), "Sunday night's next transition is Monday morning.")
+
+    def test_holiday_overrides_the_program(self):
+        sut = self.schedules[3]
+
+        self.assertEqual(sut.setpoint_at(at(2, 18)), 12.0)
+        self.assertEqual(sut.next_transition(at(2, 9)), (at(2, 12), 12.0), "The holiday starting should be the next transition.")
+        self.assertEqual(sut.next_transition(at(3, 12)), (at(4, 9), 17.0), "The holiday ending should return to the program.")
+
+    def test_holiday_only_applies_to_its_zones(self):
+        self.assertEqual(self.schedules[1].setpoint_at(at(2, 18)), 19.0)
+
+    def test_invalid_schedules_are_rejected(self):
+        for schedule in ({"zones": {"3": {"someday": [["06:30", 21.0]]}}}, {"zones": {"3": {"daily": [["25:00", 21.0]]}}}):
+            with self.assertRaises(ValueError):
+                parse_schedule(schedule)
+
+class ScheduleRunnerTests(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'schedule.json')
+        self.applied = []
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _write(self, schedule):
+        with open(self.path, 'w') as f:
+            json.dump(schedule, f)
+
+    def test_missing_file_schedules_nothing(self):
+        self.assertEqual(load_schedule(self.path), {})
+
+    async def test_applies_current_setpoints_then_sleeps_until_each_transition(self):
+        self._write(SCHEDULE)
+        started = time.monotonic()
+        clock = lambda: at(0, 8, 30) - 0.05 + (time.monotonic() - started) # 50ms before a transition.
+        sut = ScheduleRunner(lambda zone, setpoint: self.applied.append((zone, setpoint)), path=self.path, clock=clock)
+
+        task = asyncio.create_task(sut.run())
+        await asyncio.sleep(0.01)
+        self.assertEqual(sorted(self.applied), [(1, 19.0), (3, 21.0)], "The current setpoints should be applied on start.")
+        await asyncio.sleep(0.1)
+        task.cancel()
+
+        self.assertEqual(self.applied[-1], (3, 17.0), "The transition should be applied when it comes due.")
+
+    async def test_zones_changing_at_the_same_time_are_all_applied(self):
+        self._write({"zones": {
+            "1": {"daily": [["06:30", 21.0], ["22:00", 16.0]]},
+            "3": {"daily": [["06:30", 20.0], ["22:00", 15.0]]}
+        }})
+        started = time.monotonic()
+        clock = lambda: at(0, 6, 30) - 0.05 + (time.monotonic() - started)
+        sut = ScheduleRunner(lambda zone, setpoint: self.applied.append((zone, setpoint)), path=self.path, clock=clock)
+
+        task = asyncio.create_task(sut.run())
+        await asyncio.sleep(0.01)
+        self.applied.clear()
+        await asyncio.sleep(0.1)
+        task.cancel()
+
+        self.assertEqual(sorted(self.applied), [(1, 21.0), (3, 20.0)], "Every zone due at 06:30 should get its setpoint.")
+
+    async def test_restored_targets_are_kept_unless_a_transition_passed_while_down(self):
+        self._write(SCHEDULE)
+        # Saved at 08:00 and restarted at 10:00, so zone 3 missed its 08:30 change but zone 1 hasn't changed since 07:00.
+        sut = ScheduleRunner(lambda zone, setpoint: self.applied.append((zone, setpoint)), path=self.path, clock=lambda: at(0, 10))
+
+        task = asyncio.create_task(sut.run(restored_at=at(0, 8), restored_zones={1, 3}))
+        await asyncio.sleep(0.01)
+        task.cancel()
+
+        self.assertEqual(self.applied, [(3, 17.0)], "Only the zone whose schedule changed while the service was down should be set.")
+
+    async def test_reloading_leaves_targets_alone_until_the_next_transition(self):
+        self._write(SCHEDULE)
+        sut = ScheduleRunner(lambda zone, setpoint: self.applied.append((zone, setpoint)), path=self.path, clock=lambda: at(0, 10))
+        task = asyncio.create_task(sut.run())
+        await asyncio.sleep(0.01)
+        self.applied.clear()
+
+        self._write({"zones": {"3": {"daily": [["07:00", 22.0]]}}})
+        os.utime(self.path, (0, 1))
+        sut.reload()
+        await asyncio.sleep(0.01)
+        task.cancel()
+
+        self.assertEqual(sut.schedules[3].setpoint_at(at(0, 10)), 22.0)
+        self.assertEqual(self.applied, [], "A target set in HomeKit should last until the next scheduled change, not the next reload.")
+
+    async def test_reload_picks_up_changes_and_keeps_the_old_schedule_if_invalid(self):
+        self._write(SCHEDULE)
+        sut = ScheduleRunner(lambda zone, setpoint: None, path=self.path)
+        self.assertTrue(sut.reload())
+        self.assertFalse(sut.reload(), "An unchanged file shouldn't be reloaded.")
+
+        with open(self.path, 'w') as f:
+            f.write('{not json')
+        os.utime(self.path, (0, 1))
+        self.assertFalse(sut.reload())
+        self.assertEqual(set(sut.schedules), {1, 3}, "An invalid file should leave the previous schedule running.")
+
+        self._write({"zones": {"2": {"daily": [["07:00", 19.0]]}}})
+        os.utime(self.path, (0, 2))
+        self.assertTrue(sut.reload())
+        self.assertEqual(set(sut.schedules), {2})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+from contextlib import contextmanager
+from datetime import datetime
+from utils import schema
+
+class FakeCursor:
+    """Records statements, answering the queries `migrate` makes from canned results."""
+    def __init__(self, applied_versions, relkind=None):
+        self.statements = []
+        self._applied_versions = applied_versions
+        self._relkind = relkind
+        self._result = []
+        self.rowcount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def execute(self, query, params=None):
+        query = query if isinstance(query, str) else repr(query)
+        self.statements.append(query)
+        if 'FROM schema_migrations' in query:
+            self._result = [(version,) for version in self._applied_versions]
+        elif 'relkind FROM pg_class' in query:
+            self._result = [] if self._relkind is None else [(self._relkind,)]
+        elif 'min(timestamp), max(timestamp)' in query:
+            self._result = [(datetime(2023, 11, 20), datetime(2024, 1, 3))]
+        else:
+            self._result = []
+
+    def fetchone(self):
+        return self._result[0] if self._result else None
+
+    def fetchall(self):
+        return self._result
+
+class FakePool:
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    @contextmanager
+    def connection(self):
+        class Connection:
+            cursor = lambda _: self.cursor
+        yield Connection()
+
+class MonthTests(unittest.TestCase):
+
+    def test_add_months_wraps_years(self):
+        self.assertEqual(schema.add_months(datetime(2024, 11, 1), 3), datetime(2025, 2, 1))
+        self.assertEqual(schema.add_months(datetime(2024, 1, 1), -1), datetime(2023, 12, 1))
+
+    def test_partition_names_round_trip(self):
+        name = schema.partition_name(datetime(2024, 3, 1))
+
+        self.assertEqual(name, 'temperature_logs_y2024m03')
+        self.assertEqual(schema.parse_partition_name(name), datetime(2024, 3, 1))
+        self.assertIsNone(schema.parse_partition_name('temperature_logs_default'))
+
+    def test_only_partitions_entirely_older_than_the_retention_period_are_retired(self):
+        months = [datetime(2023, month, 1) for month in range(1, 13)]
+
+        retired = schema.partitions_to_retire(months, now=datetime(2024, 3, 15), retention_months=12)
+
+        self.assertEqual(retired, [datetime(2023, 1, 1), datetime(2023, 2, 1)], "March 2023 still has rows inside the last 12 months.")
+
+class MigrateTests(unittest.TestCase):
+
+    def test_applies_pending_migrations_under_the_advisory_lock(self):
+        cursor = FakeCursor(applied_versions=[1])
+
+        applied = schema.migrate(FakePool(cursor))
+
+        self.assertEqual(applied, [2])
+        self.assertIn('pg_advisory_xact_lock', cursor.statements[0])
+        self.assertFalse(any('PARTITION BY RANGE' in statement for statement in cursor.statements), "Applied migrations shouldn't run again.")
+        self.assertTrue(any('CREATE TABLE temperature_logs_hourly' in statement for statement in cursor.statements))
+
+    def test_existing_table_is_moved_into_monthly_partitions(self):
+        cursor = FakeCursor(applied_versions=[], relkind='r')
+
+        schema.migrate(FakePool(cursor))
+
+        statements = '\n'.join(cursor.statements)
+        for name in ('temperature_logs_y2023m11', 'temperature_logs_y2023m12', 'temperature_logs_y2024m01'):
+            self.assertIn(name, statements)
+        self.assertLess(statements.index('RENAME TO temperature_logs_unpartitioned'), statements.index('INSERT INTO temperature_logs (zone'))
+        self.assertIn('DROP TABLE temperature_logs_unpartitioned', statements)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import asyncio
+import time
+import unittest
+from simulation import SimulatedRelay, ThermalPlant, VirtualClock, run_simulation
+from simulation.benchmark import benchmark_strategy
+from utils.control_strategy import HysteresisStrategy, PredictiveStrategy
+
+class VirtualClockTests(unittest.TestCase):
+
+    def test_sleep_advances_virtual_time_instantly(self):
+        clock = VirtualClock()
+
+        async def sleep_for_a_day():
+            await asyncio.sleep(86400)
+            return asyncio.get_running_loop().time()
+
+        start = time.monotonic()
+        virtual_time = run_simulation(sleep_for_a_day(), clock)
+
+        self.assertEqual(virtual_time, 86400, "The loop's time should have moved forward by the sleep.")
+        self.assertLess(time.monotonic() - start, 1, "A virtual sleep shouldn't take real time.")
+
+class ThermalPlantTests(unittest.TestCase):
+
+    def test_heating_takes_effect_after_lag(self):
+        plant = ThermalPlant(initial_temperature=20.0, heat_loss_per_hour=0.0, heating_gain_per_hour=1.0, lag_minutes=60)
+        relay = SimulatedRelay(plant, VirtualClock())
+
+        relay.turn_on()
+
+        self.assertAlmostEqual(plant.temperature_at(3600), 20.0, msg="The room shouldn't warm until the lag has passed.")
+        self.assertAlmostEqual(plant.temperature_at(7200), 21.0, msg="The room should warm at the heating gain after the lag.")
+
+class BenchmarkTests(unittest.TestCase):
+
+    # A regression check that the predictive strategy keeps its advantage over bang-bang control on a slow underfloor heating plant.
+    def test_predictive_strategy_overshoots_less_than_hysteresis(self):
+        hysteresis = benchmark_strategy(HysteresisStrategy(), days=7)
+        predictive = benchmark_strategy(PredictiveStrategy(coast_time=3600), days=7)
+
+        self.assertLess(predictive.max_overshoot, hysteresis.max_overshoot, "Predictive control should reduce overshoot.")
+        self.assertGreater(hysteresis.relay_cycles, 0, "The simulated relay should have been switched.")
+
+if __name__ == '__main__':
+    unittest.main()
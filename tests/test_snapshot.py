@@ -0,0 +1,68 @@
+import math
+import os
+import tempfile
+import unittest
+from utils.snapshot import ZoneSnapshot, decode_snapshot, encode_snapshot, load_snapshot, save_snapshot
+
+HISTORY = {
+    'timestamp': [1700000000, 1700000010],
+    'indoor_temp': [19.5, 19.5625],
+    'outdoor_temp': [4.0, math.nan],
+    'target_temp': [21.0, 21.0],
+    'heating_status': [1, 0]
+}
+
+MODEL = {'heat_loss_per_hour': 0.1, 'heating_gain_per_hour': 2.5, 'lag_minutes': 90.0, 'rmse': 0.05, 'samples': 1200}
+
+ZONES = [
+    ZoneSnapshot(zone=3, target_temperature=21.0, heating_enabled=True, relay_active=True, relay_seconds_in_state=120.0, model=MODEL, history=HISTORY),
+    ZoneSnapshot(zone=1, target_temperature=18.5, heating_enabled=False, relay_active=False, relay_seconds_in_state=None, model=None, history={})
+]
+
+class SnapshotTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'state_snapshot.bin')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        saved_at, zones = decode_snapshot(encode_snapshot(1700000020.5, ZONES))
+
+        self.assertEqual(saved_at, 1700000020.5)
+        office, kitchen = zones
+        self.assertEqual((office.zone, office.target_temperature, office.heating_enabled, office.relay_active, office.relay_seconds_in_state), (3, 21.0, True, True, 120.0))
+        self.assertEqual(office.model, MODEL)
+        self.assertEqual(office.history['indoor_temp'], [19.5, 19.5625])
+        self.assertTrue(math.isnan(office.history['outdoor_temp'][1]), "Missing outdoor temperatures should survive as NaN.")
+        self.assertEqual((kitchen.relay_seconds_in_state, kitchen.model, kitchen.history['timestamp']), (None, None, []))
+
+    def test_is_compact(self):
+        self.assertLess(len(encode_snapshot(0, ZONES)), 200, "Two zones with two samples should take well under 200 bytes.")
+
+    def test_corrupt_snapshot_is_rejected(self):
+        data = bytearray(encode_snapshot(0, ZONES))
+        data[-1] ^= 0xFF
+
+        with self.assertRaises(ValueError):
+            decode_snapshot(bytes(data))
+
+    def test_save_replaces_the_previous_snapshot_and_cleans_up(self):
+        save_snapshot(1.0, ZONES, self.path)
+        save_snapshot(2.0, ZONES[:1], self.path)
+
+        saved_at, zones = load_snapshot(self.path)
+        self.assertEqual((saved_at, len(zones)), (2.0, 1))
+        self.assertEqual(os.listdir(self.directory.name), ['state_snapshot.bin'], "The temporary file should have been renamed over the snapshot.")
+
+    def test_missing_or_unreadable_snapshot_loads_as_none(self):
+        self.assertIsNone(load_snapshot(self.path))
+
+        with open(self.path, 'wb') as f:
+            f.write(b'TPSN\x01')
+        self.assertIsNone(load_snapshot(self.path))
+
+if __name__ == '__main__':
+    unittest.main()
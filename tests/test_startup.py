@@ -0,0 +1,37 @@
+import unittest
+from utils.startup import StartupTimer
+
+class StartupTimerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 100.0
+        self.sut = StartupTimer(clock=lambda: self.now)
+
+    def test_milestones_are_timed_from_the_start(self):
+        self.now = 101.5
+
+        self.sut.mark("First control decision")
+
+        self.assertEqual(self.sut.elapsed("First control decision"), 1.5, "The milestone should be timed from when the timer started.")
+
+    def test_only_the_first_mark_is_recorded(self):
+        self.now = 101.0
+        self.sut.mark("First temperature reading")
+        self.now = 105.0
+        self.sut.mark("First temperature reading")
+
+        self.assertEqual(self.sut.elapsed("First temperature reading"), 1.0, "Marking a milestone again shouldn't move it.")
+
+    def test_report_lists_milestones_in_order(self):
+        self.now = 100.2
+        self.sut.mark("Zones configured")
+        self.now = 103.0
+        self.sut.mark("Services started")
+
+        report = self.sut.report()
+
+        self.assertLess(report.index("Zones configured"), report.index("Services started"), "Milestones should be reported in the order they were reached.")
+        self.assertIsNone(self.sut.elapsed("First control decision"), "A milestone that hasn't been reached shouldn't have a time.")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import io
+import logging
+import queue
+import threading
+import unittest
+from utils import structured_logging
+from utils.structured_logging import KeyValueFormatter, SteadyStateFilter, _DroppingQueueHandler, _Listener
+
+def make_record(msg, *args, **extra):
+    record = logging.LogRecord('utils.thermostat', logging.INFO, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+class KeyValueFormatterTests(unittest.TestCase):
+
+    def test_formats_the_message_and_extra_fields_as_pairs(self):
+        record = make_record("Current temperature (%s°C) below target (%s°C). Turning ON.", 19.4, 20.0, zone=3, temperature=19.4)
+
+        line = KeyValueFormatter().format(record)
+
+        self.assertIn(' level=INFO logger=utils.thermostat msg="Current temperature (19.4°C) below target (20.0°C). Turning ON." zone=3 temperature=19.4', line)
+        self.assertTrue(line.startswith('time='))
+
+    def test_quotes_values_with_spaces_and_appends_suppressed_count(self):
+        record = make_record("Idle.", sensor='hall "upstairs"', suppressed=4, steady_state=(3, 'idle'))
+
+        line = KeyValueFormatter().format(record)
+
+        self.assertTrue(line.endswith(r'msg=Idle. sensor="hall \"upstairs\"" suppressed=4'), line)
+        self.assertNotIn('steady_state', line)
+
+class SteadyStateFilterTests(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.0
+        self.sut = SteadyStateFilter(interval=300, clock=lambda: self.now)
+
+    def test_repeats_are_suppressed_until_the_interval_passes(self):
+        self.assertTrue(self.sut.filter(make_record("Idle.", steady_state=(1, 'idle'))))
+        for _ in range(5):
+            self.now += 10
+            self.assertFalse(self.sut.filter(make_record("Idle.", steady_state=(1, 'idle'))))
+
+        self.now = 300
+        record = make_record("Idle.", steady_state=(1, 'idle'))
+        self.assertTrue(self.sut.filter(record))
+        self.assertEqual(record.suppressed, 5)
+
+    def test_a_change_of_state_is_logged_straight_away(self):
+        self.assertTrue(self.sut.filter(make_record("Idle.", steady_state=(1, 'idle'))))
+        self.assertFalse(self.sut.filter(make_record("Idle.", steady_state=(1, 'idle'))))
+
+        record = make_record("Heating.", steady_state=(1, 'heating'))
+        self.assertTrue(self.sut.filter(record))
+        self.assertEqual(record.suppressed, 0, "The count belongs to the previous state.")
+        self.assertTrue(self.sut.filter(make_record("Idle.", steady_state=(2, 'idle'))), "Zones are rate limited separately.")
+
+    def test_records_without_a_key_always_pass(self):
+        for _ in range(3):
+            self.assertTrue(self.sut.filter(make_record("Turning ON.")))
+
+class QueueLoggingTests(unittest.TestCase):
+
+    def setUp(self):
+        root = logging.getLogger()
+        self.addCleanup(setattr, root, 'handlers', list(root.handlers))
+        self.addCleanup(root.setLevel, root.level)
+        self.addCleanup(structured_logging.stop_logging)
+
+    def test_records_are_written_by_the_listener(self):
+        stream = io.StringIO()
+        structured_logging.configure_logging('INFO', steady_state_interval=300, stream=stream)
+        logger = logging.getLogger('tests.structured_logging')
+
+        logger.info("Heating is OFF.", extra={'zone': 1, 'steady_state': (1, 'idle')})
+        logger.info("Heating is OFF.", extra={'zone': 1, 'steady_state': (1, 'idle')})
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logger.error("Failed %s.", 'read', exc_info=True)
+        structured_logging.stop_logging()
+
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(sum('Heating is OFF.' in line for line in lines), 1)
+        self.assertIn('msg="Failed read."', stream.getvalue())
+        self.assertIn('ValueError: boom', lines[-1], "The traceback should follow on its own lines.")
+
+    def test_a_full_queue_drops_records_rather_than_blocking(self):
+        records = queue.Queue(maxsize=1)
+        handler = _DroppingQueueHandler(records)
+
+        handler.emit(make_record("One."))
+        handler.emit(make_record("Two."))
+
+        self.assertEqual(records.get_nowait().getMessage(), "One.")
+        self.assertTrue(records.empty())
+
+class BlockedHandler(logging.Handler):
+    """Holds up the listener until released, as a slow SD card would."""
+
+    def __init__(self):
+        super().__init__()
+        self.unblock = threading.Event()
+        self.messages = []
+
+    def emit(self, record):
+        self.unblock.wait()
+        self.messages.append(record.getMessage())
+
+class ListenerTests(unittest.TestCase):
+
+    def test_stopping_with_a_full_queue_waits_for_room(self):
+        records = queue.Queue(maxsize=1)
+        handler = BlockedHandler()
+        sut = _Listener(records, handler)
+        sut.start()
+        records.put(make_record("One."))
+        while not records.empty(): # The listener has taken it and is blocked writing it.
+            pass
+        records.put(make_record("Two."))
+
+        threading.Timer(0.1, handler.unblock.set).start()
+        sut.stop()
+
+        self.assertEqual(handler.messages, ["One.", "Two."])
+
+if __name__ == '__main__':
+    unittest.main()
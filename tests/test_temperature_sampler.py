@@ -0,0 +1,81 @@
+import asyncio
+import unittest
+from utils.temperature_sampler import TemperatureSampler
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TemperatureSamplerTests(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.read_call_count = 0
+        self.clock = FakeClock()
+        self.sut = TemperatureSampler(self._fake_read, clock=self.clock)
+
+    async def _fake_read(self, sensor_id):
+        self.read_call_count += 1
+        await asyncio.sleep(0.01) # Simulate the conversion time so concurrent callers overlap.
+        return self.read_call_count
+
+    async def test_fresh_cached_reading_is_returned_without_reading_sensor(self):
+        await self.sut.read()
+        self.clock.now = 4.0
+
+        result = await self.sut.read(max_age=5)
+
+        self.assertEqual(result, 1, "The cached reading should be returned.")
+        self.assertEqual(self.read_call_count, 1, "The sensor should only be read once.")
+
+    async def test_stale_reading_triggers_new_read(self):
+        await self.sut.read()
+        self.clock.now = 6.0
+
+        result = await self.sut.read(max_age=5)
+
+        self.assertEqual(result, 2, "A new reading should be taken once the cache is too old.")
+
+    async def test_concurrent_reads_share_one_in_flight_read(self):
+        results = await asyncio.gather(self.sut.read(), self.sut.read(), self.sut.read())
+
+        self.assertEqual(results, [1, 1, 1], "All callers should get the same reading.")
+        self.assertEqual(self.read_call_count, 1, "Concurrent callers should share a single sensor read.")
+
+    async def test_latest_records_timestamp(self):
+        self.clock.now = 12.0
+
+        await self.sut.read()
+
+        self.assertEqual(self.sut.latest_reading().timestamp, 12.0, "The latest reading should be timestamped when it was taken.")
+
+    async def test_all_sensors_are_read_in_one_gather(self):
+        sut = TemperatureSampler(self._fake_sensor_read, sensor_ids=['28-a', '28-b'], clock=self.clock)
+
+        first = await sut.read('28-a')
+        second = await sut.read('28-b')
+
+        self.assertEqual((first, second), ('28-a', '28-b'), "Each sensor should report its own reading.")
+        self.assertEqual(self.read_call_count, 2, "Reading one sensor should refresh every sensor on the bus together.")
+
+    async def test_failed_sensor_does_not_block_other_zones(self):
+        async def read(sensor_id):
+            if sensor_id == '28-b':
+                raise IOError("Sensor unplugged")
+            return sensor_id
+        sut = TemperatureSampler(read, sensor_ids=['28-a', '28-b'], clock=self.clock)
+
+        result = await sut.read('28-a')
+
+        self.assertEqual(result, '28-a', "A working sensor should still be read.")
+        with self.assertRaises(IOError):
+            await sut.read('28-b')
+
+    async def _fake_sensor_read(self, sensor_id):
+        self.read_call_count += 1
+        return sensor_id
+
+if __name__ == '__main__':
+    unittest.main()
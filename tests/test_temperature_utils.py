@@ -0,0 +1,89 @@
+import os
+import unittest
+from mocks.fake_sysfs import FakeSysfs
+from utils.temperature_sampler import TemperatureSampler
+from utils.temperature_utils import SysfsBackend
+
+class SysfsBackendTests(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.sysfs = FakeSysfs()
+        self.sleeps = []
+        self.sut = SysfsBackend(base_dir=self.sysfs.base_dir, sleep=self.sleeps.append)
+
+    def tearDown(self):
+        self.sysfs.cleanup()
+
+    async def test_reads_the_temperature_attribute(self):
+        self.sysfs.add_sensor('28-a', 21.25)
+
+        result = await self.sut.read('28-a')
+
+        self.assertEqual(result.celcius, 21.25)
+        self.assertAlmostEqual(result.fahrenheit, 70.25)
+
+    async def test_falls_back_to_w1_slave_and_retries_on_crc_failure(self):
+        self.sysfs.add_sensor('28-a', -3.5, temperature_attribute=False, crc_ok=False)
+        self.sut = SysfsBackend(base_dir=self.sysfs.base_dir, crc_retries=2, sleep=self.sleeps.append)
+
+        with self.assertRaises(TimeoutError):
+            await self.sut.read('28-a')
+        self.assertEqual(len(self.sleeps), 2, "A CRC failure should be retried.")
+
+        self.sysfs.set_temperature('28-a', -3.5, temperature_attribute=False)
+        self.assertEqual((await self.sut.read('28-a')).celcius, -3.5)
+
+    async def test_no_sensor_defaults_to_the_first_found(self):
+        self.sysfs.add_sensor('28-b', 19.0)
+        self.sysfs.add_sensor('28-a', 20.0)
+
+        self.assertEqual(self.sut.discover(), ['28-a', '28-b'])
+        self.assertEqual((await self.sut.read()).celcius, 20.0)
+
+    async def test_missing_sensor_and_power_on_reset_value_are_errors(self):
+        self.sysfs.add_sensor('28-a', 85.0)
+
+        with self.assertRaises(IOError):
+            await self.sut.read('28-a')
+        with self.assertRaises(IOError):
+            await self.sut.read('28-missing')
+
+    async def test_read_many_triggers_one_bulk_conversion(self):
+        self.sysfs.add_sensor('28-a', 20.0)
+        self.sysfs.add_sensor('28-b', 18.5)
+
+        results = await self.sut.read_many(['28-a', '28-b', '28-missing'])
+
+        self.assertEqual(self.sysfs.bulk_read_contents(), 'trigger', "Every sensor should be converted at once through the bus master.")
+        self.assertEqual(results['28-a'].celcius, 20.0)
+        self.assertEqual(results['28-b'].celcius, 18.5)
+        self.assertIsInstance(results['28-missing'], IOError, "A sensor that can't be read shouldn't fail the others.")
+
+    async def test_read_many_of_one_sensor_skips_the_bulk_conversion(self):
+        self.sysfs.add_sensor('28-a', 20.0)
+
+        await self.sut.read_many(['28-a'])
+
+        self.assertEqual(self.sysfs.bulk_read_contents(), '0\n')
+
+    async def test_read_many_without_bulk_read_support_reads_each_sensor(self):
+        os.remove(os.path.join(self.sysfs.bus_master, 'therm_bulk_read'))
+        self.sysfs.add_sensor('28-a', 20.0)
+        self.sysfs.add_sensor('28-b', 18.5)
+
+        results = await self.sut.read_many(['28-a', '28-b'])
+
+        self.assertEqual([results['28-a'].celcius, results['28-b'].celcius], [20.0, 18.5])
+
+    async def test_sampler_reads_every_sensor_through_read_many(self):
+        self.sysfs.add_sensor('28-a', 20.0)
+        self.sysfs.add_sensor('28-b', 18.5)
+        sampler = TemperatureSampler(self.sut.read, sensor_ids=['28-a', '28-b'], read_many_function=self.sut.read_many)
+
+        results = await sampler.read_all()
+
+        self.assertEqual({sensor_id: info.celcius for sensor_id, info in results.items()}, {'28-a': 20.0, '28-b': 18.5})
+        self.assertEqual(self.sysfs.bulk_read_contents(), 'trigger')
+
+if __name__ == '__main__':
+    unittest.main()
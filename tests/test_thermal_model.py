@@ -0,0 +1,82 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from utils.thermal_model import ThermalModelFitter, load_thermal_model, save_thermal_model
+
+def simulate_history(hours=24 * 14, step_minutes=10, heat_loss=0.1, heating_gain=2.0, lag_minutes=60, seed=0):
+    """Simulates readings from a known RC model with the relay cycling, so the fit can be checked against the true parameters."""
+    rng = np.random.default_rng(seed)
+    steps = int(hours * 60 / step_minutes)
+    timestamps = np.arange(steps) * step_minutes * 60.0
+    outdoor = 5.0 + 3.0 * np.sin(timestamps / 86400.0 * 2 * np.pi)
+    heating = ((timestamps // (3 * 3600)) % 2 == 0).astype(float) # On for 3 hours, off for 3 hours.
+    lag_steps = lag_minutes // step_minutes
+    indoor = np.empty(steps)
+    indoor[0] = 18.0
+    dt = step_minutes / 60.0
+    for i in range(steps - 1):
+        lagged = heating[i - lag_steps] if i >= lag_steps else 0.0
+        indoor[i + 1] = indoor[i] + dt * (-heat_loss * (indoor[i] - outdoor[i]) + heating_gain * lagged) + rng.normal(0, 0.002)
+    return timestamps, indoor, outdoor, heating
+
+class ThermalModelFitterTests(unittest.TestCase):
+
+    def test_fit_recovers_known_parameters(self):
+        sut = ThermalModelFitter()
+        sut.add(*simulate_history())
+
+        parameters = sut.solve()
+
+        self.assertAlmostEqual(parameters.heat_loss_per_hour, 0.1, delta=0.01, msg="The heat loss coefficient should be recovered.")
+        self.assertAlmostEqual(parameters.heating_gain_per_hour, 2.0, delta=0.1, msg="The heating gain should be recovered.")
+        self.assertEqual(parameters.lag_minutes, 60, "The lag should be recovered.")
+
+    def test_incremental_fit_matches_full_fit(self):
+        timestamps, indoor, outdoor, heating = simulate_history()
+        full = ThermalModelFitter()
+        full.add(timestamps, indoor, outdoor, heating)
+        incremental = ThermalModelFitter()
+        split = len(timestamps) // 2
+        incremental.add(timestamps[:split], indoor[:split], outdoor[:split], heating[:split])
+
+        # The second call overlaps the first, as it would when re-querying with context for the lag.
+        context = split - 30
+        incremental.add(timestamps[context:], indoor[context:], outdoor[context:], heating[context:])
+
+        self.assertAlmostEqual(incremental.solve().heat_loss_per_hour, full.solve().heat_loss_per_hour, places=6, msg="Refitting incrementally should match a full fit.")
+
+    def test_fit_in_chunks_matches_full_fit(self):
+        history = simulate_history()
+        full = ThermalModelFitter()
+        full.add(*history)
+        chunked = ThermalModelFitter()
+
+        chunked.add_batches(tuple(column[start:start + 100] for column in history) for start in range(0, len(history[0]), 100))
+
+        self.assertEqual(chunked.solve().samples, full.solve().samples, "Every interval should be counted once across chunk boundaries.")
+        self.assertAlmostEqual(chunked.solve().heat_loss_per_hour, full.solve().heat_loss_per_hour, places=6)
+        self.assertEqual(chunked.solve().lag_minutes, full.solve().lag_minutes)
+
+    def test_missing_outdoor_temperatures_are_ignored(self):
+        timestamps, indoor, outdoor, heating = simulate_history()
+        outdoor[::7] = np.nan
+        sut = ThermalModelFitter()
+        sut.add(timestamps, indoor, outdoor, heating)
+
+        self.assertIsNotNone(sut.solve(), "Rows without an outdoor temperature should be skipped rather than breaking the fit.")
+
+    def test_parameters_round_trip_through_models_file(self):
+        sut = ThermalModelFitter()
+        sut.add(*simulate_history(hours=48))
+        parameters = sut.solve()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'models.json')
+
+            save_thermal_model(3, parameters, sut, path)
+
+            self.assertEqual(load_thermal_model(3, path), parameters, "Saved parameters should load back unchanged.")
+            self.assertIsNone(load_thermal_model(1, path), "A zone without a model should load as None.")
+
+if __name__ == '__main__':
+    unittest.main()
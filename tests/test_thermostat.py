@@ -1,67 +1,135 @@
-# import unittest
-# from unittest.mock import patch
-# from utils.thermostat import Thermostat
-# from utils.temperature_utils import TemperatureInfo
-# from mocks.mock_relay import MockRelay
-
-# # NOTE: These tests were written pre-conversion to asyncio, so need rewriting at some point! 
-
-# # WARNING: Read the comment on test_current_temperature_is_reported_correctly regarding patches. It'll save headaches when writing additional tests.
-# class ThermostatTests(unittest.TestCase):
-    
-#     def setUp(self):
-#         self.mock_relay = MockRelay()
-#         self.sut = Thermostat(self.mock_relay)
-        
-#     # Notice the patch is actually updating THERMOSTAT.read_temp, even though read_temp comes from the temperature_utils file.
-#     # This is because the test file still imports temperature_utils.read_temp as normal, and then patches it once in the THERMOSTAT file.     
-#     @patch('utils.thermostat.read_temp')
-#     def test_current_temperature_is_reported_correctly(self, mock_read_temp):
-#         mock_read_temp.return_value = TemperatureInfo(30.0, 70.0)
-            
-#         self.assertEqual(self.sut.current_temperature, 30.0, "The reported current temperature should match the mocked value.")
-
-#     def test_set_target_temperature_correctly_updates_value(self):
-#         self.sut.set_target_temperature(21.5)
-        
-#         self.assertEqual(self.sut.target_temperature, 21.5, "The reported target temperature should match the set value.")
-        
-#     def test_default_target_temperature_set_on_init(self):        
-#         self.assertEqual(self.sut.target_temperature, 20.0, "The target temperature should be set on init.")
-
-#     def test_is_active_reflects_relay_status_when_relay_on(self):
-#         self.mock_relay.value_to_return_for_is_active = True
-        
-#         self.assertEqual(self.sut.is_active, True, "The reported is active value should match the relay's value.")
-
-#     def test_is_active_reflects_relay_status_when_relay_off(self):
-#         self.mock_relay.value_to_return_for_is_active = False
-        
-#         self.assertEqual(self.sut.is_active, False, "The reported is active value should match the relay's value.")
-
-#     @patch('utils.thermostat.read_temp')
-#     def test_start_turns_on_relay_when_current_temp_below_target_minus_hysteresis(self, mock_read_temp):
-#         mock_read_temp.return_value = TemperatureInfo(15.0, 70.0)
-#         self.sut.set_target_temperature(16.0)
-        
-#         self.sut._check_and_control_temperature()
-        
-#         self.assertEqual(self.mock_relay.turn_on_call_count, 1, "The relay should be switched on to meet the target temperature (including hysteresis).")
-
-#     @patch('utils.thermostat.read_temp')
-#     def test_start_turns_off_relay_when_current_temp_below_target_plus_hysteresis(self, mock_read_temp):
-#         mock_read_temp.return_value = TemperatureInfo(21, 70.0)
-#         self.mock_relay.value_to_return_for_is_active = True # Relay must be on for it to turn off in this branch.
-#         self.sut.set_target_temperature(20)
-        
-#         self.sut._check_and_control_temperature()
-        
-#         self.assertEqual(self.mock_relay.turn_off_call_count, 1, "The relay should be switched off when temp is above the target temperature (including hysteresis).")
-
-#     def test_stop_calls_relay_cleanup(self):
-#         self.sut.stop()
-        
-#         self.assertEqual(self.mock_relay.cleanup_call_count, 1, "Cleanup method should be called on stop.")
-        
-# if __name__ == '__main__':
-#     unittest.main()
\ No newline at end of file
+import asyncio
+import unittest
+from utils.thermostat import Thermostat
+from utils.temperature_sampler import TemperatureSampler
+from utils.temperature_utils import TemperatureInfo
+from utils.event_bus import EventBus, ControlDecision, ModeChanged, TargetTemperatureChanged
+from utils.tick_scheduler import AdaptiveTickScheduler
+from mocks.mock_relay import MockRelay
+
+class ThermostatTests(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.mock_relay = MockRelay()
+        self.current_temperature = 30.0
+        # Rather than patching read_temp, the sensor is injected through the sampler.
+        self.sampler = TemperatureSampler(self._fake_read_temp)
+        self.sut = Thermostat(self.mock_relay, sampler=self.sampler)
+
+    async def _fake_read_temp(self, sensor_id):
+        if self.current_temperature is None:
+            raise FileNotFoundError("No temperature sensor found; is it wired correctly?")
+        return TemperatureInfo(self.current_temperature, self.current_temperature * 9.0 / 5.0 + 32.0)
+
+    async def test_current_temperature_is_reported_correctly(self):
+        current_temperature = await self.sut.current_temperature_celcius()
+
+        self.assertEqual(current_temperature, 30.0, "The reported current temperature should match the sensor value.")
+
+    def test_set_target_temperature_correctly_updates_value(self):
+        self.sut.set_target_temperature_celcius(21.5)
+
+        self.assertEqual(self.sut.target_temperature_celcius(), 21.5, "The reported target temperature should match the set value.")
+
+    def test_default_target_temperature_set_on_init(self):
+        self.assertEqual(self.sut.target_temperature_celcius(), 20.0, "The target temperature should be set on init.")
+
+    def test_is_active_reflects_relay_status_when_relay_on(self):
+        self.mock_relay.value_to_return_for_is_active = True
+
+        self.assertEqual(self.sut.is_active(), True, "The reported is active value should match the relay's value.")
+
+    def test_is_active_reflects_relay_status_when_relay_off(self):
+        self.mock_relay.value_to_return_for_is_active = False
+
+        self.assertEqual(self.sut.is_active(), False, "The reported is active value should match the relay's value.")
+
+    async def test_turns_on_relay_when_current_temp_below_target_minus_hysteresis(self):
+        self.current_temperature = 15.0
+        self.sut.set_target_temperature_celcius(16.0)
+
+        await self.sut._check_and_control_temperature()
+
+        self.assertEqual(self.mock_relay.turn_on_call_count, 1, "The relay should be switched on to meet the target temperature (including hysteresis).")
+
+    async def test_held_relay_is_not_logged_as_switching(self):
+        # MockRelay's state doesn't change, as if held off by a ProtectedRelay's minimum off time.
+        self.current_temperature = 15.0
+        self.sut.set_target_temperature_celcius(16.0)
+
+        with self.assertLogs('utils.thermostat', level='DEBUG') as logs:
+            await self.sut._check_and_control_temperature()
+
+        self.assertFalse(any('Turning ON' in line for line in logs.output), "Only a real switch should be logged as one.")
+        self.assertTrue(any(line.startswith('DEBUG') and 'Held OFF' in line for line in logs.output))
+
+    async def test_turns_off_relay_when_current_temp_above_target_plus_hysteresis(self):
+        self.current_temperature = 21.0
+        self.mock_relay.value_to_return_for_is_active = True # Relay must be on for it to turn off in this branch.
+        self.sut.set_target_temperature_celcius(20)
+
+        await self.sut._check_and_control_temperature()
+
+        self.assertEqual(self.mock_relay.turn_off_call_count, 1, "The relay should be switched off when temp is above the target temperature (including hysteresis).")
+
+    async def test_stop_turns_off_relay(self):
+        await self.sut.stop()
+
+        self.assertEqual(self.mock_relay.turn_off_call_count, 1, "The relay should be turned off on stop.")
+
+    async def test_shutdown_calls_relay_cleanup(self):
+        await self.sut.shutdown()
+
+        self.assertEqual(self.mock_relay.cleanup_call_count, 1, "Cleanup method should be called on shutdown.")
+
+    async def test_control_decision_is_published(self):
+        event_bus = EventBus()
+        subscription = event_bus.subscribe([ControlDecision])
+        self.sut = Thermostat(self.mock_relay, sampler=self.sampler, zone=3, event_bus=event_bus)
+        self.current_temperature = 15.0
+
+        await self.sut._check_and_control_temperature()
+
+        decisions = subscription.drain()
+        self.assertEqual([(decision.zone, decision.should_heat) for decision in decisions], [(3, True)], "Each control check should publish whether the heating should be on.")
+
+    async def test_target_and_mode_changes_are_published(self):
+        event_bus = EventBus()
+        subscription = event_bus.subscribe([TargetTemperatureChanged, ModeChanged])
+        self.sut = Thermostat(self.mock_relay, sampler=self.sampler, zone=1, event_bus=event_bus)
+
+        self.sut.set_target_temperature_celcius(21.0)
+        await self.sut.stop()
+
+        self.assertEqual(subscription.drain(), [TargetTemperatureChanged(1, 21.0), ModeChanged(1, False)], "Target and mode changes should be published in order.")
+
+    async def test_control_loop_holds_heating_off_until_the_sensor_appears(self):
+        self.sut = Thermostat(self.mock_relay, sampler=self.sampler, control_interval=0.01)
+        self.mock_relay.value_to_return_for_is_active = True
+        self.current_temperature = None # The sensor hasn't appeared on the bus yet.
+
+        await self.sut.start()
+        await asyncio.sleep(0.05)
+        self.mock_relay.value_to_return_for_is_active = False
+        self.current_temperature = 15.0
+        await asyncio.sleep(0.05)
+        await self.sut.stop()
+
+        self.assertGreaterEqual(self.mock_relay.turn_off_call_count, 2, "The heating should be held off while the sensor can't be read.")
+        self.assertGreaterEqual(self.mock_relay.turn_on_call_count, 1, "The control loop should keep retrying and heat once the sensor is read.")
+
+    async def test_target_change_wakes_an_idle_control_loop(self):
+        self.sut = Thermostat(self.mock_relay, sampler=self.sampler, tick_scheduler=AdaptiveTickScheduler(min_interval=0.01, max_interval=300))
+        self.current_temperature = 19.7 # Below the 20°C target, but above its lower threshold.
+
+        await self.sut.start()
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.mock_relay.turn_on_call_count, 0)
+        self.sut.set_target_temperature_celcius(22.0)
+        await asyncio.sleep(0.05)
+        await self.sut.stop()
+
+        self.assertGreaterEqual(self.mock_relay.turn_on_call_count, 1, "A new target should be acted on straight away rather than after the sleep.")
+
+if __name__ == '__main__':
+    unittest.main()
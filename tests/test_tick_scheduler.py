@@ -0,0 +1,44 @@
+import asyncio
+import unittest
+from utils.tick_scheduler import AdaptiveTickScheduler
+
+class AdaptiveTickSchedulerTests(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.sut = AdaptiveTickScheduler(min_interval=2, max_interval=300, active_interval=5)
+
+    def _feed(self, temperatures, is_active=False, target=20.0, step=60):
+        for index, temperature in enumerate(temperatures):
+            interval = self.sut.next_interval(temperature, target, 0.5, is_active, index * step)
+        return interval
+
+    def test_uses_the_active_interval_until_there_is_a_slope(self):
+        self.assertEqual(self._feed([23.0]), 5)
+
+    def test_steady_room_far_above_target_sleeps_for_the_max_interval(self):
+        self.assertEqual(self._feed([23.0, 23.0, 23.0, 23.0]), 300)
+
+    def test_checks_more_often_as_the_room_cools_towards_the_threshold(self):
+        far = self._feed([21.0, 20.95, 20.9, 20.85]) # Cooling at 3°C per hour, 1.35°C above the threshold.
+        self.sut = AdaptiveTickScheduler(min_interval=2, max_interval=300, active_interval=5)
+        near = self._feed([19.7, 19.65, 19.6, 19.55]) # 0.05°C above it.
+
+        self.assertAlmostEqual(far, 300)
+        self.assertAlmostEqual(near, 30, msg="Half the predicted time to reach the threshold.")
+
+    def test_past_the_threshold_uses_the_min_interval(self):
+        self.assertEqual(self._feed([19.0]), 2)
+
+    def test_heating_never_sleeps_longer_than_the_active_interval(self):
+        self.assertEqual(self._feed([15.0, 15.0, 15.0], is_active=True), 5)
+
+    async def test_wake_ends_the_sleep(self):
+        task = asyncio.create_task(self.sut.sleep(60))
+        await asyncio.sleep(0)
+        self.sut.wake()
+
+        self.assertTrue(await asyncio.wait_for(task, timeout=1), "The sleep should report it was woken.")
+        self.assertFalse(await self.sut.sleep(0.01), "The wake shouldn't carry over to the next sleep.")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import asyncio
+import unittest
+from datetime import datetime, timezone
+from aiohttp import web
+from utils.weather_api import WeatherClient
+
+def make_response(current, hourly):
+    return {'data': {'timelines': [
+        {'timestep': 'current', 'intervals': [{'startTime': '2024-01-01T12:30:00Z', 'values': {'temperature': current}}]},
+        {'timestep': '1h', 'intervals': [{'startTime': f'2024-01-01T{hour:02d}:00:00Z', 'values': {'temperature': temperature}} for hour, temperature in hourly]}
+    ]}}
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+# Runs against a local stub of the tomorrow.io timelines endpoint, so no network or API key is needed.
+class WeatherClientTests(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.request_count = 0
+        self.status = 200
+        self.response = make_response(5.0, [(13, 6.0), (14, 8.0)])
+
+        app = web.Application()
+        app.router.add_get('/v4/timelines', self._handle_timelines)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        self.clock = FakeClock()
+        self.sut = WeatherClient(api_key='key', location='0,0', base_url=f'http://127.0.0.1:{port}/v4/timelines', ttl=900, clock=self.clock)
+
+    async def asyncTearDown(self):
+        await self.sut.close()
+        await self.runner.cleanup()
+
+    async def _handle_timelines(self, request):
+        self.request_count += 1
+        self.timesteps = request.query.get('timesteps')
+        if self.status != 200:
+            return web.Response(status=self.status)
+        return web.json_response(self.response)
+
+    async def test_current_and_hourly_forecast_are_fetched_in_one_request(self):
+        await self.sut.forecast()
+
+        self.assertEqual(self.request_count, 1, "The forecast should be fetched in a single request.")
+        self.assertEqual(self.timesteps, 'current,1h', "Both the current and hourly timelines should be requested.")
+
+    async def test_temperature_is_interpolated_between_forecast_points(self):
+        temperature = await self.sut.temperature_at(datetime(2024, 1, 1, 13, 30, tzinfo=timezone.utc))
+
+        self.assertAlmostEqual(temperature, 7.0, msg="The temperature should be interpolated between hourly points.")
+
+    async def test_cached_temperature_is_none_past_the_end_of_the_forecast(self):
+        await self.sut.forecast()
+
+        self.assertAlmostEqual(self.sut.cached_temperature(datetime(2024, 1, 1, 13, 30, tzinfo=timezone.utc)), 7.0)
+        self.assertIsNone(self.sut.cached_temperature(datetime(2024, 1, 1, 15, 0, tzinfo=timezone.utc)), "Past the forecast shouldn't be clamped to its last hour.")
+
+    async def test_temperature_past_the_end_of_the_forecast_is_not_clamped(self):
+        with self.assertRaises(RuntimeError):
+            await self.sut.temperature_at(datetime(2024, 1, 1, 15, 0, tzinfo=timezone.utc))
+
+    async def test_forecast_older_than_max_age_is_not_served(self):
+        await self.sut.get_temperature()
+        self.status = 500
+        self.clock.now = 10801
+
+        with self.assertRaises(RuntimeError):
+            await self.sut.get_temperature()
+        self.assertIsNone(self.sut.cached_temperature(datetime(2024, 1, 1, 13, 30, tzinfo=timezone.utc)))
+
+    async def test_fresh_forecast_is_served_from_cache(self):
+        await self.sut.get_temperature()
+        self.clock.now = 899
+
+        await self.sut.get_temperature()
+
+        self.assertEqual(self.request_count, 1, "A fresh forecast should be served without another request.")
+
+    async def test_stale_forecast_is_served_while_revalidating(self):
+        await self.sut.forecast()
+        self.response = make_response(10.0, [(13, 11.0)])
+        self.clock.now = 1000
+
+        stale = await self.sut.temperature_at(datetime(2024, 1, 1, 12, 30, tzinfo=timezone.utc))
+        await self.sut._refresh_task
+        fresh = await self.sut.temperature_at(datetime(2024, 1, 1, 12, 30, tzinfo=timezone.utc))
+
+        self.assertEqual(stale, 5.0, "The stale forecast should be returned immediately.")
+        self.assertEqual(fresh, 10.0, "The forecast should have been refreshed in the background.")
+
+    async def test_concurrent_callers_share_the_first_fetch(self):
+        temperatures = await asyncio.gather(*(self.sut.get_temperature() for _ in range(3)))
+
+        self.assertEqual(len(set(temperatures)), 1)
+        self.assertEqual(self.request_count, 1, "Callers waiting for the first forecast should share one request.")
+
+    async def test_failures_back_off(self):
+        self.status = 429
+
+        with self.assertRaises(Exception):
+            await self.sut.get_temperature()
+        with self.assertRaises(Exception):
+            await self.sut.get_temperature()
+
+        self.assertEqual(self.request_count, 1, "No request should be made while backing off.")
+
+if __name__ == '__main__':
+    unittest.main()
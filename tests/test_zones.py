@@ -0,0 +1,35 @@
+import json
+import os
+import tempfile
+import unittest
+from utils.zones import load_zones
+
+class LoadZonesTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'zones.json')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _load(self, **fields):
+        with open(self.path, 'w') as f:
+            json.dump([{"zone": 3, "name": "Office Thermostat", "sensor_id": "28-a", "relay_pin": 26, **fields}], f)
+        return load_zones(self.path)
+
+    def test_strategy_options_are_loaded(self):
+        zones = self._load(strategy='predictive', strategy_options={'coast_time': 2400})
+
+        self.assertEqual(zones[0].strategy_options, {'coast_time': 2400})
+
+    def test_strategy_options_must_be_an_object(self):
+        with self.assertRaisesRegex(ValueError, "Zone 3 must have strategy_options as an object"):
+            self._load(strategy_options=[0.3])
+
+    def test_options_the_strategy_does_not_take_are_rejected(self):
+        with self.assertRaisesRegex(ValueError, "Zone 3 has unknown hysteresis strategy option\\(s\\) coast_time"):
+            self._load(strategy_options={'hysteresis': 0.3, 'coast_time': 2400})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,197 @@
+"""
+Exports `temperature_logs` to compressed columnar files for offline analysis, so model fitting and backtests can run on a laptop against
+memory-mapped files rather than the Pi's database, and cold data can be moved off the SD card.
+
+Rows are streamed from Postgres through a server-side cursor a batch at a time, so memory stays bounded, and written to one file per zone
+per month in a Hive-style layout that `pyarrow.dataset` (and pandas, Polars or DuckDB) read as a single table with `zone` and `month`
+columns:
+
+    archive/zone=3/month=2024-01/part-20240101T000412.parquet
+    archive/export_state.json
+
+Exports are incremental: `export_state.json` records the last exported timestamp per zone, and the next run carries on after it, writing
+new part files alongside the old ones. It's updated as each file is finished, so an interrupted export resumes where it stopped. Rows
+logged in the last `--settle-hours` (24 by default) aren't exported yet, because a backlog replayed after an outage can still be inserting
+rows older than the newest ones.
+
+Parquet (zstd by default) is smallest. Arrow IPC files (`--format arrow --compression none`) are larger but can be memory-mapped with no
+decoding at all. Needs `pyarrow`, which isn't installed on the Pi by default; run the export wherever it's installed with access to the
+database.
+
+Usage:
+    python -m utils.archive --output archive/
+    python -m utils.archive --output archive/ --zone 3 --format arrow --compression none
+
+Reading the archive:
+    import pyarrow.dataset as ds
+    table = ds.dataset('archive/', format='parquet', partitioning='hive').to_table(filter=ds.field('zone') == 3)
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional
+
+STATE_FILE = 'export_state.json'
+
+FORMATS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+def load_export_state(output_dir: str) -> Dict[int, datetime]:
+    """The last exported timestamp per zone, or an empty dictionary for a new archive."""
+    try:
+        with open(os.path.join(output_dir, STATE_FILE), 'r') as f:
+            return {int(zone): datetime.fromisoformat(timestamp) for zone, timestamp in json.load(f).items()}
+    except FileNotFoundError:
+        return {}
+
+def save_export_state(output_dir: str, state: Dict[int, datetime]):
+    path = os.path.join(output_dir, STATE_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump({str(zone): timestamp.isoformat() for zone, timestamp in sorted(state.items())}, f, indent=4)
+    os.replace(path + '.tmp', path)
+
+def part_path(output_dir: str, zone: int, first_timestamp: datetime, file_format: str = 'parquet') -> str:
+    """Where the part file starting with `first_timestamp` goes. Each export starts after the last, so part names never clash."""
+    return os.path.join(output_dir, f'zone={zone}', f'month={first_timestamp:%Y-%m}', f'part-{first_timestamp:%Y%m%dT%H%M%S}{FORMATS[file_format]}')
+
+def split_by_month(rows: List[tuple]) -> Iterable[List[tuple]]:
+    """Splits a time-ordered batch of rows (timestamp first) into runs within the same month."""
+    start = 0
+    for index in range(1, len(rows) + 1):
+        if index == len(rows) or (rows[index][0].year, rows[index][0].month) != (rows[start][0].year, rows[start][0].month):
+            yield rows[start:index]
+            start = index
+
+class _PartWriter:
+    """Writes record batches to one part file, under a temporary name until it's closed."""
+
+    def __init__(self, path: str, file_format: str, compression: Optional[str]):
+        import pyarrow as pa
+        import pyarrow.ipc
+        import pyarrow.parquet
+
+        self.path = path
+        self.rows = 0
+        self.last_timestamp = None
+        self._pa = pa
+        self._schema = pa.schema([
+            ('timestamp', pa.timestamp('us')),
+            ('indoor_temp', pa.float64()),
+            ('outdoor_temp', pa.float64()),
+            ('heating_status', pa.bool_()),
+            ('target_temp', pa.float64())
+        ])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._temp_path = path + '.tmp'
+        if file_format == 'parquet':
+            self._writer = pa.parquet.ParquetWriter(self._temp_path, self._schema, compression=compression or 'none')
+        else:
+            options = pa.ipc.IpcWriteOptions(compression=compression)
+            self._writer = pa.ipc.new_file(self._temp_path, self._schema, options=options)
+
+    def write(self, rows: List[tuple]):
+        columns = list(zip(*rows))
+        self._writer.write_table(self._pa.Table.from_arrays([self._pa.array(column, type=field.type) for column, field in zip(columns, self._schema)], schema=self._schema))
+        self.rows += len(rows)
+        self.last_timestamp = rows[-1][0]
+
+    def close(self):
+        self._writer.close()
+        os.replace(self._temp_path, self.path)
+
+def export_zone(batches: Iterable[List[tuple]], zone: int, output_dir: str, file_format: str = 'parquet', compression: Optional[str] = 'zstd', on_file_closed: Callable[[datetime], None] = None, writer_factory=_PartWriter) -> int:
+    """
+    Writes a zone's time-ordered batches of rows into one part file per month, returning the number of rows written.
+
+    Parameters:
+    batches (iterable): Lists of (timestamp, indoor_temp, outdoor_temp, heating_status, target_temp), i.e. from `stream_temperature_logs`.
+    on_file_closed (callable): Called with the last timestamp in each part file once it's safely written, to record progress.
+    """
+    writer = None
+    month = None
+    rows_written = 0
+
+    def finish(writer):
+        writer.close()
+        if on_file_closed is not None:
+            on_file_closed(writer.last_timestamp)
+
+    try:
+        for batch in batches:
+            for run in split_by_month(batch):
+                run_month = (run[0][0].year, run[0][0].month)
+                if writer is not None and run_month != month:
+                    finish(writer)
+                    writer = None
+                if writer is None:
+                    writer = writer_factory(part_path(output_dir, zone, run[0][0], file_format), file_format, compression)
+                    month = run_month
+                writer.write(run)
+                rows_written += len(run)
+    except BaseException:
+        if writer is not None:
+            # The unfinished file keeps its temporary name, and the state stays at the last finished file, so the next export redoes it.
+            logging.getLogger(__name__).warning("Export of zone %s interrupted; the next export resumes from the last finished file.", zone)
+        raise
+    if writer is not None:
+        finish(writer)
+    return rows_written
+
+def export(pool, output_dir: str, zones: Optional[List[int]] = None, settle_hours: float = 24, file_format: str = 'parquet', compression: Optional[str] = 'zstd', batch_size: int = 10000) -> Dict[int, int]:
+    """
+    Exports every zone's rows logged since the last export, returning the number of rows exported per zone.
+
+    Parameters:
+    pool (DatabasePool): The pool to stream the rows from.
+    zones (list): The zones to export. Defaults to every zone with logged history.
+    settle_hours (float): Rows logged more recently than this are left for the next export.
+    """
+    from .database import fetch_logged_zones, stream_temperature_logs
+
+    logger = logging.getLogger(__name__)
+    os.makedirs(output_dir, exist_ok=True)
+    state = load_export_state(output_dir)
+    until = datetime.now() - timedelta(hours=settle_hours)
+    exported = {}
+    for zone in zones if zones is not None else fetch_logged_zones(pool):
+        def record_progress(last_timestamp, zone=zone):
+            state[zone] = last_timestamp
+            save_export_state(output_dir, state)
+
+        batches = stream_temperature_logs(pool, zone, after=state.get(zone), until=until, batch_size=batch_size)
+        exported[zone] = export_zone(batches, zone, output_dir, file_format, compression, on_file_closed=record_progress)
+        logger.info("Exported %s rows for zone %s.", exported[zone], zone)
+    return exported
+
+def main():
+    from .database import DatabasePool
+
+    parser = argparse.ArgumentParser(description="Export temperature logs to compressed columnar files, carrying on from the last export.")
+    parser.add_argument('--output', required=True, help="The archive directory.")
+    parser.add_argument('--zone', type=int, nargs='+', help="The zones to export. Defaults to every zone with logged history.")
+    parser.add_argument('--format', choices=FORMATS, default='parquet', help="Parquet files, or Arrow IPC files that memory-map without decoding.")
+    parser.add_argument('--compression', default='zstd', help="zstd, lz4 or none (Parquet also supports snappy and gzip).")
+    parser.add_argument('--settle-hours', type=float, default=24, help="Leave rows logged more recently than this for the next export.")
+    parser.add_argument('--batch-size', type=int, default=10000, help="Rows fetched from the database at a time.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    try:
+        import pyarrow # noqa: F401
+    except ImportError:
+        raise SystemExit("Exporting needs pyarrow: pip install pyarrow")
+
+    pool = DatabasePool(max_connections=1)
+    start = time.monotonic()
+    try:
+        compression = None if args.compression == 'none' else args.compression
+        exported = export(pool, args.output, args.zone, args.settle_hours, args.format, compression, args.batch_size)
+    finally:
+        pool.close()
+    print(f"Exported {sum(exported.values())} rows from {len(exported)} zone(s) in {time.monotonic() - start:.1f}s.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import logging
+from collections import deque
+from typing import Optional, Protocol
+
+class ControlStrategy(Protocol):
+    """Decides whether the heating should be on. Strategies are per zone and can keep state between readings."""
+
+    hysteresis: float
+
+    def should_heat(self, current_temperature: float, target_temperature: float, is_active: bool, timestamp: float) -> bool:
+        """Returns True if the relay should be on, given a reading taken at `timestamp` (monotonic seconds)."""
+
+class HysteresisStrategy(ControlStrategy):
+    """
+    The original bang-bang control: turn ON below target - hysteresis, turn OFF above target + hysteresis, otherwise leave the relay alone.
+    """
+    def __init__(self, hysteresis: float = 0.5):
+        self.hysteresis = hysteresis
+
+    def should_heat(self, current_temperature, target_temperature, is_active, timestamp):
+        if not is_active and current_temperature < target_temperature - self.hysteresis:
+            return True
+        if is_active and current_temperature > target_temperature + self.hysteresis:
+            return False
+        return is_active
+
+class RollingSlope:
+    """
+    The least-squares slope of timestamped readings over a rolling time window, maintained in O(1) per reading with running sums.
+
+    Methods:
+        add(timestamp, value): Adds a reading, dropping readings older than the window.
+        reset(): Forgets every reading.
+        slope: The fitted rate of change per second, or None with fewer than `min_samples` readings.
+    """
+    def __init__(self, window: float, min_samples: int = 3):
+        self._window = window
+        self._min_samples = min_samples
+        self.reset()
+
+    def reset(self):
+        self._samples = deque()
+        self._origin = None
+        self._sum_x = self._sum_y = self._sum_xx = self._sum_xy = 0.0
+
+    def add(self, timestamp: float, value: float):
+        if self._samples and timestamp <= self._samples[-1][0]:
+            return # The same cached reading seen twice.
+        if self._origin is None:
+            self._origin = timestamp # Keep x small so the running sums don't lose precision.
+        x = timestamp - self._origin
+        self._samples.append((timestamp, x, value))
+        self._sum_x += x
+        self._sum_y += value
+        self._sum_xx += x * x
+        self._sum_xy += x * value
+
+        while self._samples and self._samples[0][0] < timestamp - self._window:
+            _, old_x, old_value = self._samples.popleft()
+            self._sum_x -= old_x
+            self._sum_y -= old_value
+            self._sum_xx -= old_x * old_x
+            self._sum_xy -= old_x * old_value
+
+    @property
+    def slope(self) -> Optional[float]:
+        n = len(self._samples)
+        if n < self._min_samples:
+            return None
+        denominator = n * self._sum_xx - self._sum_x * self._sum_x
+        if denominator <= 0:
+            return None
+        return (n * self._sum_xy - self._sum_x * self._sum_y) / denominator
+
+class PredictiveStrategy(ControlStrategy):
+    """
+    Rate-of-change control for underfloor heating, which keeps heating the room for a long time after the relay switches off.
+
+    While heating, the slope of recent readings is fitted over a rolling window. The room is predicted to coast up by roughly
+    `slope * coast_time` once the relay turns off, so the relay is turned off as soon as that predicted coast temperature reaches the target,
+    rather than waiting for the room to overshoot to target + hysteresis. Turning on is the same as `HysteresisStrategy`.
+
+    Key Attributes:
+        hysteresis (float): Temperature leeway either side of the target.
+        _coast_time (float): Seconds the floor keeps heating at the current rate after the relay turns off; roughly its thermal time constant.
+        _slope (RollingSlope): The heating rate over the last `window` seconds of readings.
+    """
+    def __init__(self, hysteresis: float = 0.5, window: float = 900, coast_time: float = 1800):
+        self._logger = logging.getLogger(__name__)
+        self.hysteresis = hysteresis
+        self._coast_time = coast_time
+        self._slope = RollingSlope(window)
+        self._was_active = None
+
+    @property
+    def coast_time(self) -> float:
+        return self._coast_time
+
+    @coast_time.setter
+    def coast_time(self, seconds: float):
+        self._coast_time = seconds
+
+    def predicted_coast_temperature(self, current_temperature: float) -> float:
+        slope = self._slope.slope
+        if slope is None or slope <= 0:
+            return current_temperature
+        return current_temperature + slope * self._coast_time
+
+    def should_heat(self, current_temperature, target_temperature, is_active, timestamp):
+        # A slope fitted across a relay transition mixes heating and cooling, so start a new window each time the relay switches.
+        if is_active != self._was_active:
+            self._slope.reset()
+            self._was_active = is_active
+        self._slope.add(timestamp, current_temperature)
+
+        if not is_active:
+            return current_temperature < target_temperature - self.hysteresis
+
+        if current_temperature > target_temperature + self.hysteresis:
+            return False
+        predicted_temperature = self.predicted_coast_temperature(current_temperature)
+        if predicted_temperature >= target_temperature:
+            # Only a decision: the relay may be held on, so the thermostat logs the switch when it happens.
+            self._logger.debug("Predicted coast temperature (%.2f°C) will reach target (%s°C).", predicted_temperature, target_temperature)
+            return False
+        return True
+
+STRATEGIES = {
+    'hysteresis': HysteresisStrategy,
+    'predictive': PredictiveStrategy,
+}
+
+def create_strategy(name: str = 'hysteresis', **options) -> ControlStrategy:
+    """Creates a control strategy by name (as used in `zones.json`), passing any options to its initializer."""
+    try:
+        return STRATEGIES[name](**options)
+    except KeyError:
+        raise ValueError(f"Unknown control strategy '{name}'. Choose from: {', '.join(STRATEGIES)}.")
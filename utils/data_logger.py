@@ -1,78 +1,69 @@
 import asyncio
-from .weather_api import get_temperature
-from .database import insert_temperature_log
+from datetime import datetime
+from .weather_api import WeatherClient
+from .database import TemperatureLog, TemperatureLogWriter
 from .error_reporter import ErrorReporter
+from .event_bus import COALESCE, EventBus, TemperatureSampled
 import logging
 
 class DataLogger:
     """
-    A class for logging temperature data periodically to a database.
+    A class for logging temperature data periodically to a database. Every zone is logged in one batch per tick.
     
+    Zones aren't registered or polled: the logger subscribes to the thermostats' `TemperatureSampled` events, coalescing them so only the
+    latest sample per zone is kept between ticks. Logging never triggers a sensor read, and however long a tick takes, its queue can't grow.
+    Rows are handed to a `TemperatureLogWriter`, which writes them from a background thread, so logging never blocks the event loop.
+
     Attributes:
-        _zone (int): The heating zone identifier for which data is logged.
-        _temperature_callback (callable): A callback function that returns the current indoor temperature.
-        _target_temperature_callback (callable): A callback function that returns the target temperature.
-        _is_active_callback (callable): A callback function that returns the heating system's current state.
+        _writer (TemperatureLogWriter): The batched database writer rows are queued on.
+        _weather_client (WeatherClient): Cached source of the outdoor temperature. Rows are logged with no outdoor temperature if it's unavailable.
+        _event_bus (EventBus): The bus temperature samples are received from.
+        _interval (float): Seconds between each batch of logs.
         _error_reporter (ErrorReporter): An instance of ErrorReporter for logging errors.
         _logger (Logger): A logging instance for logging information and errors.
-        
+
     Methods:
-        set_temperature_callback(callback): Sets the temperature callback.
-        set_target_temperature_callback(callback): Sets the target temperature callback.
-        set_is_active_callback(callback): Sets the active state callback.
-        log_data_periodically(): Logs data every 10 minutes to the database.
+        log_data_periodically(): Logs the latest sample for every zone every `interval` seconds (10 minutes by default) to the database.
     """
-    def __init__(self, zone: int):
+    def __init__(self, writer: TemperatureLogWriter, weather_client: WeatherClient, error_reporter: ErrorReporter, event_bus: EventBus, interval: float = 600):
         self._logger = logging.getLogger(__name__)
-        self._zone = zone
-        self._temperature_callback = None
-        self._target_temperature_callback = None
-        self._is_active_callback = None
-        self._error_reporter = ErrorReporter()
-        
-    def set_temperature_callback(self, callback):
-        self._temperature_callback = callback
-        
-    def set_target_temperature_callback(self, callback):
-        self._target_temperature_callback = callback
-        
-    def set_is_active_callback(self, callback):
-        self._is_active_callback = callback
-        
-    async def log_data_periodically(self):
-        while True:
-            current_temperature = None
-            target_temperature = None
-            current_state = None
-            outdoor_temperature = None
-            
-            try:
-                if self._temperature_callback:
-                    current_temperature = await self._temperature_callback()
-                else:
-                    self._error_reporter.report_error("Temperature callback is not set.")
+        self._writer = writer
+        self._weather_client = weather_client
+        self._event_bus = event_bus
+        self._interval = interval
+        self._error_reporter = error_reporter
 
-                if self._target_temperature_callback:
-                    target_temperature = self._target_temperature_callback()
-                else:
-                    self._error_reporter.report_error("Target temperature callback is not set.")
-
-                if self._is_active_callback:
-                    current_state = self._is_active_callback()
-                else:
-                    self._error_reporter.report_error("Active state callback is not set.")
+    async def log_data_periodically(self):
+        subscription = self._event_bus.subscribe([TemperatureSampled], policy=COALESCE)
+        try:
+            while True:
+                await asyncio.sleep(self._interval)
+                try:
+                    samples = subscription.drain()
+                    if not samples:
+                        self._logger.warning("No temperature samples received: Cannot log temperature data.")
+                        self._error_reporter.report_error("No temperature samples received: Cannot log temperature data.")
+                        continue
 
-                outdoor_temperature = await get_temperature()
+                    outdoor_temperature = await self._outdoor_temperature()
+                    for sample in samples:
+                        timestamp = datetime.fromtimestamp(sample.timestamp)
+                        self._writer.write(TemperatureLog(zone=sample.zone, indoor_temp=sample.temperature, outdoor_temp=outdoor_temperature, heating_status=sample.heating, target_temp=sample.target_temperature, timestamp=timestamp))
+                        self._logger.info("Zone: %s, Current Temperature: %s°C, Outdoor Temperature: %s°C, Current State: %s, Target Temperature: %s°C", sample.zone, sample.temperature, outdoor_temperature, sample.heating, sample.target_temperature)
 
-                # Insert log only if all required data is available
-                if current_temperature is not None and target_temperature is not None and current_state is not None:
-                    insert_temperature_log(zone=self._zone, indoor_temp=current_temperature, outdoor_temp=outdoor_temperature, heating_status=current_state, target_temp=target_temperature)
-                    self._logger.info("Zone: %s, Current Temperature: %s°C, Outdoor Temperature: %s°C, Current State: %s, Target Temperature: %s°C", self._zone, current_temperature, outdoor_temperature, current_state, target_temperature)
-                else:
-                    self._error_reporter.report_error("Missing one or more required parameters: Cannot log temperature data.")
+                except Exception as e:
+                    error_message = f"Error occurred while logging data: {e}"
+                    self._logger.error(error_message, exc_info=True)
+                    self._error_reporter.report_error(error_message)
+        finally:
+            subscription.close()
 
-            except Exception as e:
-                error_message = f"Error occurred while logging data: {e}"
-                self._error_reporter.report_error(error_message)
+    # Private Methods
 
-            await asyncio.sleep(600)  # 600 seconds = 10 minutes
\ No newline at end of file
+    async def _outdoor_temperature(self):
+        # The samples are already drained, so a weather outage mustn't lose them: log them without an outdoor temperature instead.
+        try:
+            return await self._weather_client.get_temperature()
+        except Exception as e:
+            self._logger.warning("Outdoor temperature unavailable, logging without it: %s", e)
+            return None
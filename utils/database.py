@@ -1,49 +1,384 @@
 import psycopg2
+import psycopg2.extras
+import psycopg2.pool
 import os
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+from typing import NamedTuple
 from dotenv import load_dotenv
+from . import metrics
+from . import schema
 
 # Load environment variables from .env file
 load_dotenv()
 
-def insert_temperature_log(zone, indoor_temp, outdoor_temp, heating_status, target_temp):
+DB_WRITE_SECONDS = metrics.histogram('thermopi_db_write_seconds', "Time to insert a batch of temperature logs.")
+DB_BATCH_SIZE = metrics.histogram('thermopi_db_batch_size', "Temperature logs inserted per batch.", buckets=(1, 5, 10, 50, 100, 500, 1000))
+DB_WRITE_ERRORS = metrics.counter('thermopi_db_write_errors_total', "Failed attempts to write buffered temperature logs.")
+DB_PENDING_LOGS = metrics.gauge('thermopi_db_pending_logs', "Temperature logs buffered locally and not yet written.")
+
+class TemperatureLog(NamedTuple):
+    zone: int # The zone number.
+    indoor_temp: float # The indoor temperature.
+    outdoor_temp: float # The outdoor temperature.
+    heating_status: bool # The heating status (True for on, False for off).
+    target_temp: float # The target temperature.
+    timestamp: datetime # When the reading was taken. Rows are written in batches, so this can't be left to the database default.
+
+# Inserts a batch and merges it into the hourly and daily rollups in one statement, so the rollups never lag the raw rows.
+INSERT_TEMPERATURE_LOGS_QUERY = f"""
+WITH batch AS (
+    INSERT INTO temperature_logs ({schema.LOG_COLUMNS})
+    VALUES %s
+    RETURNING {schema.LOG_COLUMNS}
+), hourly AS ({schema.rollup_upsert('hour', 'batch')})
+{schema.rollup_upsert('day', 'batch')}
+"""
+
+# Seconds between runs of the schema maintenance (new partitions and retention) by the writer.
+SCHEMA_MAINTENANCE_INTERVAL = 86400
+
+class DatabasePool:
     """
-    Inserts a temperature log entry into the database.
+    A long-lived pool of Postgres connections, so callers don't pay for a TCP and auth handshake on every query.
+
+    Connections that fail are discarded rather than returned to the pool, so the next caller transparently reconnects.
+
+    Methods:
+        connection(): Context manager lending a connection from the pool. Commits on success and rolls back on error.
+        close(): Closes every connection in the pool.
+    """
+    def __init__(self, max_connections: int = 2):
+        self._logger = logging.getLogger(__name__)
+        self._max_connections = max_connections
+        self._pool = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        pool = self._get_pool()
+        conn = pool.getconn()
+        broken = False
+        try:
+            yield conn
+            conn.commit()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            # The connection has dropped (i.e. Postgres restarted), so throw it away and reconnect next time.
+            broken = True
+            raise
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            pool.putconn(conn, close=broken or bool(conn.closed))
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+
+    def _get_pool(self):
+        # The pool is created lazily so a missing database doesn't stop the thermostat starting.
+        with self._lock:
+            if self._pool is None:
+                self._pool = psycopg2.pool.ThreadedConnectionPool(
+                    minconn=0,
+                    maxconn=self._max_connections,
+                    dbname=os.getenv("DB_NAME"),
+                    user=os.getenv("DB_USER"),
+                    password=os.getenv("DB_PASSWORD"),
+                    host=os.getenv("DB_HOST")
+                )
+            return self._pool
+
+def insert_temperature_logs(pool: DatabasePool, rows):
+    """
+    Inserts a batch of temperature log entries into the database in a single statement and transaction.
 
     Parameters:
-    zone (int): The zone number.
-    indoor_temp (float): The indoor temperature.
-    outdoor_temp (float): The outdoor temperature.
-    heating_status (bool): The heating status (True for on, False for off).
-    target_temp (float): The target temperature.
+    pool (DatabasePool): The pool to borrow a connection from.
+    rows (list): The `TemperatureLog` entries to insert.
 
     Raises:
     Exception: Rethrows any database-related exceptions to be handled by the caller.
     """
-    
     try:
-        # Database connection parameters
-        conn = psycopg2.connect(
-            dbname=os.getenv("DB_NAME"),
-            user=os.getenv("DB_USER"),
-            password=os.getenv("DB_PASSWORD"),
-            host=os.getenv("DB_HOST")
-        )
-        cur = conn.cursor()
-
-        # Insert data
+        with pool.connection() as conn:
+            with conn.cursor() as cur:
+                # execute_values sends the whole batch as one multi-row INSERT rather than a round trip per row.
+                psycopg2.extras.execute_values(cur, INSERT_TEMPERATURE_LOGS_QUERY, rows, page_size=max(len(rows), 1))
+    except psycopg2.DatabaseError as e:
+        raise Exception(f"Database write failed: {e}")
+
+def fetch_temperature_history(pool: DatabasePool, zone: int, since: datetime = None, until: datetime = None) -> dict:
+    """
+    Fetches a zone's logged history in bulk, ordered by time, as a dictionary of column name to list.
+
+    Timestamps are returned as unix seconds and missing outdoor temperatures as NaN, so the columns convert straight into NumPy arrays.
+
+    Parameters:
+    pool (DatabasePool): The pool to borrow a connection from.
+    zone (int): The zone to fetch.
+    since (datetime): Only fetch rows logged at or after this time.
+    until (datetime): Only fetch rows logged before this time.
+    """
+    query = """
+    SELECT EXTRACT(EPOCH FROM timestamp)::float8, indoor_temp, COALESCE(outdoor_temp, 'NaN'::float8), heating_status::int, target_temp
+    FROM temperature_logs
+    WHERE zone = %s AND timestamp >= COALESCE(%s, '-infinity'::timestamp) AND timestamp < COALESCE(%s, 'infinity'::timestamp)
+    ORDER BY timestamp
+    """
+    with pool.connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(query, (zone, since, until))
+            rows = cur.fetchall()
+
+    columns = ('timestamp', 'indoor_temp', 'outdoor_temp', 'heating_status', 'target_temp')
+    values = list(zip(*rows)) if rows else [()] * len(columns)
+    return {column: list(value) for column, value in zip(columns, values)}
+
+def stream_temperature_logs(pool: DatabasePool, zone: int, after: datetime = None, until: datetime = None, batch_size: int = 10000):
+    """
+    Streams a zone's logged rows in time order through a server-side cursor, yielding lists of up to `batch_size`
+    (timestamp, indoor_temp, outdoor_temp, heating_status, target_temp) tuples, so memory stays bounded however much history there is.
+
+    Parameters:
+    pool (DatabasePool): The pool to borrow a connection from. It's held until the generator is exhausted or closed.
+    zone (int): The zone to stream.
+    after (datetime): Only stream rows logged after this time.
+    until (datetime): Only stream rows logged before this time.
+    batch_size (int): Rows fetched from the server, and yielded, at a time.
+    """
+    query = """
+    SELECT timestamp, indoor_temp, outdoor_temp, heating_status, target_temp
+    FROM temperature_logs
+    WHERE zone = %s AND timestamp > COALESCE(%s, '-infinity'::timestamp) AND timestamp < COALESCE(%s, 'infinity'::timestamp)
+    ORDER BY timestamp
+    """
+    with pool.connection() as conn:
+        # Naming the cursor makes it server-side, so Postgres holds the result set and we fetch it a batch at a time.
+        with conn.cursor(name=f'stream_temperature_logs_{zone}') as cur:
+            cur.itersize = batch_size
+            cur.execute(query, (zone, after, until))
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield rows
+
+def fetch_logged_zones(pool: DatabasePool) -> list:
+    """The zones with logged history, from the daily rollup rather than a scan of every row."""
+    with pool.connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT DISTINCT zone FROM {schema.ROLLUP_TABLES['day']} ORDER BY zone")
+            return [zone for zone, in cur.fetchall()]
+
+# The `date_trunc` units history can be aggregated by, with their (approximate, for months) length in seconds.
+ROLLUP_UNITS = {'minute': 60, 'hour': 3600, 'day': 86400, 'week': 604800, 'month': 2629800}
+
+def fetch_temperature_rollup(pool: DatabasePool, zone: int, unit: str, since: datetime = None, until: datetime = None) -> dict:
+    """
+    Fetches a zone's logged history aggregated into `date_trunc` buckets by Postgres, so long ranges don't pull every raw row over the wire.
+    Hourly and longer buckets are aggregated from the rollup tables (see `schema.py`) rather than the raw rows, taking every rollup bucket
+    that starts within the range.
+
+    Returns a dictionary of column name to list: the bucket start as unix seconds, the indoor min, max and mean, the mean outdoor and target
+    temperatures, the fraction of readings with the heating on and the number of readings. Buckets without an outdoor temperature are NaN.
+
+    Parameters:
+    pool (DatabasePool): The pool to borrow a connection from.
+    zone (int): The zone to fetch.
+    unit (str): The bucket size, one of `ROLLUP_UNITS`.
+    since (datetime): Only aggregate rows logged at or after this time.
+    until (datetime): Only aggregate rows logged before this time.
+    """
+    if unit not in ROLLUP_UNITS:
+        raise ValueError(f"Unknown rollup unit '{unit}'. Choose from: {', '.join(ROLLUP_UNITS)}.")
+    if ROLLUP_UNITS[unit] >= ROLLUP_UNITS['hour']:
+        table = schema.ROLLUP_TABLES['hour' if unit == 'hour' else 'day']
+        query = f"""
+        SELECT EXTRACT(EPOCH FROM date_trunc(%s, bucket))::float8 AS period,
+            min(indoor_min), max(indoor_max), sum(indoor_sum) / sum(readings),
+            COALESCE(sum(outdoor_sum) / NULLIF(sum(outdoor_readings), 0), 'NaN'::float8), sum(target_sum) / sum(readings),
+            sum(heating_readings)::float8 / sum(readings), sum(readings)
+        FROM {table}
+        WHERE zone = %s AND bucket >= COALESCE(%s, '-infinity'::timestamp) AND bucket < COALESCE(%s, 'infinity'::timestamp)
+        GROUP BY period
+        ORDER BY period
+        """
+    else:
         query = """
-        INSERT INTO temperature_logs (zone, indoor_temp, outdoor_temp, heating_status, target_temp)
-        VALUES (%s, %s, %s, %s, %s)
+        SELECT EXTRACT(EPOCH FROM date_trunc(%s, timestamp))::float8 AS bucket,
+            min(indoor_temp), max(indoor_temp), avg(indoor_temp),
+            COALESCE(avg(outdoor_temp), 'NaN'::float8), avg(target_temp), avg(heating_status::int)::float8, count(*)
+        FROM temperature_logs
+        WHERE zone = %s AND timestamp >= COALESCE(%s, '-infinity'::timestamp) AND timestamp < COALESCE(%s, 'infinity'::timestamp)
+        GROUP BY bucket
+        ORDER BY bucket
         """
-        data = (zone, indoor_temp, outdoor_temp, heating_status, target_temp)
+    with pool.connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(query, (unit, zone, since, until))
+            rows = cur.fetchall()
 
-        cur.execute(query, data)
-        conn.commit()
-    except psycopg2.DatabaseError as e:
-        raise Exception(f"Database write failed: {e}")
-    finally:
-        # Close the cursor and connection safely
-        if cur is not None:
-            cur.close()
-        if conn is not None:
-            conn.close()
\ No newline at end of file
+    columns = ('timestamp', 'indoor_min', 'indoor_max', 'indoor_mean', 'outdoor_mean', 'target_mean', 'heating_fraction', 'count')
+    values = list(zip(*rows)) if rows else [()] * len(columns)
+    return {column: [float(item) if column != 'count' else int(item) for item in value] for column, value in zip(columns, values)}
+
+class TemperatureLogWriter:
+    """
+    Writes temperature logs to Postgres in batches from a background thread, so the asyncio loop (and with it HomeKit and the control loop)
+    never waits on the disk or the database.
+
+    Every log goes into a durable `LogBuffer` on local disk first. The writer thread syncs the buffer to disk every `sync_interval` seconds,
+    then drains it into Postgres once `batch_size` logs are waiting or `flush_interval` seconds have passed. If the database is unreachable
+    the logs stay in the buffer and the drain is retried with exponential backoff; once Postgres is back the backlog is replayed in batches of
+    up to `drain_batch_size`, and the connection is re-established automatically.
+
+    Before its first write the writer applies any pending schema migrations, and once a day it creates upcoming partitions and applies the
+    retention policy (see `schema.py`).
+
+    Key Attributes:
+        _buffer (LogBuffer): The local write-ahead buffer every log is written to first.
+        _pool (DatabasePool): The long-lived connection pool.
+        _batch_size (int): The number of new logs that triggers a flush.
+        _flush_interval (float): The maximum number of seconds a log waits before being flushed.
+        _drain_batch_size (int): The most logs inserted in one statement when replaying a backlog.
+        _sync_interval (float): The maximum number of seconds a log waits in memory before being synced to disk.
+        _manage_schema (bool): Whether to migrate and maintain the schema. Turn it off if the schema is managed elsewhere.
+
+    Methods:
+        start(): Starts the background writer thread.
+        write(row): Appends a `TemperatureLog` to the buffer. Never blocks on I/O.
+        stop(): Syncs and flushes any waiting logs and stops the writer thread.
+    """
+    def __init__(self, buffer, pool: DatabasePool = None, batch_size: int = 50, flush_interval: float = 60.0, drain_batch_size: int = 1000, sync_interval: float = 10.0, on_error=None, manage_schema: bool = True):
+        self._logger = logging.getLogger(__name__)
+        self._buffer = buffer
+        self._pool = pool if pool is not None else DatabasePool()
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._drain_batch_size = drain_batch_size
+        self._sync_interval = sync_interval
+        self._on_error = on_error
+        self._manage_schema = manage_schema
+        self._schema_migrated = False
+        self._next_maintenance_time = 0.0
+        self._unflushed_count = 0
+        self._count_lock = threading.Lock() # `write()` counts on the event loop while the writer thread resets the count.
+        self._wake_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="TemperatureLogWriter", daemon=True)
+            self._thread.start()
+            self._logger.info("Temperature log writer started (batch size: %s, flush interval: %ss).", self._batch_size, self._flush_interval)
+
+    def write(self, row: TemperatureLog):
+        self._buffer.append(row)
+        with self._count_lock:
+            self._unflushed_count += 1
+            batch_full = self._unflushed_count >= self._batch_size
+        if batch_full:
+            self._wake_event.set()
+
+    def stop(self, timeout: float = 10.0):
+        if self._thread is not None:
+            self._stop_event.set()
+            self._wake_event.set()
+            self._thread.join(timeout)
+            self._thread = None
+        self._pool.close()
+        self._logger.info("Temperature log writer stopped.")
+
+    # Private Methods
+
+    def _run(self):
+        last_flush_time = time.monotonic()
+        retry_delay = 0.0
+        next_attempt_time = 0.0
+
+        while True:
+            stopping = self._stop_event.is_set()
+            try:
+                self._buffer.sync()
+            except OSError as e:
+                self._logger.error(f"Failed to sync temperature log buffer: {e}")
+
+            now = time.monotonic()
+            with self._count_lock:
+                batch_full = self._unflushed_count >= self._batch_size
+            # A failed drain is retried as soon as its backoff has passed.
+            flush_due = stopping or retry_delay > 0 or batch_full or now - last_flush_time >= self._flush_interval
+            if flush_due and (stopping or now >= next_attempt_time):
+                try:
+                    self._drain()
+                    last_flush_time = now
+                    retry_delay = 0.0
+                except Exception as e:
+                    if stopping:
+                        self._logger.error(f"{e}. Writer stopping: undrained logs will be written on the next start.")
+                        return
+                    # The logs are safe in the buffer, so just back off rather than hammering a restarting database with reconnects.
+                    retry_delay = min(max(retry_delay * 2, 1.0), 300.0)
+                    next_attempt_time = now + retry_delay
+                    self._logger.error(f"{e}. Retrying in {retry_delay}s.")
+                    DB_WRITE_ERRORS.inc()
+                    if self._on_error:
+                        self._on_error(str(e))
+
+            if stopping:
+                return
+            if metrics.REGISTRY.enabled: # Counting the backlog stats the buffer's segments, so only do it when it's being scraped.
+                DB_PENDING_LOGS.set(self._buffer.pending_count)
+
+            # Sleep until the next sync, flush or retry is due, or until `write()` has a full batch.
+            next_flush_time = next_attempt_time if retry_delay > 0 else last_flush_time + self._flush_interval
+            wait = min(self._sync_interval, next_flush_time - now)
+            self._wake_event.wait(max(wait, 0.0))
+            self._wake_event.clear()
+
+    def _drain(self):
+        """Replays everything in the buffer into Postgres, committing the buffer position after each batch is written."""
+        with self._count_lock:
+            self._unflushed_count = 0
+        if self._manage_schema:
+            self._prepare_schema()
+        while True:
+            logs, position = self._buffer.read(self._drain_batch_size)
+            if logs:
+                with DB_WRITE_SECONDS.time():
+                    insert_temperature_logs(self._pool, logs)
+                DB_BATCH_SIZE.observe(len(logs))
+                self._logger.debug("Wrote %s temperature logs.", len(logs))
+            self._buffer.commit(position)
+            if len(logs) < self._drain_batch_size:
+                return
+
+    def _prepare_schema(self):
+        # The inserts need the migrated schema, so a failed migration fails the drain and is retried with it.
+        if not self._schema_migrated:
+            applied = schema.migrate(self._pool)
+            if applied:
+                self._logger.info("Applied database migrations: %s.", applied)
+            self._schema_migrated = True
+
+        # Maintenance can wait, so a failure is reported without holding up the logs.
+        now = time.monotonic()
+        if now >= self._next_maintenance_time:
+            self._next_maintenance_time = now + SCHEMA_MAINTENANCE_INTERVAL
+            try:
+                retention_months, retention_mode = schema.retention_from_environment()
+                schema.maintain(self._pool, retention_months=retention_months, retention_mode=retention_mode)
+            except Exception as e:
+                self._logger.error(f"Database maintenance failed: {e}")
+                if self._on_error:
+                    self._on_error(f"Database maintenance failed: {e}")
@@ -1,26 +1,180 @@
-from datetime import datetime, timedelta
-from .send_email import send_email
+import asyncio
+import hashlib
+import html
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from .send_email import EmailSender
+
+# Hex addresses, decimals, long numbers and quoted values vary between otherwise identical errors (i.e. "... port 5432 ... pid 1234").
+# Short integers are kept, so "zone 1" and "zone 3" stay separate errors.
+_VARIABLE_PARTS = re.compile(r"0x[0-9a-f]+|\d+\.\d+|\d{3,}|'[^']*'|\"[^\"]*\"")
+_WHITESPACE = re.compile(r"\s+")
+
+def fingerprint(error_message: str) -> str:
+    """A short, stable fingerprint of an error message with its variable parts normalised away, used to deduplicate errors."""
+    normalised = _WHITESPACE.sub(' ', _VARIABLE_PARTS.sub('#', error_message.lower())).strip()
+    return hashlib.sha1(normalised.encode('utf-8')).hexdigest()[:16]
+
+class FingerprintStore:
+    """
+    A size-capped LRU store of when each error fingerprint was last reported, so the dedup state can't grow without bound.
+
+    Methods:
+        should_report(key, now): True if `key` hasn't been reported within the TTL, recording it as reported if so.
+    """
+    def __init__(self, max_size: int = 256, ttl: float = 86400):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._last_reported = OrderedDict()
+
+    def __len__(self):
+        return len(self._last_reported)
+
+    def should_report(self, key: str, now: float) -> bool:
+        last_reported = self._last_reported.get(key)
+        if last_reported is not None and now - last_reported < self._ttl:
+            return False
+        self._last_reported[key] = now
+        self._last_reported.move_to_end(key)
+        while len(self._last_reported) > self._max_size:
+            self._last_reported.popitem(last=False)
+        return True
 
 class ErrorReporter:
-    def __init__(self):
-        self.last_error_times = {}
+    """
+    Emails errors without blocking the caller. `report_error()` deduplicates the error and puts it on a bounded queue; a background worker
+    waits `digest_window` seconds for related errors and sends them all as one digest email over a reused SMTP connection.
+
+    An error is emailed at most once per `dedup_ttl` (a day by default), judged by a fingerprint of the message with numbers and quoted values
+    normalised away. `report_error()` can be called from any thread, i.e. from the database writer, and before `start()`: errors reported
+    while the services are still starting are held (up to `max_queue_size`) and queued when the worker starts. It doesn't log the error;
+    callers log it themselves.
+
+    Key Attributes:
+        _sender (EmailSender): Sends the digest emails from a worker thread.
+        _fingerprints (FingerprintStore): When each error was last reported.
+        _queue (asyncio.Queue): Errors waiting to be sent, bounded by `max_queue_size`.
+        _pending (list): Errors reported before `start()`, queued when it's called.
+        _dropped_count (int): Errors dropped because the queue was full, mentioned in the next digest.
+
+    Methods:
+        start(): Starts the background worker on the running event loop.
+        report_error(error_message): Queues an error to be emailed.
+        stop(): Sends any queued errors and stops the worker.
+    """
+    def __init__(self, sender: EmailSender = None, digest_window: float = 60, dedup_ttl: float = 86400, max_fingerprints: int = 256, max_queue_size: int = 100, clock=time.monotonic):
+        self._logger = logging.getLogger(__name__)
+        self._sender = sender if sender is not None else EmailSender()
+        self._digest_window = digest_window
+        self._fingerprints = FingerprintStore(max_fingerprints, dedup_ttl)
+        self._max_queue_size = max_queue_size
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._queue = None
+        self._loop = None
+        self._worker_task = None
+        self._pending = []
+        self._dropped_count = 0
+
+    async def start(self):
+        if self._worker_task is None:
+            self._queue = asyncio.Queue(maxsize=self._max_queue_size)
+            with self._lock:
+                pending, self._pending = self._pending, []
+                self._loop = asyncio.get_running_loop()
+            for error_message in pending:
+                self._enqueue(error_message)
+            self._worker_task = asyncio.create_task(self._worker_loop())
 
     def report_error(self, error_message):
-        current_time = datetime.now()
+        with self._lock:
+            if not self._fingerprints.should_report(fingerprint(str(error_message)), self._clock()):
+                return
+            if self._loop is None:
+                # Not started yet (the services start in the background), so hold it until the worker starts rather than losing it.
+                if len(self._pending) < self._max_queue_size:
+                    self._pending.append(error_message)
+                else:
+                    self._dropped_count += 1
+                return
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self._loop:
+            self._enqueue(error_message)
+        else:
+            self._loop.call_soon_threadsafe(self._enqueue, error_message)
+
+    async def stop(self):
+        if self._worker_task is not None:
+            # Let the worker send what's already queued before cancelling it.
+            if not self._queue.empty():
+                await self._send_digest([self._queue.get_nowait() for _ in range(self._queue.qsize())])
+            self._worker_task.cancel()
+            try:
+                await self._worker_task
+            except asyncio.CancelledError:
+                pass
+            self._worker_task = None
+        await asyncio.to_thread(self._sender.close)
+
+    # Private Methods
+
+    def _enqueue(self, error_message):
+        try:
+            self._queue.put_nowait(error_message)
+        except asyncio.QueueFull:
+            self._dropped_count += 1
+
+    async def _worker_loop(self):
+        while True:
+            errors = [await self._queue.get()]
 
-        if error_message not in self.last_error_times or current_time - self.last_error_times[error_message] >= timedelta(days=1):
-            send_email("Error Report", error_message)
-            self.last_error_times[error_message] = current_time
+            # Gather anything else that goes wrong shortly after, so a cascade of failures is one email rather than many.
+            deadline = self._loop.time() + self._digest_window
+            try:
+                while (remaining := deadline - self._loop.time()) > 0:
+                    try:
+                        errors.append(await asyncio.wait_for(self._queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+            except asyncio.CancelledError:
+                # Stopping part way through a digest window, so send what's been gathered.
+                await self._send_digest(errors)
+                raise
 
-def main():
-    error_reporter = ErrorReporter()
+            await self._send_digest(errors)
+
+    async def _send_digest(self, errors):
+        dropped_count, self._dropped_count = self._dropped_count, 0
+        if len(errors) == 1 and not dropped_count:
+            subject, body = "Error Report", html.escape(str(errors[0]))
+        else:
+            subject = f"Error Report ({len(errors) + dropped_count} errors)"
+            body = "<ul>" + "".join(f"<li>{html.escape(str(error))}</li>" for error in errors) + "</ul>"
+            if dropped_count:
+                body += f"<p>{dropped_count} more errors were dropped.</p>"
+
+        try:
+            await asyncio.to_thread(self._sender.send, subject, body)
+        except Exception as e:
+            self._logger.error(f"Failed to send error report: {e}")
+
+async def main():
+    error_reporter = ErrorReporter(digest_window=1)
+    await error_reporter.start()
     error_message1 = "Help 1!"
     error_message2 = "Help 2!"
-    
+
     error_reporter.report_error(error_message1)
     error_reporter.report_error(error_message1)
     error_reporter.report_error(error_message2)
     error_reporter.report_error(error_message2)
+    await error_reporter.stop()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,175 @@
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from typing import Callable, Hashable, Iterable, NamedTuple, Optional
+
+"""
+An in-process publish/subscribe bus connecting the thermostats, HomeKit, the data logger and the in-memory history.
+
+Publishing never blocks or waits on a subscriber: each subscriber has its own bounded queue with a backpressure policy, so a slow consumer
+(i.e. the database logger) can't stall the control loop. Subscribers choose what happens when their queue is full:
+
+    DROP_OLDEST  The oldest event is dropped to make room; for consumers that want every event but can afford to lose the odd one.
+    COALESCE     Only the latest event per key (by default its type and zone) is kept; for consumers that only care about the latest state.
+
+Events are immutable NamedTuples. Requests from HomeKit (`TargetTemperatureRequested`, `ModeRequested`) are separate from the thermostats'
+announcements of what actually changed (`TargetTemperatureChanged`, `ModeChanged`), so subscribers can't loop a change back to its source.
+"""
+
+DROP_OLDEST = 'drop_oldest'
+COALESCE = 'coalesce'
+
+# Events
+
+class TemperatureSampled(NamedTuple):
+    zone: int
+    temperature: float # The indoor temperature in °C.
+    target_temperature: float
+    heating: bool # Whether the relay is on.
+    timestamp: float # Unix time of the sample.
+
+class ControlDecision(NamedTuple):
+    zone: int
+    should_heat: bool # The strategy's decision, which the relay follows unless it's held by its minimum on or off time.
+    temperature: float
+    timestamp: float # Monotonic time of the reading the decision was based on.
+
+class RelaySwitched(NamedTuple):
+    zone: int
+    heating: bool # The relay's new state.
+    timestamp: float # Unix time of the switch.
+
+class TargetTemperatureChanged(NamedTuple):
+    zone: int
+    temperature: float
+
+class ModeChanged(NamedTuple):
+    zone: int
+    heating_enabled: bool # Whether the thermostat's control loop is running.
+
+class TargetTemperatureRequested(NamedTuple):
+    zone: int
+    temperature: float
+
+class ModeRequested(NamedTuple):
+    zone: int
+    heating_enabled: bool # True for HomeKit's HEAT or AUTO, False for OFF or COOL.
+
+def default_key(event) -> Hashable:
+    return (type(event), getattr(event, 'zone', None))
+
+class Subscription:
+    """
+    A subscriber's bounded queue of events. Iterate it with `async for`, call `get()`, or poll with `drain()`.
+
+    Key Attributes:
+        event_types (tuple): The event types delivered to this subscriber.
+        dropped_count (int): Events dropped (or coalesced away) because the subscriber fell behind.
+    """
+    def __init__(self, bus: 'EventBus', event_types: tuple, policy: str, max_size: int, key: Callable[[object], Hashable]):
+        if policy not in (DROP_OLDEST, COALESCE):
+            raise ValueError(f"Unknown backpressure policy '{policy}'. Choose from: {DROP_OLDEST}, {COALESCE}.")
+        self.event_types = event_types
+        self.dropped_count = 0
+        self._bus = bus
+        self._policy = policy
+        self._max_size = max_size
+        self._key = key
+        self._events = OrderedDict() if policy == COALESCE else deque()
+        self._ready = asyncio.Event()
+        self._closed = False
+
+    def __len__(self):
+        return len(self._events)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        event = await self.get()
+        if event is None:
+            raise StopAsyncIteration
+        return event
+
+    async def get(self):
+        """The next event, waiting for one if necessary. Returns None once the subscription is closed and empty."""
+        while not self._events:
+            if self._closed:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+        if self._policy == COALESCE:
+            return self._events.popitem(last=False)[1]
+        return self._events.popleft()
+
+    def drain(self) -> list:
+        """Every pending event, oldest first, without waiting. For consumers that poll on their own schedule."""
+        events = list(self._events.values()) if self._policy == COALESCE else list(self._events)
+        self._events.clear()
+        return events
+
+    def close(self):
+        self._closed = True
+        self._ready.set()
+        self._bus._unsubscribe(self)
+
+    def _put(self, event):
+        if self._policy == COALESCE:
+            key = self._key(event)
+            if key in self._events:
+                # Replace the pending event, moving it to the back so events stay in the order they last changed.
+                del self._events[key]
+                self.dropped_count += 1
+            elif len(self._events) >= self._max_size:
+                self._events.popitem(last=False)
+                self.dropped_count += 1
+            self._events[key] = event
+        else:
+            if len(self._events) >= self._max_size:
+                self._events.popleft()
+                self.dropped_count += 1
+            self._events.append(event)
+        self._ready.set()
+
+class EventBus:
+    """
+    Delivers published events to every subscriber of their type.
+
+    Methods:
+        subscribe(event_types, policy, max_size, key): Returns a new `Subscription`.
+        publish(event): Queues an event for its subscribers without blocking. Safe to call from any thread.
+    """
+    def __init__(self):
+        self._logger = logging.getLogger(__name__)
+        self._subscriptions = []
+        self._loop = None
+
+    def subscribe(self, event_types: Iterable[type], policy: str = DROP_OLDEST, max_size: int = 100, key: Optional[Callable[[object], Hashable]] = None) -> Subscription:
+        """Subscribes to events of the given types. Must be called from the event loop the subscriber runs on."""
+        self._loop = asyncio.get_running_loop()
+        subscription = Subscription(self, tuple(event_types), policy, max_size, key or default_key)
+        self._subscriptions.append(subscription)
+        return subscription
+
+    def publish(self, event):
+        if self._loop is None:
+            return # Nobody has subscribed yet.
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+        if running_loop is self._loop:
+            self._dispatch(event)
+        else:
+            self._loop.call_soon_threadsafe(self._dispatch, event)
+
+    # Private Methods
+
+    def _dispatch(self, event):
+        for subscription in self._subscriptions:
+            if isinstance(event, subscription.event_types):
+                subscription._put(event)
+
+    def _unsubscribe(self, subscription: Subscription):
+        if subscription in self._subscriptions:
+            self._subscriptions.remove(subscription)
@@ -0,0 +1,219 @@
+import math
+from array import array
+from typing import Dict, Optional
+
+"""
+Keeps each zone's recent history in memory, so questions like "what's the room done over the last day?" don't need a Postgres query.
+
+Every sample (timestamp, indoor, outdoor and target temperatures and the relay state) goes into a fixed size ring buffer of packed columns:
+a uint32 timestamp, float32 temperatures and a uint8 relay state, 17 bytes per sample. Alongside it, 1 minute, 15 minute and 1 hour rollups
+(min, max and mean temperatures and the fraction of the time heating was on) are updated incrementally as samples arrive and kept for longer.
+Everything is allocated up front, so memory use is fixed and known (see `ZoneHistory.nbytes`): a week of 10 second samples plus the default
+rollups is about 2MB per zone.
+
+Queries return a dictionary of lists with the same keys as `database.fetch_temperature_history`, so callers can use either interchangeably.
+"""
+
+SAMPLE_COLUMNS = (('timestamp', 'I'), ('indoor_temp', 'f'), ('outdoor_temp', 'f'), ('target_temp', 'f'), ('heating_status', 'B'))
+
+ROLLUP_COLUMNS = (
+    ('timestamp', 'I'), # The start of the bucket.
+    ('indoor_min', 'f'), ('indoor_max', 'f'), ('indoor_mean', 'f'),
+    ('outdoor_min', 'f'), ('outdoor_max', 'f'), ('outdoor_mean', 'f'),
+    ('target_mean', 'f'),
+    ('heating_fraction', 'f'), # The fraction of samples in the bucket with the relay on.
+    ('count', 'H')
+)
+
+# Rollup resolution in seconds mapped to how many days of it to keep.
+DEFAULT_ROLLUP_DAYS = {60: 7, 900: 90, 3600: 365}
+
+class ColumnRing:
+    """
+    A fixed capacity ring buffer of typed columns, sorted by a `timestamp` column, overwriting the oldest row once full.
+
+    Methods:
+        append(row): Appends a row (a tuple in column order).
+        index_at(timestamp): The logical index of the first row at or after `timestamp`, by binary search.
+        rows(start, stop): The rows between two logical indexes as a dictionary of column name to list.
+    """
+    def __init__(self, columns, capacity: int):
+        if capacity < 1:
+            raise ValueError("Capacity must be at least 1.")
+        self._names = [name for name, _ in columns]
+        self._columns = [array(typecode, bytes(array(typecode).itemsize * capacity)) for _, typecode in columns]
+        self._timestamps = self._columns[self._names.index('timestamp')]
+        self._capacity = capacity
+        self._start = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    @property
+    def nbytes(self) -> int:
+        return sum(column.itemsize * len(column) for column in self._columns)
+
+    def append(self, row):
+        index = (self._start + self._count) % self._capacity
+        for column, value in zip(self._columns, row):
+            column[index] = value
+        if self._count < self._capacity:
+            self._count += 1
+        else:
+            self._start = (self._start + 1) % self._capacity
+
+    def timestamp(self, index: int) -> int:
+        return self._timestamps[(self._start + index) % self._capacity]
+
+    def index_at(self, timestamp: float) -> int:
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._timestamps[(self._start + middle) % self._capacity] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def rows(self, start: int, stop: int) -> Dict[str, list]:
+        start, stop = max(start, 0), min(stop, self._count)
+        if start >= stop:
+            return {name: [] for name in self._names}
+        # The logical range is at most two contiguous slices of each column, either side of the wrap.
+        first, last = (self._start + start) % self._capacity, (self._start + stop) % self._capacity
+        if first < last or last == 0:
+            end = last or self._capacity
+            return {name: column[first:end].tolist() for name, column in zip(self._names, self._columns)}
+        return {name: column[first:].tolist() + column[:last].tolist() for name, column in zip(self._names, self._columns)}
+
+class _Bucket:
+    """The running statistics for the rollup bucket currently being filled."""
+    __slots__ = ('start', 'count', 'indoor_min', 'indoor_max', 'indoor_sum', 'outdoor_min', 'outdoor_max', 'outdoor_sum', 'outdoor_count', 'target_sum', 'heating_count')
+
+    def __init__(self, start: int):
+        self.start = start
+        self.count = 0
+        self.indoor_min = math.inf
+        self.indoor_max = -math.inf
+        self.indoor_sum = 0.0
+        self.outdoor_min = math.inf
+        self.outdoor_max = -math.inf
+        self.outdoor_sum = 0.0
+        self.outdoor_count = 0
+        self.target_sum = 0.0
+        self.heating_count = 0
+
+    def add(self, indoor, outdoor, target, heating):
+        self.count += 1
+        self.indoor_min = min(self.indoor_min, indoor)
+        self.indoor_max = max(self.indoor_max, indoor)
+        self.indoor_sum += indoor
+        # Outdoor temperature is missing (NaN) while the weather API is unavailable.
+        if outdoor == outdoor:
+            self.outdoor_min = min(self.outdoor_min, outdoor)
+            self.outdoor_max = max(self.outdoor_max, outdoor)
+            self.outdoor_sum += outdoor
+            self.outdoor_count += 1
+        self.target_sum += target
+        self.heating_count += 1 if heating else 0
+
+    def row(self) -> tuple:
+        has_outdoor = self.outdoor_count > 0
+        return (
+            self.start,
+            self.indoor_min, self.indoor_max, self.indoor_sum / self.count,
+            self.outdoor_min if has_outdoor else math.nan, self.outdoor_max if has_outdoor else math.nan, self.outdoor_sum / self.outdoor_count if has_outdoor else math.nan,
+            self.target_sum / self.count,
+            self.heating_count / self.count,
+            min(self.count, 65535)
+        )
+
+class ZoneHistory:
+    """
+    A zone's recent history: full resolution samples in a ring buffer, plus incrementally maintained rollups kept for longer.
+
+    Key Attributes:
+        _samples (ColumnRing): Full resolution samples.
+        _rollups (dict): Maps each rollup resolution in seconds to its `ColumnRing` of completed buckets.
+        _buckets (dict): Maps each rollup resolution to the `_Bucket` currently being filled.
+
+    Methods:
+        append(timestamp, indoor, outdoor, target, heating): Records a sample and updates the rollups.
+        samples(since, until): Full resolution samples in a time range.
+        rollup(resolution, since, until): A rollup's buckets in a time range, including the one being filled.
+        latest(): The most recent sample, or None.
+    """
+    def __init__(self, days: float = 7, sample_interval: float = 10.0, rollup_days: Optional[Dict[int, float]] = None):
+        rollup_days = rollup_days if rollup_days is not None else DEFAULT_ROLLUP_DAYS
+        self._samples = ColumnRing(SAMPLE_COLUMNS, max(int(days * 86400 / sample_interval), 1))
+        self._rollups = {resolution: ColumnRing(ROLLUP_COLUMNS, max(int(rollup_days[resolution] * 86400 / resolution), 1)) for resolution in sorted(rollup_days)}
+        self._buckets = {resolution: None for resolution in self._rollups}
+
+    @property
+    def resolutions(self) -> list:
+        return list(self._rollups)
+
+    @property
+    def nbytes(self) -> int:
+        """The memory allocated for the columns, which is fixed however much history has been recorded."""
+        return self._samples.nbytes + sum(rollup.nbytes for rollup in self._rollups.values())
+
+    def __len__(self):
+        return len(self._samples)
+
+    def append(self, timestamp: float, indoor: float, outdoor: Optional[float], target: float, heating: bool):
+        """Records a sample. Samples must arrive in time order; one older than the latest is ignored."""
+        timestamp = int(timestamp)
+        if len(self._samples) and timestamp < self._samples.timestamp(len(self._samples) - 1):
+            return
+        outdoor = math.nan if outdoor is None else outdoor
+        self._samples.append((timestamp, indoor, outdoor, target, 1 if heating else 0))
+
+        for resolution, rollup in self._rollups.items():
+            bucket_start = timestamp - timestamp % resolution
+            bucket = self._buckets[resolution]
+            if bucket is None or bucket.start != bucket_start:
+                if bucket is not None:
+                    rollup.append(bucket.row())
+                bucket = self._buckets[resolution] = _Bucket(bucket_start)
+            bucket.add(indoor, outdoor, target, heating)
+
+    def latest(self) -> Optional[dict]:
+        if not len(self._samples):
+            return None
+        return {name: values[0] for name, values in self._samples.rows(len(self._samples) - 1, len(self._samples)).items()}
+
+    def samples(self, since: Optional[float] = None, until: Optional[float] = None) -> Dict[str, list]:
+        """Full resolution samples with `since <= timestamp < until`, as a dictionary of column name to list."""
+        return self._range(self._samples, since, until)
+
+    def rollup(self, resolution: int, since: Optional[float] = None, until: Optional[float] = None) -> Dict[str, list]:
+        """Buckets of a rollup starting in `since <= timestamp < until`, including the partially filled latest bucket."""
+        if resolution not in self._rollups:
+            raise ValueError(f"No {resolution}s rollup. Choose from: {', '.join(str(resolution) for resolution in self._rollups)}.")
+        rows = self._range(self._rollups[resolution], since, until)
+        bucket = self._buckets[resolution]
+        if bucket is not None and (since is None or bucket.start >= since) and (until is None or bucket.start < until):
+            for (name, _), value in zip(ROLLUP_COLUMNS, bucket.row()):
+                rows[name].append(value)
+        return rows
+
+    def oldest_timestamp(self, resolution: Optional[int] = None) -> Optional[int]:
+        """The oldest timestamp still held at full resolution, or in a rollup."""
+        ring = self._samples if resolution is None else self._rollups[resolution]
+        if len(ring):
+            return ring.timestamp(0)
+        bucket = self._buckets.get(resolution) if resolution is not None else None
+        return bucket.start if bucket is not None else None
+
+    # Private Methods
+
+    def _range(self, ring: ColumnRing, since, until) -> Dict[str, list]:
+        start = ring.index_at(since) if since is not None else 0
+        stop = ring.index_at(until) if until is not None else len(ring)
+        return ring.rows(start, stop)
@@ -0,0 +1,273 @@
+import asyncio
+import csv
+import io
+import json
+import logging
+import math
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+from .history import ZoneHistory
+from .http_server import HttpResponse, HttpServer
+
+"""
+A read-only HTTP API for dashboards, served on the thermostat's event loop by `HttpServer`:
+
+    GET /api/state                   The current state of every zone.
+    GET /api/history?zone=3          A zone's history, downsampled on the Pi.
+
+History takes these query parameters:
+    since, until   The range, as unix seconds or ISO 8601 (i.e. 2024-01-01T00:00). Defaults to the last 24 hours.
+    points         Roughly how many points to return (default 500, at most 5000).
+    method         `lttb` (largest-triangle-three-buckets, default) keeps the shape of the indoor temperature curve using real points;
+                   `minmax` merges fixed width time buckets, keeping each bucket's min and max so peaks aren't lost.
+    format         `json` (default) or `csv`.
+
+Ranges are served from the zone's in-memory history (`history.py`) where it reaches back far enough, preferring the coarsest rollup that
+still has at least `points` buckets. Older ranges are pushed down to Postgres as a `date_trunc` aggregation, so a year of data is a few
+hundred rows rather than millions, up to where the in-memory history begins; the rest comes from memory, since the newest readings may
+still be waiting in the log writer's buffer rather than in the database. Database queries are made one at a time, so concurrent requests
+share a small connection pool rather than exhausting it. Every response uses the same columns: the bucket (or sample) timestamp, indoor
+min/max/mean, and mean outdoor, target and heating fraction.
+"""
+
+SERIES_COLUMNS = ('timestamp', 'indoor_min', 'indoor_max', 'indoor_mean', 'outdoor_mean', 'target_mean', 'heating_fraction', 'count')
+
+DEFAULT_POINTS = 500
+MAX_POINTS = 5000
+
+# Downsampling
+
+def lttb_indices(xs: List[float], ys: List[float], threshold: int) -> List[int]:
+    """
+    Picks `threshold` points that preserve the visual shape of a series with the largest-triangle-three-buckets algorithm. The first and
+    last points are always kept; from each bucket in between it keeps the point forming the largest triangle with the previously kept point
+    and the average of the next bucket.
+    """
+    count = len(xs)
+    if threshold >= count:
+        return list(range(count))
+    if threshold < 3:
+        return [0, count - 1][:threshold]
+
+    indices = [0]
+    bucket_size = (count - 2) / (threshold - 2)
+    previous = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+        next_end = min(int((bucket + 2) * bucket_size) + 1, count)
+
+        # The average of the next bucket (or the last point) is the triangle's third vertex.
+        next_start = end
+        average_x = sum(xs[next_start:next_end]) / (next_end - next_start) if next_end > next_start else xs[-1]
+        average_y = sum(ys[next_start:next_end]) / (next_end - next_start) if next_end > next_start else ys[-1]
+
+        previous_x, previous_y = xs[previous], ys[previous]
+        best_area, best = -1.0, start
+        for index in range(start, end):
+            area = abs((previous_x - average_x) * (ys[index] - previous_y) - (previous_x - xs[index]) * (average_y - previous_y))
+            if area > best_area:
+                best_area, best = area, index
+        indices.append(best)
+        previous = best
+
+    indices.append(count - 1)
+    return indices
+
+def merge_buckets(series: Dict[str, list], since: float, until: float, buckets: int) -> Dict[str, list]:
+    """Merges a series into `buckets` equal width time buckets, keeping the min and max of the indoor temperature and count weighted means."""
+    width = max((until - since) / max(buckets, 1), 1e-9)
+    merged = {}
+    for row in zip(*(series[column] for column in SERIES_COLUMNS)):
+        timestamp, indoor_min, indoor_max, indoor_mean, outdoor_mean, target_mean, heating_fraction, count = row
+        key = int((timestamp - since) // width)
+        bucket = merged.get(key)
+        if bucket is None:
+            bucket = merged[key] = [since + key * width, math.inf, -math.inf, 0.0, 0.0, 0, 0.0, 0.0, 0]
+        bucket[1] = min(bucket[1], indoor_min)
+        bucket[2] = max(bucket[2], indoor_max)
+        bucket[3] += indoor_mean * count
+        if outdoor_mean == outdoor_mean:
+            bucket[4] += outdoor_mean * count
+            bucket[5] += count
+        bucket[6] += target_mean * count
+        bucket[7] += heating_fraction * count
+        bucket[8] += count
+
+    result = {column: [] for column in SERIES_COLUMNS}
+    for key in sorted(merged):
+        start, indoor_min, indoor_max, indoor_sum, outdoor_sum, outdoor_count, target_sum, heating_sum, count = merged[key]
+        for column, value in zip(SERIES_COLUMNS, (start, indoor_min, indoor_max, indoor_sum / count, outdoor_sum / outdoor_count if outdoor_count else math.nan, target_sum / count, heating_sum / count, count)):
+            result[column].append(value)
+    return result
+
+def downsample(series: Dict[str, list], since: float, until: float, points: int, method: str = 'lttb') -> Dict[str, list]:
+    if len(series['timestamp']) <= points:
+        return series
+    if method == 'minmax':
+        return merge_buckets(series, since, until, points)
+    indices = lttb_indices(series['timestamp'], series['indoor_mean'], points)
+    return {column: [values[index] for index in indices] for column, values in series.items()}
+
+def _samples_as_series(samples: Dict[str, list]) -> Dict[str, list]:
+    """Full resolution samples in the same columns as the rollups, each sample being a bucket of one."""
+    indoor = samples['indoor_temp']
+    return {
+        'timestamp': samples['timestamp'],
+        'indoor_min': indoor,
+        'indoor_max': indoor,
+        'indoor_mean': indoor,
+        'outdoor_mean': samples['outdoor_temp'],
+        'target_mean': samples['target_temp'],
+        'heating_fraction': [float(heating) for heating in samples['heating_status']],
+        'count': [1] * len(indoor)
+    }
+
+def _rollup_as_series(rollup: Dict[str, list]) -> Dict[str, list]:
+    return {column: rollup[column] for column in SERIES_COLUMNS}
+
+def _recent_from_memory(history: ZoneHistory, since: float, until: float, resolution: float) -> tuple:
+    """
+    (boundary, series) for the part of a range the in-memory history covers, from the coarsest rollup no coarser than `resolution` (or the
+    samples), where `boundary` is where it begins. If memory holds nothing in the range, the boundary is `until` and the series is empty.
+    """
+    for rollup_resolution in sorted(history.resolutions, reverse=True):
+        oldest = history.oldest_timestamp(rollup_resolution)
+        if rollup_resolution <= resolution and oldest is not None and oldest < until:
+            boundary = max(oldest, since)
+            return boundary, _rollup_as_series(history.rollup(rollup_resolution, boundary, until))
+    oldest = history.oldest_timestamp()
+    if oldest is not None and oldest < until:
+        boundary = max(oldest, since)
+        return boundary, _samples_as_series(history.samples(boundary, until))
+    return until, {column: [] for column in SERIES_COLUMNS}
+
+class HistoryApi:
+    """
+    Serves zone state and downsampled history as JSON or CSV. See the module docstring for the endpoints.
+
+    Key Attributes:
+        _histories (dict): Maps each zone identifier to its in-memory `ZoneHistory`.
+        _state_provider (callable): Returns a list of dictionaries describing each zone's current state.
+        _pool (DatabasePool): Used for ranges older than the in-memory history. Without one, history is limited to what's in memory.
+        _database_lock (asyncio.Lock): Serialises queries, so they never need more than one of the pool's connections.
+
+    Methods:
+        add_routes(server): Adds the API's routes to an `HttpServer`.
+        history(zone, since, until, points, method): The downsampled series for a zone, and where it came from.
+    """
+    def __init__(self, histories: Dict[int, ZoneHistory], state_provider: Callable[[], list], pool=None, clock: Callable[[], float] = time.time):
+        self._logger = logging.getLogger(__name__)
+        self._histories = histories
+        self._state_provider = state_provider
+        self._pool = pool
+        self._database_lock = asyncio.Lock()
+        self._clock = clock
+
+    def add_routes(self, server: HttpServer):
+        server.add_route('/api/state', self._handle_state)
+        server.add_route('/api/history', self._handle_history)
+
+    async def history(self, zone: int, since: float, until: float, points: int = DEFAULT_POINTS, method: str = 'lttb') -> dict:
+        history = self._histories.get(zone)
+        if history is None:
+            raise ValueError(f"Unknown zone {zone}.")
+        if until <= since:
+            raise ValueError("until must be after since.")
+
+        source, resolution, series = await self._fetch(zone, history, since, until, points)
+        return {
+            'zone': zone,
+            'since': since,
+            'until': until,
+            'source': source,
+            'resolution': resolution,
+            'method': method,
+            'series': downsample(series, since, until, points, method)
+        }
+
+    # Private Methods
+
+    async def _fetch(self, zone, history, since, until, points):
+        """Returns (source, resolution in seconds, series) from the cheapest source that reaches back to `since`."""
+        # The coarsest in-memory rollup that still has at least `points` buckets in the range, if it reaches back far enough.
+        target_resolution = (until - since) / points
+        for resolution in sorted(history.resolutions, reverse=True):
+            oldest = history.oldest_timestamp(resolution)
+            if resolution <= target_resolution and oldest is not None and oldest <= since:
+                return 'rollup', resolution, _rollup_as_series(history.rollup(resolution, since, until))
+
+        oldest = history.oldest_timestamp()
+        if oldest is not None and oldest <= since:
+            return 'memory', 0, _samples_as_series(history.samples(since, until))
+
+        if self._pool is None:
+            # Nothing older to query, so serve the finest data we have rather than failing.
+            return 'memory', 0, _samples_as_series(history.samples(since, until))
+
+        from .database import ROLLUP_UNITS, fetch_temperature_rollup
+        units = [unit for unit, seconds in ROLLUP_UNITS.items() if seconds <= target_resolution]
+        unit = units[-1] if units else 'minute'
+        boundary, recent = _recent_from_memory(history, since, until, ROLLUP_UNITS[unit])
+        async with self._database_lock:
+            older = await asyncio.to_thread(fetch_temperature_rollup, self._pool, zone, unit, datetime.fromtimestamp(since), datetime.fromtimestamp(boundary))
+        # Logs are stored as local wall clock times, which Postgres converts to epochs as if they were UTC.
+        older['timestamp'] = [datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None).timestamp() for timestamp in older['timestamp']]
+        return 'database', ROLLUP_UNITS[unit], {column: older[column] + recent[column] for column in SERIES_COLUMNS}
+
+    async def _handle_state(self, query) -> HttpResponse:
+        return _json_response({'zones': self._state_provider()})
+
+    async def _handle_history(self, query) -> HttpResponse:
+        try:
+            zone = int(_parameter(query, 'zone'))
+        except (TypeError, ValueError):
+            raise ValueError("zone is required and must be a number.")
+        until = _parse_time(_parameter(query, 'until'), self._clock())
+        since = _parse_time(_parameter(query, 'since'), until - 86400)
+        points = min(max(int(_parameter(query, 'points') or DEFAULT_POINTS), 3), MAX_POINTS)
+        method = _parameter(query, 'method') or 'lttb'
+        if method not in ('lttb', 'minmax'):
+            raise ValueError("method must be lttb or minmax.")
+        output_format = _parameter(query, 'format') or 'json'
+        if output_format not in ('json', 'csv'):
+            raise ValueError("format must be json or csv.")
+
+        result = await self.history(zone, since, until, points, method)
+        if output_format == 'csv':
+            return _csv_response(result['series'])
+        return _json_response(result)
+
+def _parameter(query: dict, name: str) -> Optional[str]:
+    values = query.get(name)
+    return values[0] if values else None
+
+def _parse_time(value: Optional[str], default: float) -> float:
+    if value is None:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise ValueError(f"Invalid time '{value}'; use unix seconds or ISO 8601.")
+
+def _finite(value):
+    # JSON has no NaN, so missing values (i.e. no outdoor temperature) are null.
+    return None if isinstance(value, float) and not math.isfinite(value) else value
+
+def _json_response(payload: dict) -> HttpResponse:
+    if 'series' in payload:
+        payload = dict(payload, series={column: [_finite(value) for value in values] for column, values in payload['series'].items()})
+    return HttpResponse(200, 'application/json', json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+
+def _csv_response(series: Dict[str, list]) -> HttpResponse:
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(series.keys())
+    for row in zip(*series.values()):
+        writer.writerow('' if _finite(value) is None else value for value in row)
+    return HttpResponse(200, 'text/csv; charset=utf-8', output.getvalue().encode('utf-8'))
@@ -0,0 +1,109 @@
+import logging
+import time
+from typing import Callable, Dict
+from .event_bus import COALESCE, EventBus, RelaySwitched, TargetTemperatureChanged, TemperatureSampled
+from . import metrics
+
+"""
+Keeps the HomeKit accessories in step with the thermostats without flooding paired devices with notifications.
+
+Every characteristic change is pushed to every paired iPhone, iPad and home hub. The monitor loop samples each zone every 10 seconds, but
+a DS18B20 reading wanders by a sixteenth of a degree either way, so most samples aren't worth sending. The current temperature is only
+sent when it's moved by at least `temperature_delta` since it was last sent, or `heartbeat` seconds have passed (so a Home app opened
+after a long quiet spell is never far out of date). `CurrentHeatingCoolingState` mirrors the real relay, so the Home app shows the boiler
+as heating only while it is, including while a switch is held back by the relay's minimum on or off time. Target temperatures set by
+anything other than HomeKit (i.e. the schedule) are sent too.
+
+Updates are applied in batches: everything that arrived since the last batch is coalesced to the latest per zone, then every changed
+characteristic on every accessory is set back to back, so HAP-python sends them to each device in one event message.
+"""
+
+HOMEKIT_UPDATES = metrics.counter('thermopi_homekit_updates_total', "Characteristic updates sent to HomeKit.", labels=('characteristic',))
+HOMEKIT_UPDATES_SKIPPED = metrics.counter('thermopi_homekit_updates_skipped_total', "Temperature samples not sent to HomeKit because they hadn't changed enough.")
+
+_CHARACTERISTICS = {'temperature': 'CurrentTemperature', 'heating': 'CurrentHeatingCoolingState', 'target_temperature': 'TargetTemperature'}
+
+class _ZoneState:
+    """What was last sent to a zone's accessory."""
+    __slots__ = ('temperature', 'temperature_sent_at', 'heating', 'target_temperature')
+
+    def __init__(self):
+        self.temperature = None
+        self.temperature_sent_at = None
+        self.heating = None
+        self.target_temperature = None
+
+class HomeKitSync:
+    """
+    Updates each zone's HomeKit accessory from the thermostats' events, skipping updates too small to matter.
+
+    Key Attributes:
+        _accessories (dict): Maps each zone identifier to its `HKThermostat`.
+        _temperature_delta (float): The smallest change in °C worth sending to HomeKit.
+        _heartbeat (float): Seconds after which the current temperature is sent even if it hasn't changed.
+        _sent (dict): Maps each zone identifier to what was last sent to its accessory.
+
+    Methods:
+        run(): Applies events from the bus in batches until cancelled.
+        apply(events): Sends whatever has meaningfully changed in a batch of events to the accessories.
+    """
+    def __init__(self, accessories: Dict[int, object], event_bus: EventBus, temperature_delta: float = 0.2, heartbeat: float = 600, clock: Callable[[], float] = time.monotonic):
+        self._logger = logging.getLogger(__name__)
+        self._accessories = accessories
+        self._event_bus = event_bus
+        self._temperature_delta = temperature_delta
+        self._heartbeat = heartbeat
+        self._clock = clock
+        self._sent = {}
+
+    # Public Methods
+
+    async def run(self):
+        subscription = self._event_bus.subscribe([TemperatureSampled, RelaySwitched, TargetTemperatureChanged], policy=COALESCE)
+        try:
+            async for event in subscription:
+                # Everything else that's arrived joins the same batch.
+                try:
+                    self.apply([event] + subscription.drain())
+                except Exception as e:
+                    self._logger.error(f"Error updating HomeKit: {e}", exc_info=True)
+        finally:
+            subscription.close()
+
+    def apply(self, events):
+        updates = {}
+        now = self._clock()
+        for event in events:
+            if event.zone not in self._accessories:
+                continue
+            sent = self._sent.setdefault(event.zone, _ZoneState())
+            update = updates.setdefault(event.zone, {})
+            if isinstance(event, TargetTemperatureChanged):
+                if event.temperature != sent.target_temperature:
+                    update['target_temperature'] = event.temperature
+                    sent.target_temperature = event.temperature
+                continue
+            if isinstance(event, TemperatureSampled):
+                if self._should_send_temperature(sent, event.temperature, now):
+                    update['temperature'] = event.temperature
+                    sent.temperature, sent.temperature_sent_at = event.temperature, now
+                else:
+                    HOMEKIT_UPDATES_SKIPPED.inc()
+            # A sample carries the relay state too, which corrects the accessory if a switch event was ever dropped.
+            if event.heating != sent.heating:
+                update['heating'] = event.heating
+                sent.heating = event.heating
+
+        for zone, update in updates.items():
+            if not update:
+                continue
+            self._accessories[zone].update_state(**update)
+            for key in update:
+                HOMEKIT_UPDATES.inc(_CHARACTERISTICS[key])
+
+    # Private Methods
+
+    def _should_send_temperature(self, sent: _ZoneState, temperature: float, now: float) -> bool:
+        if sent.temperature is None:
+            return True
+        return abs(temperature - sent.temperature) >= self._temperature_delta or now - sent.temperature_sent_at >= self._heartbeat
@@ -3,6 +3,10 @@ from pyhap.accessory import Accessory
 from pyhap.accessory_driver import AccessoryDriver
 from pyhap.const import CATEGORY_THERMOSTAT
 from enum import Enum, unique
+from .event_bus import EventBus, ModeRequested, TargetTemperatureRequested
+from . import metrics
+
+HOMEKIT_CALLBACK_SECONDS = metrics.histogram('thermopi_homekit_callback_seconds', "Time taken handling each HomeKit characteristic change.", labels=('characteristic',))
 
 @unique
 class TargetHeatingCoolingState(Enum):
@@ -10,14 +14,22 @@ class TargetHeatingCoolingState(Enum):
     HEAT = 1 # Set the thermostat to heat to the target temperature.
     COOL = 2 # Set the thermostat to cool to the target temperature.
     AUTO = 3 # The thermostat automatically heats or cools to maintain the target temberature.
+
+@unique
+class CurrentHeatingCoolingState(Enum):
+    OFF = 0
+    HEAT = 1 # The heating is on right now.
+    COOL = 2
     
-## Wraps the HomeKit functionality directly.
+## Wraps the HomeKit functionality directly. Changes made in the Home app are published to the event bus as requests for the zone's thermostat.
 class HKThermostat(Accessory):
     category = CATEGORY_THERMOSTAT
     
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, zone: int = None, event_bus: EventBus = None, **kwargs):
         super().__init__(*args, **kwargs)
         self._logger = logging.getLogger(__name__)
+        self._zone = zone
+        self._event_bus = event_bus
         
         # Characteristic options from services.json
         thermostat_service = self.add_preload_service('Thermostat')
@@ -26,8 +38,6 @@ class HKThermostat(Accessory):
         self._current_temperature = thermostat_service.configure_char('CurrentTemperature')
         self._target_temperature = thermostat_service.configure_char('TargetTemperature', setter_callback=self._did_set_target_temperature)
         self._temperature_units = thermostat_service.configure_char('TemperatureDisplayUnits')
-        self._target_heating_cooling_state_did_change_callback = None
-        self._target_temperature_did_change_callback = None
     
     @property
     def current_target_temperature(self):
@@ -38,26 +48,46 @@ class HKThermostat(Accessory):
     def current_heating_cooling_state(self):
         """Returns the current heating/cooling state."""
         current_state = self._current_heating_cooling_state.get_value()
-        return TargetHeatingCoolingState(current_state)
+        return CurrentHeatingCoolingState(current_state)
     
     def set_current_temperature(self, value):
         """Sets the current temperature in the HomeKit app."""
-        self._current_temperature.set_value(value)
-        self._logger.info("HomeKit current temperature did change to: %s°C.", value)
-            
-    def register_for_target_temperature_did_change_notifications(self, callback):
-        """Registers for notifications about target temperature changing in HomeKit."""
-        self._target_temperature_did_change_callback = callback
+        self.update_state(temperature=value)
 
-    def register_for_heating_cooling_state_did_change_notifications(self, callback):
-        """Registers for notifications about the heating/cooling state changing in HomeKit."""
-        self._target_heating_cooling_state_did_change_callback = callback
-        
+    def update_state(self, temperature: float = None, heating: bool = None, target_temperature: float = None, heating_enabled: bool = None):
+        """
+        Sets any of the current temperature, whether the heating is on, the target temperature and whether heating is enabled (the target
+        heating cooling state) in the HomeKit app. Values are set back to back, so HAP-python sends them to paired devices in the same event
+        message. Setting the target here doesn't call back into `_did_set_target_temperature`, which is only called for changes made in the
+        Home app.
+        """
+        if temperature is not None:
+            with HOMEKIT_CALLBACK_SECONDS.time('CurrentTemperature'):
+                self._current_temperature.set_value(temperature)
+            self._logger.debug("HomeKit current temperature did change to: %s°C.", temperature)
+        if heating is not None:
+            state = CurrentHeatingCoolingState.HEAT if heating else CurrentHeatingCoolingState.OFF
+            with HOMEKIT_CALLBACK_SECONDS.time('CurrentHeatingCoolingState'):
+                self._current_heating_cooling_state.set_value(state.value)
+            self._logger.debug("HomeKit current heating cooling state did change to: %s.", state)
+        if target_temperature is not None:
+            with HOMEKIT_CALLBACK_SECONDS.time('TargetTemperature'):
+                self._target_temperature.set_value(target_temperature)
+            self._logger.debug("HomeKit target temperature did change to: %s°C.", target_temperature)
+        if heating_enabled is not None:
+            state = TargetHeatingCoolingState.HEAT if heating_enabled else TargetHeatingCoolingState.OFF
+            with HOMEKIT_CALLBACK_SECONDS.time('TargetHeatingCoolingState'):
+                self._target_heating_cooling_state.set_value(state.value)
+            self._logger.debug("HomeKit target heating cooling state did change to: %s.", state)
+            
     def _did_set_target_temperature(self, value):
-        if self._target_temperature_did_change_callback is not None:
-            self._target_temperature_did_change_callback(value)
+        if self._event_bus is not None:
+            with HOMEKIT_CALLBACK_SECONDS.time('TargetTemperature'):
+                self._event_bus.publish(TargetTemperatureRequested(self._zone, value))
 
     def _did_set_target_heating_cooling_state(self, new_state):
-        if self._target_heating_cooling_state_did_change_callback is not None:
+        if self._event_bus is not None:
             state_enum = TargetHeatingCoolingState(new_state)
-            self._target_heating_cooling_state_did_change_callback(state_enum)
\ No newline at end of file
+            with HOMEKIT_CALLBACK_SECONDS.time('TargetHeatingCoolingState'):
+                heating_enabled = state_enum in (TargetHeatingCoolingState.HEAT, TargetHeatingCoolingState.AUTO)
+                self._event_bus.publish(ModeRequested(self._zone, heating_enabled))
@@ -0,0 +1,100 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, NamedTuple
+from urllib.parse import parse_qs, urlsplit
+
+class HttpResponse(NamedTuple):
+    status: int # The HTTP status code, i.e. 200.
+    content_type: str # The Content-Type header.
+    body: bytes
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+class HttpServer:
+    """
+    A minimal HTTP/1.1 server for local endpoints (i.e. `/metrics`), running on the thermostat's own event loop rather than a thread or a web
+    framework. It only handles GET requests, with one request per connection, which is all a scraper or a dashboard on the LAN needs.
+
+    There's no authentication, so it only listens on localhost unless given another `host` (i.e. '0.0.0.0' to serve the LAN).
+
+    Key Attributes:
+        _routes (dict): Maps each path to a coroutine function taking the query parameters (a dict of lists) and returning an `HttpResponse`.
+        _server (asyncio.Server): The listening server, once started.
+
+    Methods:
+        add_route(path, handler): Serves `handler` at `path`.
+        start(): Starts listening.
+        stop(): Stops listening.
+    """
+    def __init__(self, host: str = '127.0.0.1', port: int = 9100, request_timeout: float = 10.0):
+        self._logger = logging.getLogger(__name__)
+        self._host = host
+        self._port = port
+        self._request_timeout = request_timeout
+        self._routes = {}
+        self._server = None
+
+    @property
+    def port(self) -> int:
+        """The port being listened on, which is useful when started with port 0."""
+        if self._server is not None and self._server.sockets:
+            return self._server.sockets[0].getsockname()[1]
+        return self._port
+
+    def add_route(self, path: str, handler: Callable[[dict], Awaitable[HttpResponse]]):
+        self._routes[path] = handler
+
+    async def start(self):
+        if self._server is None:
+            self._server = await asyncio.start_server(self._handle_connection, self._host, self._port)
+            self._logger.info("HTTP server listening on %s port %s.", self._host, self.port)
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    # Private Methods
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            response = await asyncio.wait_for(self._handle_request(reader), self._request_timeout)
+            writer.write(
+                f"HTTP/1.1 {response.status} {_REASONS.get(response.status, '')}\r\n"
+                f"Content-Type: {response.content_type}\r\n"
+                f"Content-Length: {len(response.body)}\r\n"
+                "Connection: close\r\n\r\n".encode('latin-1') + response.body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_request(self, reader: asyncio.StreamReader) -> HttpResponse:
+        request_line = (await reader.readline()).decode('latin-1').split()
+        # Skip the headers; nothing we serve depends on them.
+        while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+
+        if len(request_line) < 2:
+            return _text_response(400, "Bad request")
+        method, target = request_line[0], request_line[1]
+        if method != 'GET':
+            return _text_response(405, "Only GET is supported")
+
+        url = urlsplit(target)
+        handler = self._routes.get(url.path)
+        if handler is None:
+            return _text_response(404, "Not found")
+        try:
+            return await handler(parse_qs(url.query))
+        except ValueError as e:
+            return _text_response(400, str(e))
+        except Exception as e:
+            self._logger.error(f"Error handling {url.path}: {e}", exc_info=True)
+            return _text_response(500, "Internal server error")
+
+def _text_response(status: int, message: str) -> HttpResponse:
+    return HttpResponse(status, 'text/plain; charset=utf-8', (message + '\n').encode('utf-8'))
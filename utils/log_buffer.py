@@ -0,0 +1,231 @@
+import logging
+import math
+import os
+import struct
+import threading
+import zlib
+from datetime import datetime
+from typing import NamedTuple, Optional, Tuple
+from .database import TemperatureLog
+
+"""
+A durable, append-only buffer for temperature logs, so samples survive Postgres (or the Pi) restarting.
+
+Logs are packed into a compact fixed-size binary record and appended to segment files in the buffer directory:
+
+    crc32 (uint32) | timestamp (float64, unix seconds) | zone (uint16) | indoor (float32) | outdoor (float32, NaN if unknown) | target (float32) | heating (uint8)
+
+New records are held in memory and written to disk in one write and one fsync per `sync()`, which keeps SD card writes few and large.
+A checkpoint file records how far the buffer has been drained into Postgres. Segments are deleted once drained, and if the buffer grows past
+its size limit (i.e. during a long database outage) the oldest segments are evicted.
+"""
+
+RECORD_FORMAT = struct.Struct('<dHfffB')
+CRC_FORMAT = struct.Struct('<I')
+RECORD_SIZE = CRC_FORMAT.size + RECORD_FORMAT.size
+
+SEGMENT_PREFIX = 'segment-'
+SEGMENT_SUFFIX = '.log'
+CHECKPOINT_FILE = 'checkpoint'
+
+class BufferPosition(NamedTuple):
+    segment: int # The sequence number of the segment.
+    offset: int # The byte offset within the segment.
+
+def encode_log(log: TemperatureLog) -> bytes:
+    outdoor_temp = math.nan if log.outdoor_temp is None else log.outdoor_temp
+    record = RECORD_FORMAT.pack(log.timestamp.timestamp(), log.zone, log.indoor_temp, outdoor_temp, log.target_temp, 1 if log.heating_status else 0)
+    return CRC_FORMAT.pack(zlib.crc32(record)) + record
+
+def decode_log(data: bytes) -> Optional[TemperatureLog]:
+    """Decodes a record, returning None if it fails its checksum (i.e. it was torn by a power cut mid-write)."""
+    (crc,) = CRC_FORMAT.unpack_from(data)
+    record = data[CRC_FORMAT.size:RECORD_SIZE]
+    if len(record) != RECORD_FORMAT.size or zlib.crc32(record) != crc:
+        return None
+    timestamp, zone, indoor_temp, outdoor_temp, target_temp, heating_status = RECORD_FORMAT.unpack(record)
+    return TemperatureLog(
+        zone=zone,
+        indoor_temp=indoor_temp,
+        outdoor_temp=None if math.isnan(outdoor_temp) else outdoor_temp,
+        heating_status=bool(heating_status),
+        target_temp=target_temp,
+        timestamp=datetime.fromtimestamp(timestamp)
+    )
+
+class LogBuffer:
+    """
+    An append-only, segmented write-ahead buffer of temperature logs on local disk. It's thread safe: logs are appended from the event loop
+    while syncing and draining happen on the writer thread.
+
+    Key Attributes:
+        _directory (str): Where segment and checkpoint files are kept.
+        _max_segment_bytes (int): Size at which the current segment is closed and a new one started.
+        _max_total_bytes (int): Disk budget for all segments. The oldest segments are evicted beyond this.
+        _unsynced (bytearray): Records appended since the last `sync()`.
+        _checkpoint (BufferPosition): The position up to which logs have been drained.
+
+    Methods:
+        append(log): Adds a log to the buffer. Cheap; nothing touches the disk until `sync()`.
+        sync(): Writes appended logs to the current segment with a single write and fsync.
+        read(max_logs): Returns up to `max_logs` undrained logs and the position after them.
+        commit(position): Marks everything before `position` as drained, deleting fully drained segments.
+        pending_count: The number of logs appended but not yet drained.
+    """
+
+    def __init__(self, directory: str, max_segment_bytes: int = 256 * 1024, max_total_bytes: int = 32 * 1024 * 1024):
+        self._logger = logging.getLogger(__name__)
+        self._directory = directory
+        self._max_segment_bytes = max(RECORD_SIZE, max_segment_bytes - max_segment_bytes % RECORD_SIZE)
+        self._max_total_bytes = max_total_bytes
+        self._lock = threading.Lock()
+        self._unsynced = bytearray()
+
+        os.makedirs(directory, exist_ok=True)
+        self._segments = self._list_segments()
+        self._checkpoint = self._load_checkpoint()
+
+        # Always start a fresh segment, so a record torn by a power cut can only ever be at the end of an old segment.
+        self._current_segment = (self._segments[-1] + 1) if self._segments else 0
+        self._current_segment_size = 0
+        self._segments.append(self._current_segment)
+
+    # Public Properties
+
+    @property
+    def pending_count(self) -> int:
+        with self._lock:
+            synced_bytes = sum(self._segment_size(segment) for segment in self._segments if segment >= self._checkpoint.segment)
+            drained_bytes = self._checkpoint.offset if self._checkpoint.segment in self._segments else 0
+            return (synced_bytes - drained_bytes + len(self._unsynced)) // RECORD_SIZE
+
+    # Public Methods
+
+    def append(self, log: TemperatureLog):
+        record = encode_log(log)
+        with self._lock:
+            self._unsynced += record
+
+    def sync(self):
+        with self._lock:
+            if not self._unsynced:
+                return
+            data = bytes(self._unsynced)
+            self._unsynced.clear()
+
+            while data:
+                space = self._max_segment_bytes - self._current_segment_size
+                if space <= 0:
+                    self._current_segment += 1
+                    self._current_segment_size = 0
+                    self._segments.append(self._current_segment)
+                    continue
+                chunk, data = data[:space], data[space:]
+                fd = os.open(self._segment_path(self._current_segment), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+                try:
+                    os.write(fd, chunk)
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+                self._current_segment_size += len(chunk)
+
+            self._evict_oldest_segments()
+
+    def read(self, max_logs: int) -> Tuple[list, BufferPosition]:
+        """Returns up to `max_logs` synced logs that haven't been drained, and the position to `commit()` once they've been written."""
+        with self._lock:
+            segments = [segment for segment in self._segments if segment >= self._checkpoint.segment]
+            position = self._checkpoint
+            logs = []
+
+            for segment in segments:
+                offset = position.offset if segment == position.segment else 0
+                path = self._segment_path(segment)
+                if not os.path.exists(path):
+                    position = BufferPosition(segment, 0)
+                    continue
+
+                with open(path, 'rb') as f:
+                    f.seek(offset)
+                    data = f.read((max_logs - len(logs)) * RECORD_SIZE)
+
+                for start in range(0, len(data) - RECORD_SIZE + 1, RECORD_SIZE):
+                    log = decode_log(data[start:start + RECORD_SIZE])
+                    if log is None:
+                        self._logger.warning("Skipping corrupt log record in segment %s at offset %s.", segment, offset + start)
+                    else:
+                        logs.append(log)
+                position = BufferPosition(segment, offset + len(data) - len(data) % RECORD_SIZE)
+
+                if len(logs) >= max_logs:
+                    break
+
+            return logs, position
+
+    def commit(self, position: BufferPosition):
+        with self._lock:
+            if position == self._checkpoint:
+                return
+            self._checkpoint = position
+            self._save_checkpoint()
+
+            # Segments before the checkpoint have been fully drained.
+            for segment in [segment for segment in self._segments if segment < position.segment]:
+                self._remove_segment(segment)
+
+    # Private Methods
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self._directory, f"{SEGMENT_PREFIX}{segment:010d}{SEGMENT_SUFFIX}")
+
+    def _segment_size(self, segment: int) -> int:
+        if segment == self._current_segment:
+            return self._current_segment_size
+        try:
+            return os.path.getsize(self._segment_path(segment))
+        except FileNotFoundError:
+            return 0
+
+    def _list_segments(self) -> list:
+        segments = []
+        for name in os.listdir(self._directory):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                segments.append(int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]))
+        return sorted(segments)
+
+    def _remove_segment(self, segment: int):
+        self._segments.remove(segment)
+        try:
+            os.remove(self._segment_path(segment))
+        except FileNotFoundError:
+            pass
+
+    def _evict_oldest_segments(self):
+        total_bytes = sum(self._segment_size(segment) for segment in self._segments)
+        while total_bytes > self._max_total_bytes and len(self._segments) > 1:
+            oldest = self._segments[0]
+            evicted_bytes = self._segment_size(oldest)
+            self._remove_segment(oldest)
+            total_bytes -= evicted_bytes
+            if oldest >= self._checkpoint.segment:
+                self._logger.warning("Log buffer full: evicted %s undrained logs from segment %s.", evicted_bytes // RECORD_SIZE, oldest)
+                self._checkpoint = BufferPosition(self._segments[0], 0)
+                self._save_checkpoint()
+
+    def _load_checkpoint(self) -> BufferPosition:
+        try:
+            with open(os.path.join(self._directory, CHECKPOINT_FILE), 'r') as f:
+                segment, offset = f.read().split()
+                return BufferPosition(int(segment), int(offset))
+        except (FileNotFoundError, ValueError):
+            return BufferPosition(self._segments[0] if self._segments else 0, 0)
+
+    def _save_checkpoint(self):
+        # Write then rename, so a power cut leaves either the old or the new checkpoint and never half of one.
+        path = os.path.join(self._directory, CHECKPOINT_FILE)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as f:
+            f.write(f"{self._checkpoint.segment} {self._checkpoint.offset}")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
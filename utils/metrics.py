@@ -0,0 +1,203 @@
+import bisect
+import logging
+import math
+import threading
+import time
+from contextlib import nullcontext
+from typing import Iterable, Optional
+
+"""
+Lightweight instrumentation for the hot paths (sensor reads, the control loop, relay switches, database writes, weather requests and HomeKit
+callbacks), exposed in the Prometheus text format at `/metrics`.
+
+Metrics are declared once at module level next to the code they measure:
+
+    SENSOR_READ_SECONDS = metrics.histogram('thermopi_sensor_read_seconds', "Time to read a temperature sensor.", labels=('sensor',))
+
+    with SENSOR_READ_SECONDS.time(sensor_id):
+        ...
+
+Instrumentation is off unless `METRICS_ENABLED` is set (see `smart_thermostat.py`). While it's off every update returns after checking a single
+flag and `time()` returns a shared no-op context manager, so it costs next to nothing on a Pi.
+"""
+
+# Suits everything from a sysfs read (~1ms) to a slow database or weather request (~10s).
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_NULL_CONTEXT = nullcontext()
+
+class _Metric:
+    """The base for each metric type: one value per combination of label values."""
+    type_name = None
+
+    def __init__(self, registry, name: str, documentation: str, labels: Iterable[str] = ()):
+        self._registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock() # Database writes are measured from the writer thread.
+
+    def samples(self) -> list:
+        """(suffix, labels, value) for every sample, as rendered by the registry."""
+        with self._lock:
+            return [('', self._labels(label_values), value) for label_values, value in self._values.items()]
+
+    def _labels(self, label_values) -> dict:
+        return dict(zip(self.label_names, (str(value) for value in label_values)))
+
+class Counter(_Metric):
+    type_name = 'counter'
+
+    def inc(self, *label_values, amount: float = 1.0):
+        if not self._registry.enabled:
+            return
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+class Gauge(_Metric):
+    type_name = 'gauge'
+
+    def set(self, value: float, *label_values):
+        if not self._registry.enabled:
+            return
+        with self._lock:
+            self._values[label_values] = value
+
+class Histogram(_Metric):
+    """Counts observations into cumulative buckets, as Prometheus expects, along with their sum and count."""
+    type_name = 'histogram'
+
+    def __init__(self, registry, name: str, documentation: str, labels: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(registry, name, documentation, labels)
+        self._buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *label_values):
+        if not self._registry.enabled:
+            return
+        with self._lock:
+            counts = self._values.get(label_values)
+            if counts is None:
+                # One count per bucket plus +Inf, then the sum.
+                counts = self._values[label_values] = [0] * (len(self._buckets) + 1) + [0.0]
+            counts[bisect.bisect_left(self._buckets, value)] += 1
+            counts[-1] += value
+
+    def time(self, *label_values):
+        """A context manager observing how long its body took, or a no-op when metrics are disabled."""
+        if not self._registry.enabled:
+            return _NULL_CONTEXT
+        return _Timer(self, label_values)
+
+    def samples(self) -> list:
+        samples = []
+        with self._lock:
+            for label_values, counts in self._values.items():
+                labels = self._labels(label_values)
+                cumulative = 0
+                for upper_bound, count in zip(self._buckets + (math.inf,), counts):
+                    cumulative += count
+                    samples.append(('_bucket', dict(labels, le=_format_value(upper_bound)), cumulative))
+                samples.append(('_sum', labels, counts[-1]))
+                samples.append(('_count', labels, cumulative))
+        return samples
+
+class _Timer:
+    def __init__(self, histogram: Histogram, label_values: tuple):
+        self._histogram = histogram
+        self._label_values = label_values
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._histogram.observe(time.perf_counter() - self._start, *self._label_values)
+        return False
+
+class MetricsRegistry:
+    """
+    Holds every metric and renders them in the Prometheus text format.
+
+    Key Attributes:
+        enabled (bool): Whether updates are recorded. Off by default, so instrumentation is close to free unless it's being scraped.
+        _metrics (dict): Every declared metric by name.
+
+    Methods:
+        counter(name, documentation, labels)/gauge(...)/histogram(...): Declares a metric, or returns it if it's already declared.
+        enable()/disable(): Turns recording on or off.
+        render(): The current value of every metric in the Prometheus text format.
+    """
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str, labels: Iterable[str] = ()) -> Counter:
+        return self._declare(Counter, name, documentation, labels)
+
+    def gauge(self, name: str, documentation: str, labels: Iterable[str] = ()) -> Gauge:
+        return self._declare(Gauge, name, documentation, labels)
+
+    def histogram(self, name: str, documentation: str, labels: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._declare(Histogram, name, documentation, labels, buckets=buckets)
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            for suffix, labels, value in metric.samples():
+                label_text = ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+                lines.append(f"{metric.name}{suffix}{{{label_text}}} {_format_value(value)}" if label_text else f"{metric.name}{suffix} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+    def _declare(self, metric_class, name, documentation, labels, **options):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = metric_class(self, name, documentation, labels, **options)
+            elif not isinstance(metric, metric_class):
+                raise ValueError(f"Metric {name} is already declared as a {metric.type_name}.")
+            return metric
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_value(value) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+# The process wide registry used by the instrumented modules.
+REGISTRY = MetricsRegistry()
+
+def counter(name: str, documentation: str, labels: Iterable[str] = ()) -> Counter:
+    return REGISTRY.counter(name, documentation, labels)
+
+def gauge(name: str, documentation: str, labels: Iterable[str] = ()) -> Gauge:
+    return REGISTRY.gauge(name, documentation, labels)
+
+def histogram(name: str, documentation: str, labels: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.histogram(name, documentation, labels, buckets)
+
+def add_metrics_route(server, registry: Optional[MetricsRegistry] = None):
+    """Serves `registry` (the process wide one by default) at `/metrics` on an `HttpServer`, enabling it."""
+    from .http_server import HttpResponse
+
+    registry = registry if registry is not None else REGISTRY
+    registry.enable()
+
+    async def handle_metrics(query):
+        return HttpResponse(200, 'text/plain; version=0.0.4; charset=utf-8', registry.render().encode('utf-8'))
+
+    server.add_route('/metrics', handle_metrics)
+    logging.getLogger(__name__).info("Metrics enabled at /metrics.")
@@ -0,0 +1,174 @@
+import logging
+import math
+from array import array
+from bisect import bisect_left
+from typing import Callable, Dict, Optional
+from .event_bus import COALESCE, EventBus, TemperatureSampled
+from .schedule import ScheduleRunner
+
+"""
+Optimal start: turning the heating on early enough that the room reaches a scheduled rise in target temperature on time.
+
+Underfloor heating takes hours to warm a room, so switching the target at the scheduled time means the room is cold for most of the
+morning. Using the zone's fitted thermal model (`thermal_model.py`, dT/dt = -heat_loss * (T - T_outdoor) + heating_gain * heating(t - lag))
+and the outdoor temperature forecast, we work out the latest moment to switch on and apply the scheduled target then instead.
+
+The work is split so each reading costs next to nothing:
+
+  - Once per transition (and again each hour, as the forecast is refreshed) a `PreheatPlan` integrates the model backwards from the
+    transition, in 5 minute steps, with the heating on. That gives the temperature the room needs to be at when the heating starts to take
+    effect, for each possible start, to arrive at the target on time. Each step is solved exactly for that step's forecast temperature.
+  - Each reading then predicts where the room will have coasted to by the time heating switched on now would take effect (one exponential)
+    and compares it with the plan's required temperature then (a binary search). Once the room would fall short, pre-heating starts.
+
+Pre-heating only applies to rises in target; falls still happen at the scheduled time, where the predictive strategy coasts into them.
+"""
+
+# How long before a transition pre-heating can start, at most.
+DEFAULT_MAX_LEAD = 6 * 3600
+
+class PreheatPlan:
+    """
+    The temperature a zone needs to be at when heating takes effect, for each possible start, to reach `target` by `transition_time`.
+
+    Key Attributes:
+        transition_time (float): Unix time of the scheduled rise.
+        target (float): The scheduled target temperature.
+        created_at (float): When the plan was made, so it can be refreshed with newer forecasts.
+        started (bool): Whether pre-heating has started for this transition.
+        _times (array): Times heating could take effect, ascending, every `step` seconds up to `transition_time`.
+        _required (array): The room temperature needed at each of `_times`.
+
+    Methods:
+        should_start(now, temperature, outdoor): Whether to start heating now to arrive on time.
+    """
+    def __init__(self, model, transition_time: float, target: float, outdoor_at: Callable[[float], Optional[float]], now: float, max_lead: float = DEFAULT_MAX_LEAD, step: float = 300):
+        self._loss = model.heat_loss_per_hour / 3600 # Per second.
+        self._gain = model.heating_gain_per_hour / 3600 # °C per second.
+        self._lag = model.lag_minutes * 60
+        self.transition_time = transition_time
+        self.target = target
+        self.created_at = now
+        self.started = False
+
+        # Integrate backwards from the target. With the heating on, each step decays towards its equilibrium temperature, so going back a
+        # step moves away from equilibrium by exp(loss * step).
+        steps = max(int(max_lead // step), 1)
+        growth = math.exp(self._loss * step)
+        current_outdoor = outdoor_at(now)
+        times, required = [transition_time], [target]
+        for index in range(1, steps + 1):
+            outdoor = outdoor_at(transition_time - (index - 0.5) * step)
+            if outdoor is None:
+                # Past the end of the forecast, so assume the outdoor temperature stays as it is now.
+                outdoor = current_outdoor
+            if outdoor is None:
+                break # No forecast at all, so the plan only covers the transition itself and pre-heating can't start.
+            equilibrium = outdoor + self._gain / self._loss
+            times.append(transition_time - index * step)
+            required.append(equilibrium + (required[-1] - equilibrium) * growth)
+        self._times = array('d', reversed(times))
+        self._required = array('d', reversed(required))
+
+    def required_temperature(self, effective_at: float) -> Optional[float]:
+        """The temperature needed when heating takes effect at `effective_at`, or None if that's before the plan begins."""
+        if effective_at < self._times[0]:
+            return None
+        if effective_at >= self.transition_time:
+            return self.target
+        index = bisect_left(self._times, effective_at)
+        start, end = self._times[index - 1], self._times[index]
+        fraction = (effective_at - start) / (end - start)
+        return self._required[index - 1] + fraction * (self._required[index] - self._required[index - 1])
+
+    def should_start(self, now: float, temperature: float, outdoor: float) -> bool:
+        effective_at = now + self._lag
+        required = self.required_temperature(effective_at)
+        if required is None:
+            return False
+        # Until the heating takes effect, the room keeps cooling towards the outdoor temperature.
+        coasted = outdoor + (temperature - outdoor) * math.exp(-self._loss * self._lag)
+        return coasted <= required
+
+def can_plan(model) -> bool:
+    """Whether a fitted model is physically sensible enough to plan with: the room must lose heat and the heating must add it."""
+    return model is not None and model.heat_loss_per_hour > 0 and model.heating_gain_per_hour > 0
+
+class OptimalStart:
+    """
+    Starts each zone's scheduled rises in target temperature early, based on its thermal model and the forecast.
+
+    Key Attributes:
+        _schedule_runner (ScheduleRunner): Provides each zone's compiled schedule.
+        _models (dict): Maps each zone identifier using optimal start to its `ThermalModelParameters`.
+        _outdoor_at (callable): Returns the forecast outdoor temperature at a unix time, or None if there's no forecast.
+        _apply (callable): Called with a zone identifier and target temperature when pre-heating starts.
+        _plans (dict): Maps each zone identifier to the `PreheatPlan` for its next rise.
+
+    Methods:
+        run(): Checks every temperature sample published on the bus until cancelled.
+        handle_sample(sample): Updates the zone's plan if needed, and starts pre-heating once it's time.
+    """
+    def __init__(self, schedule_runner: ScheduleRunner, models: Dict[int, object], outdoor_at: Callable[[float], Optional[float]], apply: Callable[[int, float], None], event_bus: EventBus, max_lead: float = DEFAULT_MAX_LEAD, replan_interval: float = 3600):
+        self._logger = logging.getLogger(__name__)
+        self._schedule_runner = schedule_runner
+        self._models = {zone: model for zone, model in models.items() if can_plan(model)}
+        for zone in models.keys() - self._models.keys():
+            self._logger.warning("Zone %s has no usable thermal model; fit one with `python -m utils.thermal_model` to use optimal start.", zone)
+        self._outdoor_at = outdoor_at
+        self._apply = apply
+        self._event_bus = event_bus
+        self._max_lead = max_lead
+        self._replan_interval = replan_interval
+        self._plans = {}
+
+    # Public Methods
+
+    async def run(self):
+        if not self._models:
+            return
+        subscription = self._event_bus.subscribe([TemperatureSampled], policy=COALESCE)
+        try:
+            async for sample in subscription:
+                try:
+                    self.handle_sample(sample)
+                except Exception as e:
+                    self._logger.error(f"Error planning optimal start for zone {sample.zone}: {e}", exc_info=True)
+        finally:
+            subscription.close()
+
+    def handle_sample(self, sample: TemperatureSampled):
+        plan = self._plan_for(sample.zone, sample.timestamp)
+        if plan is None or plan.started or sample.target_temperature >= plan.target:
+            return
+        outdoor = self._outdoor_at(sample.timestamp)
+        if outdoor is None:
+            return
+        if plan.should_start(sample.timestamp, sample.temperature, outdoor):
+            plan.started = True
+            self._logger.info("Zone %s pre-heating to reach %s°C in %.0f minutes.", sample.zone, plan.target, (plan.transition_time - sample.timestamp) / 60)
+            self._apply(sample.zone, plan.target)
+
+    # Private Methods
+
+    def _plan_for(self, zone: int, now: float) -> Optional[PreheatPlan]:
+        model = self._models.get(zone)
+        schedule = self._schedule_runner.schedules.get(zone)
+        if model is None or schedule is None:
+            self._plans.pop(zone, None)
+            return None
+
+        # A binary search per sample, so a reloaded schedule is picked up straight away.
+        transition_time, setpoint = schedule.next_transition(now)
+        plan = self._plans.get(zone)
+        if plan is not None and plan.transition_time == transition_time and plan.target == setpoint:
+            if plan.started or now - plan.created_at < self._replan_interval:
+                return plan
+
+        if setpoint <= schedule.setpoint_at(now) or transition_time - now > self._max_lead + model.lag_minutes * 60:
+            # Not a rise, or too far off to start yet. Check again on a later sample.
+            self._plans.pop(zone, None)
+            return None
+        plan = PreheatPlan(model, transition_time, setpoint, self._outdoor_at, now, max_lead=self._max_lead)
+        self._plans[zone] = plan
+        return plan
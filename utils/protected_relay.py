@@ -0,0 +1,169 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Optional
+from .relay_protocol import RelayProtocol
+from . import metrics
+
+DEFAULT_STATS_FILE = 'relay_stats.json'
+
+RELAY_SWITCHES = metrics.counter('thermopi_relay_switches_total', "Relay switches.", labels=('relay', 'state'))
+RELAY_HELD = metrics.counter('thermopi_relay_switches_held_total', "Switches delayed by the minimum on or off time.", labels=('relay', 'state'))
+
+# Every relay's stats share one file, so saves are serialised.
+_stats_lock = threading.Lock()
+
+class ProtectedRelay(RelayProtocol):
+    """
+    Wraps a relay to protect the boiler from short cycling and to track relay wear and boiler runtime.
+
+    A switch is held back until the relay has been in its current state for `min_on_time` (or `min_off_time`) seconds, so a noisy reading
+    hovering around the threshold can't chatter the relay. The control loop simply asks again on its next tick. `force_off()` bypasses the
+    protection for stopping and for failing safe.
+
+    The number of on cycles and the cumulative on-time are kept in memory and saved to `stats_path` (keyed by `name`) by `save_stats()`,
+    which the owner calls periodically from a worker thread and `cleanup()` calls at shutdown, so switching never waits on the SD card.
+
+    Key Attributes:
+        _relay (RelayProtocol): The relay being protected, i.e. a GPIO `Relay`.
+        _min_on_time (float): Seconds the relay must stay on before it can be turned off.
+        _min_off_time (float): Seconds the relay must stay off before it can be turned on.
+        _switched_at (float): When the relay last switched, or None if it hasn't since starting (so it can switch straight away).
+        cycle_count (int): The number of times the relay has been turned on, ever.
+
+    Methods:
+        turn_on()/turn_off(): Switches the relay unless the minimum time in the current state hasn't passed.
+        force_off(): Switches the relay off regardless of the minimum on time.
+        save_stats(): Saves the cycle count and on-time.
+        restore(was_active, seconds_in_state, seconds_since_saved): Carries the time since the last switch over from a state snapshot.
+    """
+    def __init__(self, relay: RelayProtocol, name: str, min_on_time: float = 0.0, min_off_time: float = 0.0, stats_path: Optional[str] = DEFAULT_STATS_FILE, clock: Callable[[], float] = time.monotonic):
+        self._logger = logging.getLogger(__name__)
+        self._relay = relay
+        self._name = name
+        self._min_on_time = min_on_time
+        self._min_off_time = min_off_time
+        self._stats_path = stats_path
+        self._clock = clock
+        self._is_active = relay.is_active
+        self._switched_at = None
+        self.cycle_count = 0
+        self._completed_on_seconds = 0.0
+        self._load_stats()
+
+    # Public Properties
+
+    @property
+    def is_active(self) -> bool:
+        return self._is_active
+
+    @property
+    def on_seconds(self) -> float:
+        """The cumulative time the relay has been on, ever, including the current cycle."""
+        running = self._clock() - self._switched_at if self._is_active and self._switched_at is not None else 0.0
+        return self._completed_on_seconds + running
+
+    @property
+    def seconds_in_state(self) -> Optional[float]:
+        """How long the relay has been in its current state, or None if it hasn't switched since starting."""
+        return self._clock() - self._switched_at if self._switched_at is not None else None
+
+    # Public Methods
+
+    def turn_on(self) -> None:
+        if self._is_active:
+            return
+        if not self._has_been_in_state_for(self._min_off_time):
+            RELAY_HELD.inc(self._name, 'on')
+            self._logger.debug("Relay %s held off for its minimum off time.", self._name)
+            return
+        self._relay.turn_on()
+        self._is_active = True
+        self._switched_at = self._clock()
+        self.cycle_count += 1
+        RELAY_SWITCHES.inc(self._name, 'on')
+
+    def turn_off(self) -> None:
+        if not self._is_active:
+            return
+        if not self._has_been_in_state_for(self._min_on_time):
+            RELAY_HELD.inc(self._name, 'off')
+            self._logger.debug("Relay %s held on for its minimum on time.", self._name)
+            return
+        self._switch_off()
+
+    def force_off(self) -> None:
+        if self._is_active:
+            self._switch_off()
+        else:
+            # Make sure, even if our shadow state and the relay disagree.
+            self._relay.force_off()
+
+    def cleanup(self) -> None:
+        self.save_stats()
+        self._relay.cleanup()
+        self._is_active = False
+
+    def restore(self, was_active: bool, seconds_in_state: Optional[float], seconds_since_saved: float):
+        """
+        Restores when the relay last switched from a state snapshot, so a quick restart can't be used to short cycle the boiler. The relay
+        always starts off; if it was on, it's treated as having switched off when the snapshot was taken.
+        """
+        if was_active:
+            elapsed = seconds_since_saved
+        elif seconds_in_state is not None:
+            elapsed = seconds_in_state + seconds_since_saved
+        else:
+            return
+        self._switched_at = self._clock() - max(elapsed, 0.0)
+
+    def save_stats(self):
+        if self._stats_path is None:
+            return
+        try:
+            with _stats_lock:
+                stats = self._read_stats_file()
+                stats[self._name] = {'cycle_count': self.cycle_count, 'on_seconds': self.on_seconds}
+                # Write then rename, so a power cut mid-write can't lose every relay's stats.
+                temp_path = self._stats_path + '.tmp'
+                with open(temp_path, 'w') as f:
+                    json.dump(stats, f)
+                os.replace(temp_path, self._stats_path)
+        except OSError as e:
+            self._logger.error(f"Failed to save relay stats to {self._stats_path}: {e}")
+
+    # Private Methods
+
+    def _has_been_in_state_for(self, seconds: float) -> bool:
+        return self._switched_at is None or self._clock() - self._switched_at >= seconds
+
+    def _switch_off(self):
+        self._relay.turn_off()
+        now = self._clock()
+        if self._switched_at is not None:
+            self._completed_on_seconds += now - self._switched_at
+        self._is_active = False
+        self._switched_at = now
+        RELAY_SWITCHES.inc(self._name, 'off')
+
+    def _read_stats_file(self) -> dict:
+        try:
+            with open(self._stats_path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _load_stats(self):
+        if self._stats_path is None:
+            return
+        try:
+            with _stats_lock:
+                entry = self._read_stats_file().get(self._name)
+        except (OSError, ValueError) as e:
+            self._logger.error(f"Failed to load relay stats from {self._stats_path}: {e}")
+            return
+        if entry:
+            self.cycle_count = int(entry.get('cycle_count', 0))
+            self._completed_on_seconds = float(entry.get('on_seconds', 0.0))
@@ -1,30 +1,48 @@
+import logging
 import RPi.GPIO as GPIO
 from .relay_protocol import RelayProtocol
 
 class Relay(RelayProtocol):
     """
     A class to represent a relay controlled by Raspberry Pi. This is designed to work with an ACTIVE LOW relay (i.e. LOW turns the relay on).
+
+    We're the only thing driving the pin, so its state is shadowed in memory: `is_active` doesn't touch the GPIO and writes that wouldn't
+    change the pin are skipped.
     """
     def __init__(self, pin):
+        self._logger = logging.getLogger(__name__)
         self.pin = pin
         GPIO.setmode(GPIO.BCM) # Refer to pins by their Broadcom SOC channel number (associated to Broadcom chipset on the Pi).
         GPIO.setup(self.pin, GPIO.OUT, initial=GPIO.HIGH) # Initially OFF for ACTIVE LOW.
+        self._is_active = False
     
     @property
     def is_active(self):
-        return GPIO.input(self.pin) == GPIO.LOW
+        return self._is_active
     
     def turn_on(self):
-        GPIO.output(self.pin, GPIO.LOW)
-        print("Relay ON")
+        if not self._is_active:
+            GPIO.output(self.pin, GPIO.LOW)
+            self._is_active = True
+            self._logger.info("Relay on pin %s ON", self.pin)
 
     def turn_off(self):
+        if self._is_active:
+            GPIO.output(self.pin, GPIO.HIGH)
+            self._is_active = False
+            self._logger.info("Relay on pin %s OFF", self.pin)
+
+    def force_off(self):
+        # Written whatever the shadow state says, so failing safe can't be skipped by a stale shadow.
         GPIO.output(self.pin, GPIO.HIGH)
-        print("Relay OFF")
+        if self._is_active:
+            self._logger.info("Relay on pin %s forced OFF", self.pin)
+        self._is_active = False
 
     def cleanup(self):
         GPIO.cleanup(self.pin)
-        print("GPIO Cleaned up")
+        self._is_active = False
+        self._logger.info("GPIO pin %s cleaned up", self.pin)
 
 if __name__ == "__main__":
     pin_number = 26  # Example GPIO pin number, change this to your actual relay GPIO pin
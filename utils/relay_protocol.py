@@ -12,5 +12,9 @@ class RelayProtocol(Protocol):
     def turn_off(self) -> None:
         """Turns off the relay."""
 
+    def force_off(self) -> None:
+        """Turns off the relay immediately, ignoring any switch-rate protection. Used when stopping or when the temperature can't be read."""
+        self.turn_off()
+
     def cleanup(self) -> None:
         """Performs cleanup logic on the relay pins."""
\ No newline at end of file
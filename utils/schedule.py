@@ -0,0 +1,300 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from array import array
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from typing import Callable, Collection, Dict, List, NamedTuple, Optional, Tuple
+
+"""
+Weekly heating schedules per zone, with holiday overrides.
+
+Schedules are configured in a JSON file (`schedule.json` by default, or the path in the `SCHEDULE_FILE` environment variable), for example:
+
+{
+    "zones": {
+        "3": {
+            "weekdays": [["06:30", 21.0], ["08:30", 17.0], ["17:00", 21.0], ["22:30", 16.0]],
+            "saturday": [["08:00", 21.0], ["23:00", 16.0]],
+            "sunday": [["08:00", 21.0], ["22:30", 16.0]]
+        }
+    },
+    "holidays": [
+        {"start": "2024-12-24T10:00", "end": "2025-01-02T15:00", "temperature": 14.0, "zones": [3]}
+    ]
+}
+
+Each day lists the times (local wall clock) at which the target temperature changes; the last setpoint carries over into the next day.
+`weekdays`, `weekends` and `daily` are shorthand for several days; a named day takes priority over them. A holiday holds the target at its
+temperature from `start` until `end` for the listed zones (every scheduled zone if `zones` is left out).
+
+Each zone's week is compiled into a sorted array of transition times (seconds since Monday 00:00) and setpoints, so the current setpoint and
+the next transition are a binary search away. `ScheduleRunner` sleeps until the next transition rather than checking every tick, and
+reloads the file whenever it changes. Between transitions, targets set in HomeKit are left alone until the next scheduled change, including
+across a reload of the file. On start, a zone whose target was restored from a state snapshot keeps it unless one of its transitions came
+due while the service was down.
+"""
+
+DEFAULT_SCHEDULE_FILE = 'schedule.json'
+
+DAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+DAY_GROUPS = {'daily': DAYS, 'weekdays': DAYS[:5], 'weekends': DAYS[5:]}
+
+SECONDS_PER_DAY = 86400
+SECONDS_PER_WEEK = 7 * SECONDS_PER_DAY
+
+class Holiday(NamedTuple):
+    start: float # Unix time the holiday starts.
+    end: float # Unix time the holiday ends.
+    temperature: float # The target temperature held throughout.
+    zones: Optional[Tuple[int, ...]] = None # The zones it applies to, or None for every zone.
+
+class WeeklyProgram:
+    """
+    A week of setpoint transitions compiled into parallel sorted arrays.
+
+    Methods:
+        setpoint_at(offset): The setpoint in force at a number of seconds since Monday 00:00.
+        next_offset(offset): The week offset of the first transition after `offset`, wrapping into the next week.
+    """
+    def __init__(self, transitions: List[Tuple[int, float]]):
+        if not transitions:
+            raise ValueError("A weekly program needs at least one transition.")
+        transitions = sorted(transitions)
+        self._offsets = array('l', (offset for offset, _ in transitions))
+        self._setpoints = array('d', (setpoint for _, setpoint in transitions))
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def setpoint_at(self, offset: int) -> float:
+        # Before the week's first transition, last week's final setpoint is still in force (index -1).
+        return self._setpoints[bisect_right(self._offsets, offset) - 1]
+
+    def next_offset(self, offset: int) -> int:
+        index = bisect_right(self._offsets, offset)
+        return self._offsets[index] if index < len(self._offsets) else self._offsets[0] + SECONDS_PER_WEEK
+
+class ZoneSchedule:
+    """
+    A zone's weekly program with its holidays, answering what the target should be at any moment.
+
+    Methods:
+        setpoint_at(timestamp): The scheduled target temperature at a unix time.
+        next_transition(timestamp): (unix time, setpoint) of the next scheduled change after `timestamp`.
+    """
+    def __init__(self, program: WeeklyProgram, holidays: List[Holiday] = ()):
+        self._program = program
+        holidays = sorted(holidays, key=lambda holiday: holiday.start)
+        for previous, holiday in zip(holidays, holidays[1:]):
+            if holiday.start < previous.end:
+                raise ValueError("Holidays for a zone can't overlap.")
+        self._holiday_starts = array('d', (holiday.start for holiday in holidays))
+        self._holidays = holidays
+
+    def setpoint_at(self, timestamp: float) -> float:
+        holiday = self._holiday_at(timestamp)
+        if holiday is not None:
+            return holiday.temperature
+        return self._program.setpoint_at(_week_offset(timestamp))
+
+    def next_transition(self, timestamp: float) -> Tuple[float, float]:
+        holiday = self._holiday_at(timestamp)
+        if holiday is not None:
+            return holiday.end, self.setpoint_at(holiday.end)
+
+        week_start = _week_start(timestamp)
+        weekly = (week_start + timedelta(seconds=self._program.next_offset(_week_offset(timestamp)))).timestamp()
+        index = bisect_right(self._holiday_starts, timestamp)
+        if index < len(self._holidays) and self._holidays[index].start <= weekly:
+            return self._holidays[index].start, self._holidays[index].temperature
+        return weekly, self.setpoint_at(weekly)
+
+    # Private Methods
+
+    def _holiday_at(self, timestamp: float) -> Optional[Holiday]:
+        index = bisect_right(self._holiday_starts, timestamp) - 1
+        if index >= 0 and timestamp < self._holidays[index].end:
+            return self._holidays[index]
+        return None
+
+def _week_start(timestamp: float) -> datetime:
+    moment = datetime.fromtimestamp(timestamp)
+    return datetime(moment.year, moment.month, moment.day) - timedelta(days=moment.weekday())
+
+def _week_offset(timestamp: float) -> int:
+    moment = datetime.fromtimestamp(timestamp)
+    return moment.weekday() * SECONDS_PER_DAY + moment.hour * 3600 + moment.minute * 60 + moment.second
+
+def _parse_time_of_day(value: str) -> int:
+    hours, minutes = value.split(':')
+    hours, minutes = int(hours), int(minutes)
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        raise ValueError(f"Invalid time of day '{value}'.")
+    return hours * 3600 + minutes * 60
+
+def _compile_program(days: dict) -> WeeklyProgram:
+    # `daily`, then `weekdays` and `weekends`, then named days, so the most specific entry wins.
+    per_day = {}
+    for key in sorted(days, key=lambda key: 2 if key in DAYS else 0 if key == 'daily' else 1):
+        if key in DAY_GROUPS:
+            for day in DAY_GROUPS[key]:
+                per_day[day] = days[key]
+        elif key in DAYS:
+            per_day[key] = days[key]
+        else:
+            raise ValueError(f"Unknown day '{key}'. Use a day name, or one of: {', '.join(DAY_GROUPS)}.")
+
+    transitions = []
+    for day, entries in per_day.items():
+        for time_of_day, setpoint in entries:
+            transitions.append((DAYS.index(day) * SECONDS_PER_DAY + _parse_time_of_day(time_of_day), float(setpoint)))
+    return WeeklyProgram(transitions)
+
+def parse_schedule(data: dict) -> Dict[int, ZoneSchedule]:
+    """Compiles a schedule in the format above into a `ZoneSchedule` per zone."""
+    holidays = [Holiday(
+        start=datetime.fromisoformat(entry['start']).timestamp(),
+        end=datetime.fromisoformat(entry['end']).timestamp(),
+        temperature=float(entry['temperature']),
+        zones=tuple(int(zone) for zone in entry['zones']) if 'zones' in entry else None
+    ) for entry in data.get('holidays', [])]
+    for holiday in holidays:
+        if holiday.end <= holiday.start:
+            raise ValueError("A holiday must end after it starts.")
+
+    schedules = {}
+    for zone, days in data.get('zones', {}).items():
+        zone = int(zone)
+        zone_holidays = [holiday for holiday in holidays if holiday.zones is None or zone in holiday.zones]
+        schedules[zone] = ZoneSchedule(_compile_program(days), zone_holidays)
+    return schedules
+
+def load_schedule(path: Optional[str] = None) -> Dict[int, ZoneSchedule]:
+    """
+    Loads and compiles the schedule file. A missing file means no zone is scheduled.
+
+    Raises:
+    ValueError: If the file is invalid.
+    """
+    path = path or os.getenv("SCHEDULE_FILE", DEFAULT_SCHEDULE_FILE)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as f:
+            return parse_schedule(json.load(f))
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid schedule file {path}: {e}")
+
+class ScheduleRunner:
+    """
+    Applies each zone's scheduled setpoints as they come due, and reloads the schedule file when it changes.
+
+    Key Attributes:
+        schedules (dict): Maps each scheduled zone identifier to its compiled `ZoneSchedule`.
+        _apply (callable): Called with a zone identifier and its new target temperature at each transition.
+        _reload_interval (float): Seconds between checks of the schedule file's modification time.
+
+    Methods:
+        run(restored_at, restored_zones): Applies the current setpoints, then each transition as it comes due, until cancelled.
+        reload(): Reloads the schedule file if it's changed, returning whether it was reloaded.
+        next_transition(): (unix time, zone, setpoint) of the next transition across every zone, or None.
+    """
+    def __init__(self, apply: Callable[[int, float], None], path: Optional[str] = None, reload_interval: float = 30, clock: Callable[[], float] = time.time):
+        self._logger = logging.getLogger(__name__)
+        self._apply = apply
+        self._path = path or os.getenv("SCHEDULE_FILE", DEFAULT_SCHEDULE_FILE)
+        self._reload_interval = reload_interval
+        self._clock = clock
+        self._modified_at = None
+        self._reloaded = asyncio.Event()
+        self.schedules = {}
+
+    # Public Methods
+
+    async def run(self, restored_at: Optional[float] = None, restored_zones: Collection[int] = ()):
+        """
+        Parameters:
+        restored_at (float): When the state snapshot the targets were restored from was saved, if there was one.
+        restored_zones (collection): The zones whose targets were restored, which keep them unless a transition passed since `restored_at`.
+        """
+        self.reload()
+        self._apply_current_setpoints(restored_at, restored_zones)
+        watcher = asyncio.create_task(self._watch())
+        applied_until = self._clock()
+        try:
+            while True:
+                self._reloaded.clear()
+                # A timeout can fire a hair early, so never look for transitions before the one just applied.
+                now = max(self._clock(), applied_until)
+                upcoming = self._due_transitions(now)
+                # Sleep until the next transition, or until the schedule is reloaded and the next transition may have moved.
+                timeout = max(upcoming[0] - now, 0) if upcoming else None
+                try:
+                    # Nothing came due on a reload, so the targets are left alone until the new schedule's next transition.
+                    await asyncio.wait_for(self._reloaded.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    # Every zone changing at this time is applied together, since the next search starts strictly after it.
+                    applied_until, due = upcoming
+                    for zone, setpoint in due:
+                        self._apply_setpoint(zone, setpoint)
+        finally:
+            watcher.cancel()
+
+    def reload(self) -> bool:
+        try:
+            modified_at = os.stat(self._path).st_mtime
+        except FileNotFoundError:
+            modified_at = None
+        if modified_at == self._modified_at:
+            return False
+        self._modified_at = modified_at
+
+        try:
+            self.schedules = load_schedule(self._path)
+        except (OSError, ValueError) as e:
+            # Keep running the schedule we had rather than dropping to a fixed target.
+            self._logger.error(f"Failed to reload schedule: {e}")
+            return False
+        self._logger.info("Loaded schedules for %s zone(s) from %s.", len(self.schedules), self._path)
+        self._reloaded.set()
+        return True
+
+    def next_transition(self, now: Optional[float] = None) -> Optional[Tuple[float, int, float]]:
+        now = self._clock() if now is None else now
+        upcoming = [(schedule.next_transition(now), zone) for zone, schedule in self.schedules.items()]
+        if not upcoming:
+            return None
+        (timestamp, setpoint), zone = min(upcoming)
+        return timestamp, zone, setpoint
+
+    # Private Methods
+
+    def _due_transitions(self, now: float) -> Optional[Tuple[float, List[Tuple[int, float]]]]:
+        """(unix time, [(zone, setpoint), ...]) of the next transition time across every zone, with every zone changing at that time."""
+        upcoming = {zone: schedule.next_transition(now) for zone, schedule in self.schedules.items()}
+        if not upcoming:
+            return None
+        timestamp = min(transition_time for transition_time, _ in upcoming.values())
+        return timestamp, [(zone, setpoint) for zone, (transition_time, setpoint) in sorted(upcoming.items()) if transition_time == timestamp]
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self._reload_interval)
+            self.reload()
+
+    def _apply_current_setpoints(self, restored_at: Optional[float], restored_zones: Collection[int]):
+        now = self._clock()
+        for zone, schedule in self.schedules.items():
+            if restored_at is not None and zone in restored_zones and schedule.next_transition(restored_at)[0] > now:
+                continue # The restored target (perhaps set in HomeKit) is still the latest one.
+            self._apply_setpoint(zone, schedule.setpoint_at(now))
+
+    def _apply_setpoint(self, zone: int, setpoint: float):
+        self._logger.info("Zone %s scheduled target temperature: %s°C.", zone, setpoint)
+        try:
+            self._apply(zone, setpoint)
+        except Exception as e:
+            self._logger.error(f"Error applying scheduled target for zone {zone}: {e}", exc_info=True)
@@ -0,0 +1,317 @@
+import argparse
+import logging
+import os
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+from psycopg2 import sql
+
+"""
+The database schema for temperature logs, with the migrations that create it and the maintenance that keeps it fast and small on the Pi's
+SD card as years of readings build up.
+
+  - `temperature_logs` is partitioned by month (`temperature_logs_y2024m01`, ...). Rows arrive in time order, so a BRIN index on `timestamp`
+    finds a range from a few pages per partition where a B-tree would need an entry per row; a B-tree on (zone, timestamp) serves a single
+    zone's history. Rows outside every monthly partition (i.e. a backlog replayed from long ago) land in `temperature_logs_default` until
+    maintenance moves them into a partition of their own.
+  - `temperature_logs_hourly` and `temperature_logs_daily` roll each zone's readings up into buckets. They keep counts and sums rather than
+    means, so the writer can merge each batch into them in the same statement that inserts it, and long-range history reads them rather
+    than the raw rows.
+  - Raw partitions older than the retention period (`DB_RAW_RETENTION_MONTHS`, 24 by default) are compacted to one row per zone per hour,
+    or dropped if `DB_RETENTION` is `drop`. The rollups are kept either way.
+
+Migrations are numbered, recorded in `schema_migrations` and applied in one transaction under an advisory lock, so the log writer and the
+command line can't both apply one. An existing unpartitioned `temperature_logs`, created by hand before this module, is migrated into the
+partitioned table with its rows. The log writer migrates before its first write and runs maintenance daily. Partitioning needs Postgres 11
+or newer.
+
+Usage:
+    python -m utils.schema           # Apply any pending migrations and run maintenance now.
+    python -m utils.schema --status  # List the applied migrations and partitions.
+"""
+
+# Identifies the schema's advisory lock (b'thrm').
+ADVISORY_LOCK_ID = 0x7468726d
+
+# How many months of empty partitions to keep ready ahead of the current one.
+PARTITIONS_AHEAD = 2
+
+DEFAULT_RAW_RETENTION_MONTHS = 24
+RETENTION_MODES = ('compact', 'drop')
+
+# Stored as the table comment of a compacted partition, so it isn't compacted again.
+COMPACTED_COMMENT = 'compacted'
+
+LOG_COLUMNS = 'zone, indoor_temp, outdoor_temp, heating_status, target_temp, timestamp'
+
+# The rollup table for each `date_trunc` unit that has one.
+ROLLUP_TABLES = {'hour': 'temperature_logs_hourly', 'day': 'temperature_logs_daily'}
+
+CREATE_SCHEMA_MIGRATIONS = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version integer PRIMARY KEY,
+    description text NOT NULL,
+    applied_at timestamp NOT NULL DEFAULT now()
+)
+"""
+
+CREATE_TEMPERATURE_LOGS = """
+CREATE TABLE temperature_logs (
+    zone integer NOT NULL,
+    indoor_temp double precision,
+    outdoor_temp double precision,
+    heating_status boolean,
+    target_temp double precision,
+    timestamp timestamp NOT NULL
+) PARTITION BY RANGE (timestamp)
+"""
+
+CREATE_ROLLUP = """
+CREATE TABLE {table} (
+    zone integer NOT NULL,
+    bucket timestamp NOT NULL,
+    readings integer NOT NULL,
+    indoor_min double precision,
+    indoor_max double precision,
+    indoor_sum double precision,
+    outdoor_sum double precision,
+    outdoor_readings integer NOT NULL,
+    target_sum double precision,
+    heating_readings integer NOT NULL,
+    PRIMARY KEY (zone, bucket)
+)
+"""
+
+def rollup_upsert(unit: str, source: str) -> str:
+    """SQL merging the rows of `source` (a table or CTE with the `temperature_logs` columns) into the rollup table for `unit`."""
+    table = ROLLUP_TABLES[unit]
+    return f"""
+    INSERT INTO {table} (zone, bucket, readings, indoor_min, indoor_max, indoor_sum, outdoor_sum, outdoor_readings, target_sum, heating_readings)
+    SELECT zone, date_trunc('{unit}', timestamp), count(*), min(indoor_temp), max(indoor_temp), sum(indoor_temp),
+        sum(outdoor_temp), count(outdoor_temp), sum(target_temp), count(*) FILTER (WHERE heating_status)
+    FROM {source}
+    GROUP BY 1, 2
+    ON CONFLICT (zone, bucket) DO UPDATE SET
+        readings = {table}.readings + EXCLUDED.readings,
+        indoor_min = LEAST({table}.indoor_min, EXCLUDED.indoor_min),
+        indoor_max = GREATEST({table}.indoor_max, EXCLUDED.indoor_max),
+        indoor_sum = {table}.indoor_sum + EXCLUDED.indoor_sum,
+        outdoor_sum = COALESCE({table}.outdoor_sum + EXCLUDED.outdoor_sum, {table}.outdoor_sum, EXCLUDED.outdoor_sum),
+        outdoor_readings = {table}.outdoor_readings + EXCLUDED.outdoor_readings,
+        target_sum = {table}.target_sum + EXCLUDED.target_sum,
+        heating_readings = {table}.heating_readings + EXCLUDED.heating_readings
+    """
+
+# Months
+
+def month_start(moment: datetime) -> datetime:
+    return datetime(moment.year, moment.month, 1)
+
+def add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+def partition_name(month: datetime) -> str:
+    return f"temperature_logs_y{month.year:04d}m{month.month:02d}"
+
+def parse_partition_name(name: str) -> Optional[datetime]:
+    """The month a partition holds, or None if it isn't a monthly partition."""
+    prefix = 'temperature_logs_y'
+    if not name.startswith(prefix) or len(name) != len(prefix) + 7 or name[len(prefix) + 4] != 'm':
+        return None
+    try:
+        return datetime(int(name[len(prefix):len(prefix) + 4]), int(name[-2:]), 1)
+    except ValueError:
+        return None
+
+def partitions_to_retire(months: List[datetime], now: datetime, retention_months: int) -> List[datetime]:
+    """The partitions whose every row is older than the retention period, oldest first."""
+    cutoff = add_months(month_start(now), -retention_months)
+    return sorted(month for month in months if add_months(month, 1) <= cutoff)
+
+# Migrations
+
+def _partition_temperature_logs(cur):
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('temperature_logs')")
+    row = cur.fetchone()
+    if row is not None and row[0] == 'p':
+        return # Already partitioned by hand.
+    legacy = row is not None
+    if legacy:
+        cur.execute("ALTER TABLE temperature_logs RENAME TO temperature_logs_unpartitioned")
+
+    cur.execute(CREATE_TEMPERATURE_LOGS)
+    cur.execute("CREATE TABLE temperature_logs_default PARTITION OF temperature_logs DEFAULT")
+    cur.execute("CREATE INDEX temperature_logs_timestamp_brin ON temperature_logs USING brin (timestamp) WITH (pages_per_range = 32)")
+    cur.execute("CREATE INDEX temperature_logs_zone_timestamp ON temperature_logs (zone, timestamp)")
+
+    if legacy:
+        # Create the partitions first, so the rows go straight into them rather than through the default partition.
+        cur.execute("SELECT min(timestamp), max(timestamp) FROM temperature_logs_unpartitioned")
+        first, last = cur.fetchone()
+        if first is not None:
+            month = month_start(first)
+            while month <= last.replace(tzinfo=None):
+                _create_partition(cur, month)
+                month = add_months(month, 1)
+        cur.execute(f"INSERT INTO temperature_logs ({LOG_COLUMNS}) SELECT {LOG_COLUMNS} FROM temperature_logs_unpartitioned")
+        logging.getLogger(__name__).info("Moved %s existing rows into the partitioned temperature_logs.", cur.rowcount)
+        cur.execute("DROP TABLE temperature_logs_unpartitioned")
+
+def _create_rollups(cur):
+    for unit, table in ROLLUP_TABLES.items():
+        cur.execute(CREATE_ROLLUP.format(table=table))
+        cur.execute(rollup_upsert(unit, 'temperature_logs')) # Backfill from the rows logged so far.
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    apply: Callable # Called with a cursor, inside the migration's transaction.
+
+MIGRATIONS = [
+    Migration(1, "Partition temperature_logs by month with BRIN and per-zone indexes", _partition_temperature_logs),
+    Migration(2, "Add hourly and daily rollups", _create_rollups),
+]
+
+def migrate(pool) -> List[int]:
+    """
+    Applies any pending migrations in one transaction, returning the versions applied.
+
+    Parameters:
+    pool (DatabasePool): The pool to borrow a connection from.
+    """
+    logger = logging.getLogger(__name__)
+    with pool.connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (ADVISORY_LOCK_ID,))
+            cur.execute(CREATE_SCHEMA_MIGRATIONS)
+            cur.execute("SELECT version FROM schema_migrations")
+            applied = {version for version, in cur.fetchall()}
+            pending = [migration for migration in MIGRATIONS if migration.version not in applied]
+            for migration in pending:
+                logger.info("Applying database migration %s: %s.", migration.version, migration.description)
+                migration.apply(cur)
+                cur.execute("INSERT INTO schema_migrations (version, description) VALUES (%s, %s)", (migration.version, migration.description))
+    return [migration.version for migration in pending]
+
+# Maintenance
+
+def _partitions(cur) -> Dict[datetime, Tuple[str, bool]]:
+    """Maps the month of each monthly partition to its name and whether it's been compacted."""
+    cur.execute("""
+    SELECT c.relname, obj_description(c.oid, 'pg_class')
+    FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'temperature_logs'::regclass
+    """)
+    partitions = {}
+    for name, comment in cur.fetchall():
+        month = parse_partition_name(name)
+        if month is not None:
+            partitions[month] = (name, comment == COMPACTED_COMMENT)
+    return partitions
+
+def _bounds(month: datetime) -> Tuple[sql.Literal, sql.Literal]:
+    # Partition bounds must be literals on older versions of Postgres, so they're formatted into the statement rather than passed.
+    return sql.Literal(month.strftime('%Y-%m-%d')), sql.Literal(add_months(month, 1).strftime('%Y-%m-%d'))
+
+def _create_partition(cur, month: datetime):
+    """Creates a month's partition, moving any of its rows out of the default partition first so it can be attached."""
+    name = sql.Identifier(partition_name(month))
+    start, end = _bounds(month)
+    cur.execute(sql.SQL("CREATE TABLE {} (LIKE temperature_logs INCLUDING DEFAULTS)").format(name))
+    cur.execute(sql.SQL("""
+    WITH moved AS (DELETE FROM temperature_logs_default WHERE timestamp >= {start} AND timestamp < {end} RETURNING *)
+    INSERT INTO {name} SELECT * FROM moved
+    """).format(name=name, start=start, end=end))
+    cur.execute(sql.SQL("ALTER TABLE temperature_logs ATTACH PARTITION {} FOR VALUES FROM ({}) TO ({})").format(name, start, end))
+
+def _compact_partition(cur, month: datetime, name: str):
+    """Replaces a partition's rows with one per zone per hour, swapping in a rewritten table so the old one's space is freed at once."""
+    compact = sql.Identifier(name + '_compact')
+    start, end = _bounds(month)
+    cur.execute(sql.SQL("CREATE TABLE {} (LIKE temperature_logs INCLUDING DEFAULTS)").format(compact))
+    cur.execute(sql.SQL(f"""
+    INSERT INTO {{compact}} ({LOG_COLUMNS})
+    SELECT zone, avg(indoor_temp), avg(outdoor_temp), avg(heating_status::int) >= 0.5, avg(target_temp), date_trunc('hour', timestamp)
+    FROM {{name}}
+    GROUP BY zone, date_trunc('hour', timestamp)
+    """).format(compact=compact, name=sql.Identifier(name)))
+    cur.execute(sql.SQL("ALTER TABLE temperature_logs DETACH PARTITION {}").format(sql.Identifier(name)))
+    cur.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(name)))
+    cur.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(compact, sql.Identifier(name)))
+    cur.execute(sql.SQL("ALTER TABLE temperature_logs ATTACH PARTITION {} FOR VALUES FROM ({}) TO ({})").format(sql.Identifier(name), start, end))
+    cur.execute(sql.SQL("COMMENT ON TABLE {} IS {}").format(sql.Identifier(name), sql.Literal(COMPACTED_COMMENT)))
+
+def maintain(pool, now: Optional[datetime] = None, retention_months: int = DEFAULT_RAW_RETENTION_MONTHS, retention_mode: str = 'compact'):
+    """
+    Creates the partitions for this month and the next `PARTITIONS_AHEAD`, moves rows out of the default partition, and retires raw
+    partitions older than `retention_months` by compacting or dropping them.
+
+    Parameters:
+    pool (DatabasePool): The pool to borrow a connection from.
+    now (datetime): The current local time, as logged. Defaults to now.
+    retention_months (int): How many whole months of raw rows to keep before retiring them.
+    retention_mode (str): 'compact' to keep one row per zone per hour, or 'drop' to keep only the rollups.
+    """
+    if retention_mode not in RETENTION_MODES:
+        raise ValueError(f"Unknown retention mode '{retention_mode}'. Choose from: {', '.join(RETENTION_MODES)}.")
+    logger = logging.getLogger(__name__)
+    now = now or datetime.now()
+    with pool.connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (ADVISORY_LOCK_ID,))
+            partitions = _partitions(cur)
+            cur.execute("SELECT DISTINCT date_trunc('month', timestamp) FROM temperature_logs_default")
+            stranded = {month for month, in cur.fetchall()}
+            upcoming = {add_months(month_start(now), months) for months in range(PARTITIONS_AHEAD + 1)}
+            for month in sorted((stranded | upcoming) - partitions.keys()):
+                logger.info("Creating temperature_logs partition for %s.", month.strftime('%B %Y'))
+                _create_partition(cur, month)
+
+            for month in partitions_to_retire(list(partitions), now, retention_months):
+                name, compacted = partitions[month]
+                if retention_mode == 'drop':
+                    logger.info("Dropping %s, older than the %s month retention period.", name, retention_months)
+                    cur.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(name)))
+                elif not compacted:
+                    logger.info("Compacting %s to hourly readings, older than the %s month retention period.", name, retention_months)
+                    _compact_partition(cur, month, name)
+
+def retention_from_environment() -> Tuple[int, str]:
+    """The raw retention period and mode from `DB_RAW_RETENTION_MONTHS` and `DB_RETENTION`."""
+    return int(os.getenv("DB_RAW_RETENTION_MONTHS", DEFAULT_RAW_RETENTION_MONTHS)), os.getenv("DB_RETENTION", 'compact')
+
+def main():
+    from .database import DatabasePool
+
+    parser = argparse.ArgumentParser(description="Migrate and maintain the temperature log database.")
+    parser.add_argument('--status', action='store_true', help="List the applied migrations and partitions without changing anything.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    pool = DatabasePool(max_connections=1)
+    try:
+        if args.status:
+            with pool.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT to_regclass('schema_migrations') IS NOT NULL")
+                    if cur.fetchone()[0]:
+                        cur.execute("SELECT version, description, applied_at FROM schema_migrations ORDER BY version")
+                        for version, description, applied_at in cur.fetchall():
+                            print(f"Migration {version}: {description} (applied {applied_at:%Y-%m-%d %H:%M})")
+                    print(f"{len(MIGRATIONS)} migration(s) defined.")
+                    cur.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass('temperature_logs')")
+                    row = cur.fetchone()
+                    if row is not None and row[0]:
+                        for month, (name, compacted) in sorted(_partitions(cur).items()):
+                            print(f"  {name}{' (compacted)' if compacted else ''}")
+        else:
+            applied = migrate(pool)
+            print(f"Applied migrations: {', '.join(map(str, applied))}." if applied else "The schema is up to date.")
+            retention_months, retention_mode = retention_from_environment()
+            maintain(pool, retention_months=retention_months, retention_mode=retention_mode)
+            print("Maintenance complete.")
+    finally:
+        pool.close()
+
+if __name__ == "__main__":
+    main()
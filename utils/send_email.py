@@ -1,32 +1,78 @@
 import smtplib
+import logging
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from dotenv import load_dotenv
-import os 
+import os
 
 # Load environment variables from .env file
 load_dotenv()
 to_email = os.getenv("PERSONAL_EMAIL")
 
-def send_email(subject, body):
-    from_email = os.getenv("THERMOPI_EMAIL_ACCOUNT")
-    app_password = os.getenv("THERMOPI_EMAIL_ACCOUNT_APP_PASSWORD")
+class EmailSender:
+    """
+    Sends emails over a single SMTP connection that's kept open between emails, rather than connecting and logging in to Gmail every time.
+    If the server has closed the connection in the meantime, it reconnects and retries once.
+
+    It's blocking, so call it from a worker thread rather than the event loop.
+
+    Methods:
+        send(subject, body): Sends an HTML email.
+        close(): Closes the connection.
+    """
+    def __init__(self, host: str = 'smtp.gmail.com', port: int = 465, use_ssl: bool = True, from_email: str = None, app_password: str = None, to_email: str = to_email, timeout: float = 30):
+        self._logger = logging.getLogger(__name__)
+        self._host = host
+        self._port = port
+        self._use_ssl = use_ssl
+        self._from_email = from_email if from_email is not None else os.getenv("THERMOPI_EMAIL_ACCOUNT")
+        self._app_password = app_password if app_password is not None else os.getenv("THERMOPI_EMAIL_ACCOUNT_APP_PASSWORD")
+        self._to_email = to_email
+        self._timeout = timeout
+        self._server = None
+
+    def send(self, subject: str, body: str):
+        # Create the root message and fill in the from, to, and subject headers
+        msg = MIMEMultipart()
+        msg['From'] = self._from_email
+        msg['To'] = self._to_email
+        msg['Subject'] = subject
+        msg.attach(MIMEText(body, 'html'))
 
-    # Create the root message and fill in the from, to, and subject headers
-    msg = MIMEMultipart()
-    msg['From'] = from_email
-    msg['To'] = to_email
-    msg['Subject'] = subject
-    msg.attach(MIMEText(body, 'html'))
+        try:
+            self._connection().sendmail(self._from_email, self._to_email, msg.as_string())
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            # The server times out idle connections, so reconnect and try once more. Other SMTP errors (i.e. a rejected recipient) would
+            # only fail again, so they're raised straight away.
+            self.close()
+            self._connection().sendmail(self._from_email, self._to_email, msg.as_string())
 
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._server = None
+
+    def _connection(self):
+        if self._server is None:
+            server_class = smtplib.SMTP_SSL if self._use_ssl else smtplib.SMTP
+            server = server_class(self._host, self._port, timeout=self._timeout)
+            if self._app_password:
+                server.login(self._from_email, self._app_password)
+            self._server = server
+        return self._server
+
+def send_email(subject, body):
+    sender = EmailSender()
     try:
-        # Connect to Gmail's SMTP server
-        with smtplib.SMTP_SSL('smtp.gmail.com', 465) as server:
-            server.login(from_email, app_password)
-            server.sendmail(from_email, to_email, msg.as_string())
-            print("Email sent successfully!")
+        sender.send(subject, body)
+        print("Email sent successfully!")
     except Exception as e:
         print(f"Failed to send email: {e}")
+    finally:
+        sender.close()
 
 # Example usage
 # send_email("Hello from Python", "<h1>This is a test email sent from Python!</h1>")
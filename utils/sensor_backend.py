@@ -0,0 +1,12 @@
+from typing import Dict, Iterable, Optional, Protocol, Union
+
+class SensorBackend(Protocol):
+
+    def discover(self) -> list:
+        """Returns the IDs of every temperature sensor found, sorted so the order is stable between boots."""
+
+    async def read(self, sensor_id: Optional[str] = None):
+        """Reads one sensor, returning a `TemperatureInfo`. `None` means the first sensor found."""
+
+    async def read_many(self, sensor_ids: Iterable[Optional[str]]) -> Dict[Optional[str], Union[object, Exception]]:
+        """Reads several sensors together, returning a dictionary of sensor ID to `TemperatureInfo`, or the exception if it couldn't be read."""
@@ -0,0 +1,129 @@
+import logging
+import math
+import os
+import struct
+import zlib
+from array import array
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from .history import SAMPLE_COLUMNS
+
+"""
+Crash-safe snapshots of each zone's state, so a restart (or a power cut) resumes where it left off rather than from defaults.
+
+A snapshot holds, per zone: the target temperature, whether heating is enabled, the relay's shadow state and how long it had been in it
+(so the minimum on/off times still protect the boiler across a restart), the fitted thermal model's parameters and a recent window of the
+in-memory history. It's restored at startup before HomeKit comes up, so the control loop resumes straight away with the right target, and
+HomeKit reports it rather than its own defaults.
+
+The format is compact binary, little-endian apart from the history columns, which are packed arrays in the Pi's (little-endian) byte order:
+
+    header    magic b'TPSN', format version (uint16), CRC32 of the body (uint32)
+    body      saved at (float64 unix time), zone count (uint16), then for each zone:
+                  zone (int32), target (float64), heating enabled and relay active (bool each), seconds the relay had been in its state
+                  (float64, NaN if unknown), thermal model heat loss, heating gain, lag and RMSE (float64 each, NaN if not fitted), model
+                  sample count (uint32), history sample count (uint32), then each history column (`history.SAMPLE_COLUMNS`) packed
+                  back to back.
+
+Snapshots are written to a temporary file, flushed to disk, then renamed over the previous one, so a crash mid-write leaves the last good
+snapshot in place. A snapshot that fails its CRC is ignored.
+"""
+
+DEFAULT_SNAPSHOT_FILE = 'state_snapshot.bin'
+
+MAGIC = b'TPSN'
+VERSION = 1
+
+_HEADER = struct.Struct('<4sHI')
+_BODY_HEADER = struct.Struct('<dH')
+_ZONE = struct.Struct('<id??d4dII')
+
+MODEL_FIELDS = ('heat_loss_per_hour', 'heating_gain_per_hour', 'lag_minutes', 'rmse')
+
+class ZoneSnapshot(NamedTuple):
+    zone: int
+    target_temperature: float
+    heating_enabled: bool # Whether the thermostat's control loop was running.
+    relay_active: bool
+    relay_seconds_in_state: Optional[float] # How long the relay had been in its state when the snapshot was taken, if known.
+    model: Optional[dict] # The thermal model's parameters, with the same keys as `ThermalModelParameters`.
+    history: Dict[str, list] # Recent samples, with the same keys as `ZoneHistory.samples()`.
+
+def _packed_columns(history: Dict[str, list]) -> Tuple[int, bytes]:
+    count = len(history['timestamp']) if history else 0
+    return count, b''.join(array(typecode, history[name] if count else []).tobytes() for name, typecode in SAMPLE_COLUMNS)
+
+def encode_snapshot(saved_at: float, zones: List[ZoneSnapshot]) -> bytes:
+    parts = [_BODY_HEADER.pack(saved_at, len(zones))]
+    for snapshot in zones:
+        model = snapshot.model or {}
+        count, columns = _packed_columns(snapshot.history)
+        parts.append(_ZONE.pack(
+            snapshot.zone,
+            snapshot.target_temperature,
+            snapshot.heating_enabled,
+            snapshot.relay_active,
+            math.nan if snapshot.relay_seconds_in_state is None else snapshot.relay_seconds_in_state,
+            *(float(model.get(field, math.nan)) for field in MODEL_FIELDS),
+            int(model.get('samples', 0)),
+            count
+        ))
+        parts.append(columns)
+    body = b''.join(parts)
+    return _HEADER.pack(MAGIC, VERSION, zlib.crc32(body)) + body
+
+def decode_snapshot(data: bytes) -> Tuple[float, List[ZoneSnapshot]]:
+    """
+    Raises:
+    ValueError: If the data isn't a snapshot, is from a newer version, or is corrupt.
+    """
+    if len(data) < _HEADER.size:
+        raise ValueError("Snapshot is truncated.")
+    magic, version, checksum = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not a state snapshot.")
+    if version != VERSION:
+        raise ValueError(f"Unsupported snapshot version {version}.")
+    body = memoryview(data)[_HEADER.size:]
+    if zlib.crc32(body) != checksum:
+        raise ValueError("Snapshot failed its CRC check.")
+
+    try:
+        saved_at, zone_count = _BODY_HEADER.unpack_from(body)
+        offset = _BODY_HEADER.size
+        zones = []
+        for _ in range(zone_count):
+            zone, target, heating_enabled, relay_active, relay_seconds, *model_values, model_samples, count = _ZONE.unpack_from(body, offset)
+            offset += _ZONE.size
+            history = {}
+            for name, typecode in SAMPLE_COLUMNS:
+                column = array(typecode)
+                size = column.itemsize * count
+                column.frombytes(body[offset:offset + size])
+                history[name] = column.tolist()
+                offset += size
+            model = None if math.isnan(model_values[0]) else dict(zip(MODEL_FIELDS, model_values), samples=model_samples)
+            zones.append(ZoneSnapshot(zone, target, heating_enabled, relay_active, None if math.isnan(relay_seconds) else relay_seconds, model, history))
+    except (struct.error, ValueError) as e:
+        raise ValueError(f"Snapshot is truncated: {e}")
+    return saved_at, zones
+
+def save_snapshot(saved_at: float, zones: List[ZoneSnapshot], path: str = DEFAULT_SNAPSHOT_FILE):
+    data = encode_snapshot(saved_at, zones)
+    # Write then rename, flushing to the SD card first so a power cut leaves either the old snapshot or the new one.
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+def load_snapshot(path: str = DEFAULT_SNAPSHOT_FILE) -> Optional[Tuple[float, List[ZoneSnapshot]]]:
+    """Loads the last snapshot as (saved at, zones), or None if there isn't a usable one."""
+    try:
+        with open(path, 'rb') as f:
+            return decode_snapshot(f.read())
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logging.getLogger(__name__).error(f"Failed to load state snapshot from {path}: {e}")
+        return None
@@ -0,0 +1,39 @@
+import logging
+import time
+from typing import Callable, Optional
+
+class StartupTimer:
+    """
+    Records how long after the process started each startup milestone was reached, i.e. "first control decision", so slow starts after a
+    power cut can be spotted in the logs.
+
+    Each milestone is recorded the first time it's marked; later marks are ignored, so it's safe to mark from code that runs every tick.
+
+    Key Attributes:
+        _start (float): Monotonic time the process started (or the timer was created).
+        _milestones (dict): Seconds from the start to each milestone, in the order they were reached.
+
+    Methods:
+        mark(milestone): Records a milestone if it hasn't been reached already.
+        elapsed(milestone): Seconds from the start to a milestone, or None if it hasn't been reached.
+        report(): Logs every milestone reached so far.
+    """
+    def __init__(self, start: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self._logger = logging.getLogger(__name__)
+        self._clock = clock
+        self._start = start if start is not None else clock()
+        self._milestones = {}
+
+    def mark(self, milestone: str):
+        if milestone not in self._milestones:
+            self._milestones[milestone] = self._clock() - self._start
+            self._logger.info("Startup: %s after %.2fs.", milestone, self._milestones[milestone])
+
+    def elapsed(self, milestone: str) -> Optional[float]:
+        return self._milestones.get(milestone)
+
+    def report(self) -> str:
+        lines = ["Startup timing:"] + [f"  {seconds:7.2f}s  {milestone}" for milestone, seconds in self._milestones.items()]
+        report = "\n".join(lines)
+        self._logger.info(report)
+        return report
@@ -0,0 +1,174 @@
+import copy
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Optional
+from . import metrics
+
+"""
+Logging that never blocks the event loop and doesn't fill the SD card with the same line every few seconds.
+
+  - Records are put on a bounded in-memory queue by a `QueueHandler`, and a `QueueListener` thread formats them and writes them to stderr
+    (journald, under systemd). If the writer falls too far behind, new records are dropped and counted rather than stalling the loop.
+  - Each line is `key=value` pairs, i.e. `time=2024-01-01T07:00:00.123 level=INFO logger=utils.thermostat msg="Turning ON." zone=3
+    temperature=19.4`, so `journalctl` output can be filtered or parsed. Fields are passed with `extra`, i.e.
+    `logger.info("Turning ON.", extra={'zone': 3, 'temperature': 19.4})`.
+  - Records passed with a `steady_state` key in `extra` (i.e. "Heating is OFF ... No action required" every tick) are logged the first time,
+    then at most once every `LOG_STEADY_STATE_INTERVAL` seconds (5 minutes by default) with a count of the ones suppressed in between. A
+    different key (the zone's state changing) is logged straight away, and records without one, like relay switches, are always logged.
+
+`LOG_LEVEL` and `LOG_STEADY_STATE_INTERVAL` are read before `.env` is loaded (see `smart_thermostat.py`), so set them in the service's
+environment.
+"""
+
+LOG_RECORDS_SUPPRESSED = metrics.counter('thermopi_log_records_suppressed_total', "Repeated steady-state log records that weren't written.")
+LOG_RECORDS_DROPPED = metrics.counter('thermopi_log_records_dropped_total', "Log records dropped because the log writer fell behind.")
+
+DEFAULT_STEADY_STATE_INTERVAL = 300
+DEFAULT_QUEUE_SIZE = 10000
+# How long stopping waits for room on a full queue to tell the listener to finish.
+STOP_TIMEOUT = 5.0
+
+# Attributes every `LogRecord` has, so anything else on a record came from `extra`.
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'taskName', 'steady_state', 'suppressed'}
+
+def _format_value(value) -> str:
+    text = str(value)
+    if not text or any(character in text for character in ' ="\n'):
+        return '"' + text.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+    return text
+
+class KeyValueFormatter(logging.Formatter):
+    """Formats records as `key=value` pairs: the time, level, logger and message, then any fields passed with `extra`."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        timestamp = datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds')
+        parts = [f"time={timestamp}", f"level={record.levelname}", f"logger={record.name}", f"msg={_format_value(record.getMessage())}"]
+        parts.extend(f"{key}={_format_value(value)}" for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES)
+        if getattr(record, 'suppressed', 0):
+            parts.append(f"suppressed={record.suppressed}")
+        line = ' '.join(parts)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            line += '\n' + record.exc_text
+        return line
+
+class SteadyStateFilter(logging.Filter):
+    """
+    Lets through the first record for each `steady_state` key, then at most one every `interval` seconds while the key repeats, noting how
+    many were suppressed in between. Records without the key always pass.
+
+    A key is a (subject, state) tuple, i.e. (zone, 'idle'). A new state for the same subject is logged straight away.
+
+    Key Attributes:
+        _interval (float): The minimum number of seconds between records for the same key.
+        _last_logged (dict): Maps each (logger name, subject) to the state last logged and when.
+        _suppressed (dict): Maps each (logger name, subject) to the number of records suppressed since the last one logged.
+    """
+    def __init__(self, interval: float = DEFAULT_STEADY_STATE_INTERVAL, clock: Callable[[], float] = time.monotonic):
+        super().__init__()
+        self._interval = interval
+        self._clock = clock
+        self._last_logged = {}
+        self._suppressed = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = getattr(record, 'steady_state', None)
+        if key is None:
+            return True
+        subject, state = key
+        group = (record.name, subject)
+        now = self._clock()
+        with self._lock:
+            last = self._last_logged.get(group)
+            repeated = last is not None and last[0] == state
+            if repeated and now - last[1] < self._interval:
+                self._suppressed[group] = self._suppressed.get(group, 0) + 1
+                LOG_RECORDS_SUPPRESSED.inc()
+                return False
+            suppressed = self._suppressed.pop(group, 0)
+            record.suppressed = suppressed if repeated else 0
+            self._last_logged[group] = (state, now)
+        return True
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """A `QueueHandler` that drops records when the queue is full rather than raising, so logging can never stall the caller."""
+
+    def prepare(self, record):
+        # Only merge the arguments into the message here; the formatting (and its I/O) happens on the listener's thread. Unlike the base
+        # class, the traceback is kept apart from the message so it's written on its own lines.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+class _Listener(logging.handlers.QueueListener):
+    """A `QueueListener` that can be stopped while its queue is full, rather than raising `queue.Full` at shutdown."""
+
+    def enqueue_sentinel(self):
+        try:
+            # The listener is still writing, so room frees up as it catches up.
+            self.queue.put(self._sentinel, timeout=STOP_TIMEOUT)
+        except queue.Full:
+            # The writer is stuck, so make room by dropping the oldest record.
+            try:
+                self.queue.get_nowait()
+                LOG_RECORDS_DROPPED.inc()
+            except queue.Empty:
+                pass
+            self.queue.put_nowait(self._sentinel)
+
+_listener = None
+
+def configure_logging(level: Optional[str] = None, steady_state_interval: Optional[float] = None, queue_size: int = DEFAULT_QUEUE_SIZE, stream=None):
+    """
+    Routes every log record through a bounded queue to a background thread writing `key=value` lines, replacing any handlers on the root
+    logger. Call `stop_logging()` at exit to flush what's left on the queue.
+
+    Parameters:
+    level (str): The minimum level logged. Defaults to the `LOG_LEVEL` environment variable, then INFO.
+    steady_state_interval (float): Seconds between repeats of a steady-state record. Defaults to `LOG_STEADY_STATE_INTERVAL`, then 300.
+    """
+    global _listener
+    stop_logging()
+    level = level or os.getenv("LOG_LEVEL", "INFO")
+    if steady_state_interval is None:
+        steady_state_interval = float(os.getenv("LOG_STEADY_STATE_INTERVAL", DEFAULT_STEADY_STATE_INTERVAL))
+
+    output = logging.StreamHandler(stream)
+    output.setFormatter(KeyValueFormatter())
+    records = queue.Queue(maxsize=queue_size)
+    handler = _DroppingQueueHandler(records)
+    # Filtered before queueing, so suppressed records cost nothing more.
+    handler.addFilter(SteadyStateFilter(steady_state_interval))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+
+    _listener = _Listener(records, output, respect_handler_level=True)
+    _listener.start()
+
+def stop_logging():
+    """Writes out any queued records and stops the background thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
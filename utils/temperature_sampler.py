@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Iterable, NamedTuple, Optional
+
+class TemperatureReading(NamedTuple):
+    info: object # TemperatureInfo from temperature_utils.
+    timestamp: float # Monotonic time the reading was taken.
+
+class TemperatureSampler:
+    """
+    Owns the temperature sensors and shares a single cached reading per sensor between every consumer (control loops, monitor loops, data logger).
+
+    Each DS18B20 read is a ~750ms conversion on the 1-Wire bus, so rather than every consumer reading a sensor itself they ask the sampler
+    for "a reading no older than N seconds". If the cached reading is fresh enough it's returned immediately; otherwise every sensor on the
+    bus is read concurrently in one gather, so adding zones doesn't multiply the latency of a tick. Concurrent requests share one in-flight
+    read instead of stacking reads on the bus. Given a `read_many_function` (i.e. `SysfsBackend.read_many`), every sensor is read in one
+    call instead, so the backend can convert them all at once.
+
+    Key Attributes:
+        _read_function (callable): Coroutine function taking a sensor ID and returning a `TemperatureInfo`, i.e. `temperature_utils.read_temp`.
+        _read_many_function (callable): Optional coroutine function taking the sensor IDs and returning a dictionary of sensor ID to
+            `TemperatureInfo` or exception. Used instead of `_read_function` when given.
+        _sensor_ids (list): The sensors to read each tick. `None` is a valid ID, meaning "the first sensor found".
+        _interval (float): Seconds between background reads once `start()` has been called.
+        _latest (dict): The most recent `TemperatureReading` for each sensor ID.
+        _in_flight (asyncio.Future): The read currently in progress, shared by all waiting callers.
+
+    Methods:
+        latest_reading(sensor_id): The most recent `TemperatureReading` for a sensor, or None if it hasn't been read yet.
+        read(sensor_id, max_age): Returns a `TemperatureInfo` for the sensor no older than `max_age` seconds.
+        read_all(max_age): Returns a dictionary of sensor ID to `TemperatureInfo`, each no older than `max_age` seconds.
+        start(): Starts the background task which keeps the cached readings fresh.
+        stop(): Stops the background task.
+    """
+
+    # Initialization
+
+    def __init__(self, read_function: Callable[[Optional[str]], Awaitable[object]], sensor_ids: Iterable[Optional[str]] = (None,), interval: float = 5.0, clock: Callable[[], float] = time.monotonic, read_many_function: Callable[[list], Awaitable[dict]] = None):
+        self._logger = logging.getLogger(__name__)
+        self._read_function = read_function
+        self._read_many_function = read_many_function
+        self._sensor_ids = list(sensor_ids)
+        self._interval = interval
+        self._clock = clock
+        self._latest = {}
+        self._in_flight = None
+        self._sampler_task = None
+
+    # Public Properties
+
+    @property
+    def sensor_ids(self) -> list:
+        return list(self._sensor_ids)
+
+    def latest_reading(self, sensor_id: Optional[str] = None) -> Optional[TemperatureReading]:
+        return self._latest.get(sensor_id)
+
+    # Public Methods
+
+    async def read(self, sensor_id: Optional[str] = None, max_age: float = 0.0):
+        """Returns a `TemperatureInfo` no older than `max_age` seconds, reading the sensors only if the cached value is too old."""
+        if sensor_id not in self._sensor_ids:
+            raise KeyError(f"Sensor {sensor_id} is not registered with the sampler.")
+
+        if not self._is_fresh(sensor_id, max_age):
+            errors = await self._read_sensors()
+            if sensor_id in errors:
+                raise errors[sensor_id]
+        return self._latest[sensor_id].info
+
+    async def read_all(self, max_age: float = 0.0) -> dict:
+        """Returns the latest `TemperatureInfo` for every sensor that could be read, refreshing them in one gather if any are too old."""
+        if not all(self._is_fresh(sensor_id, max_age) for sensor_id in self._sensor_ids):
+            await self._read_sensors()
+        return {sensor_id: reading.info for sensor_id, reading in self._latest.items()}
+
+    async def start(self):
+        """Starts reading the sensors in the background every `interval` seconds."""
+        if self._sampler_task is None:
+            self._sampler_task = asyncio.create_task(self._sampler_loop())
+            self._logger.info("Temperature sampler started for sensors: %s", self._sensor_ids)
+
+    async def stop(self):
+        """Stops the background sampler task."""
+        if self._sampler_task:
+            self._sampler_task.cancel()
+            try:
+                await self._sampler_task
+            except asyncio.CancelledError:
+                self._logger.info("Temperature sampler task cancelled.")
+            self._sampler_task = None
+
+    # Private Methods
+
+    def _is_fresh(self, sensor_id, max_age):
+        latest = self._latest.get(sensor_id)
+        return latest is not None and self._clock() - latest.timestamp <= max_age
+
+    async def _read_sensors(self) -> dict:
+        # Join the read that's already on the bus rather than starting another one.
+        if self._in_flight is None:
+            self._in_flight = asyncio.ensure_future(self._gather_sensors())
+        return await asyncio.shield(self._in_flight)
+
+    async def _gather_sensors(self) -> dict:
+        """Reads every sensor concurrently, caching the successes and returning a dictionary of sensor ID to exception for the failures."""
+        try:
+            if self._read_many_function is not None:
+                read = await self._read_many_function(self._sensor_ids)
+                results = [read.get(sensor_id, KeyError(f"Sensor {sensor_id} wasn't read.")) for sensor_id in self._sensor_ids]
+            else:
+                results = await asyncio.gather(*(self._read_function(sensor_id) for sensor_id in self._sensor_ids), return_exceptions=True)
+            timestamp = self._clock()
+            errors = {}
+            for sensor_id, result in zip(self._sensor_ids, results):
+                if isinstance(result, Exception):
+                    errors[sensor_id] = result
+                else:
+                    self._latest[sensor_id] = TemperatureReading(info=result, timestamp=timestamp)
+            return errors
+        finally:
+            self._in_flight = None
+
+    async def _sampler_loop(self):
+        try:
+            while True:
+                try:
+                    # Skip the read if a consumer has already refreshed every sensor since the last tick.
+                    fresh = all(self._is_fresh(sensor_id, self._interval / 2) for sensor_id in self._sensor_ids)
+                    errors = {} if fresh else await self._read_sensors()
+                    for sensor_id, error in errors.items():
+                        self._logger.error(f"Unexpected error reading temperature sensor {sensor_id}: {error}")
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self._logger.error(f"Unexpected error reading temperature sensors: {e}")
+                await asyncio.sleep(self._interval)
+        except asyncio.CancelledError:
+            self._logger.info("Temperature sampler loop stopped.")
@@ -1,7 +1,11 @@
 import os
 import glob
 import asyncio
-from typing import NamedTuple
+import logging
+import time
+from typing import Callable, Iterable, NamedTuple, Optional
+from . import metrics
+from .sensor_backend import SensorBackend
 
 """
 This script allows you to read temperature data from a DS18B20 temperature sensor connected to a Raspberry Pi, return the temperature in celsius and fahrenheit.
@@ -21,6 +25,8 @@ For more information on setting up and using the DS18B20 temperature sensor with
 - https://thepihut.com/blogs/raspberry-pi-tutorials/ds18b20-one-wire-digital-temperature-sensor-and-the-raspberry-pi
 - https://pimylifeup.com/raspberry-pi-temperature-sensor/
 
+Reading through `SysfsBackend.read_many()` triggers one simultaneous conversion for every sensor on the bus, so several sensors cost one
+conversion rather than one each. That needs write access to `therm_bulk_read` (see the README); without it each sensor converts when read.
 """
 class TemperatureInfo(NamedTuple):
     celcius: float
@@ -29,62 +35,209 @@ class TemperatureInfo(NamedTuple):
 # This path is where 1-wire devices are mounted in the filesystem of a Linux-based system.
 base_dir = '/sys/bus/w1/devices/'
 
-# The '28' prefix is common for DS18B20 temperature sensors. Since we only have 1 sensor, we just grab the first.
-try:
-    device_folder = glob.glob(base_dir + '28*')[0]
-except IndexError:
-    raise FileNotFoundError("No temperature sensor found; is it wired correctly?")
+SENSOR_READ_SECONDS = metrics.histogram('thermopi_sensor_read_seconds', "Time to read a temperature sensor, including CRC retries.", labels=('sensor',))
+SENSOR_CRC_RETRIES = metrics.counter('thermopi_sensor_crc_retries_total', "Sensor reads retried because the CRC check failed.", labels=('sensor',))
+SENSOR_READ_ERRORS = metrics.counter('thermopi_sensor_read_errors_total', "Sensor reads that failed.", labels=('sensor',))
+SENSOR_BULK_CONVERSIONS = metrics.counter('thermopi_sensor_bulk_conversions_total', "Simultaneous conversions triggered across every sensor on the bus.")
 
-# The 'w1_slave' is provided by 'w1-therm' module and contains the raw temperature data from the sensor.
-device_file = device_folder + '/w1_slave'
+# The DS18B20's power-on reset value, reported when a conversion never happened (i.e. a brownout on parasitic power) rather than a real 85°C.
+POWER_ON_RESET_MILLIDEGREES = 85000
 
-async def _read_temp_raw():
-    try:
-        # Open is not natively async, so we use 'asyncio' to run it in a threadpool
-        with await asyncio.to_thread(open, device_file, 'r') as f:
-            lines = await asyncio.to_thread(f.readlines)
-        return lines
-    except Exception as e:  # It's good practice to specify the exception
-        raise IOError(f"Failed to read device file; is the temperature sensor wired correctly? Error: {e}")
-
-async def read_temp() -> TemperatureInfo:
-    # The raw temperature comes over two lines in the following format:
-    # 54 01 4b 46 7f ff 0c 10 fd : crc=fd YES
-    # 54 01 4b 46 7f ff 0c 10 fd t=21250
-    lines = await _read_temp_raw()
-
-    max_attempts = 10
-    attempts = 0
-    
-    # The first line is a checksum to indicate if the measurement is valid. 
-    # If the line ends in 'YES', we can proceed. If 'NO', the sensor is not ready so we wait 0.2 seconds.
-    while True:
+class SysfsBackend(SensorBackend):
+    """
+    Reads DS18B20 sensors through the w1-therm kernel module's sysfs files.
+
+    Each read is one hop to the threadpool making one `read` syscall, preferring the kernel's `temperature` attribute (millidegrees, already
+    CRC checked) and falling back to parsing `w1_slave` on kernels without it. A `w1_slave` read that fails its CRC is retried in the same
+    thread. When several sensors are read together, writing `trigger` to each bus master's `therm_bulk_read` starts a conversion on every
+    sensor at once, and each sensor's next read returns that result rather than starting its own ~750ms conversion.
+
+    Key Attributes:
+        _base_dir (str): Where the kernel mounts the 1-Wire devices.
+        _default_sensor_id (str): The first sensor found, discovered on the first read rather than at startup, so a bus that's slow to
+            appear after boot doesn't stop the thermostat starting. It's forgotten if reading it fails, so it's rediscovered on the next read.
+        _has_temperature_attribute (bool): Whether the kernel provides the `temperature` attribute; cleared the first time it's missing.
+        _bulk_read (bool): Whether to trigger bulk conversions; cleared if the bus masters don't support them or we can't write to them.
+
+    Methods:
+        discover(): Returns the IDs of every DS18B20 on the bus.
+        read(sensor_id): Reads one sensor.
+        read_many(sensor_ids): Reads several sensors after a single bulk conversion.
+    """
+    def __init__(self, base_dir: str = base_dir, bulk_read: bool = True, crc_retries: int = 10, crc_retry_delay: float = 0.2, conversion_timeout: float = 1.5, sleep: Callable[[float], None] = time.sleep):
+        self._logger = logging.getLogger(__name__)
+        self._base_dir = base_dir
+        self._bulk_read = bulk_read
+        self._crc_retries = crc_retries
+        self._crc_retry_delay = crc_retry_delay
+        self._conversion_timeout = conversion_timeout
+        self._sleep = sleep
+        self._default_sensor_id = None
+        self._has_temperature_attribute = True
+
+    # Public Methods
+
+    def discover(self) -> list:
+        """
+        Raises:
+        FileNotFoundError: If no sensors are found.
+        """
+        # The '28' prefix is common for DS18B20 temperature sensors.
+        sensor_ids = sorted(os.path.basename(folder) for folder in glob.glob(os.path.join(self._base_dir, '28*')))
+        if not sensor_ids:
+            raise FileNotFoundError("No temperature sensor found; is it wired correctly?")
+        return sensor_ids
+
+    async def read(self, sensor_id: Optional[str] = None) -> TemperatureInfo:
+        label = sensor_id or 'default'
+        try:
+            with SENSOR_READ_SECONDS.time(label):
+                return await asyncio.to_thread(self._read_sensor, sensor_id)
+        except Exception:
+            SENSOR_READ_ERRORS.inc(label)
+            raise
+
+    async def read_many(self, sensor_ids: Iterable[Optional[str]]) -> dict:
+        sensor_ids = list(sensor_ids)
+        # Everything happens in one hop: the sensors are read one after another once the shared conversion has finished.
+        return await asyncio.to_thread(self._read_many, sensor_ids)
+
+    # Private Methods
+
+    def _read_many(self, sensor_ids: list) -> dict:
+        if len(sensor_ids) > 1 and self._bulk_read:
+            self._convert_all()
+        results = {}
+        for sensor_id in sensor_ids:
+            label = sensor_id or 'default'
+            try:
+                with SENSOR_READ_SECONDS.time(label):
+                    results[sensor_id] = self._read_sensor(sensor_id)
+            except Exception as e:
+                SENSOR_READ_ERRORS.inc(label)
+                results[sensor_id] = e
+        return results
+
+    def _convert_all(self):
+        """Starts a conversion on every sensor at once and waits for it to finish. Falls back to per-sensor conversions if that fails."""
+        bus_masters = glob.glob(os.path.join(self._base_dir, 'w1_bus_master*', 'therm_bulk_read'))
+        if not bus_masters:
+            self._logger.info("The 1-Wire bus doesn't support bulk conversions; each sensor will convert when it's read.")
+            self._bulk_read = False
+            return
+        try:
+            for path in bus_masters:
+                _write_file(path, b'trigger')
+        except PermissionError:
+            self._logger.warning("Can't write to %s, so each sensor will convert when it's read. See the README to allow bulk conversions.", bus_masters[0])
+            self._bulk_read = False
+            return
+        except OSError as e:
+            self._logger.warning(f"Failed to start a bulk conversion: {e}")
+            return
+        SENSOR_BULK_CONVERSIONS.inc()
+
+        # `therm_bulk_read` reads -1 while a conversion is in progress. Reading a sensor would also wait for it, but only on newer kernels.
+        deadline = time.monotonic() + self._conversion_timeout
+        for path in bus_masters:
+            while _read_file(path).strip() == b'-1' and time.monotonic() < deadline:
+                self._sleep(0.05)
+
+    def _read_sensor(self, sensor_id: Optional[str]) -> TemperatureInfo:
+        resolved_id = sensor_id
+        if sensor_id is None:
+            # If no sensor is specified we fall back to the first sensor found, matching the original single sensor setup.
+            if self._default_sensor_id is None:
+                self._default_sensor_id = self.discover()[0]
+            resolved_id = self._default_sensor_id
         try:
-            if lines[0].strip()[-3:] == 'YES':
-                break  # Exit loop if the condition is met
-            elif attempts >= max_attempts:
-                raise TimeoutError("Sensor read attempt exceeded maximum retries.")
-        except IndexError:
-            raise IndexError("Unexpected data format from sensor; is the temperature sensor wired correctly?")
-
-        await asyncio.sleep(0.2)
-        lines = await _read_temp_raw()
-        attempts += 1
-
-    # Now we find the actual raw data by finding 't='.
-    equals_pos = lines[1].find('t=')
-
-    # If `equals_pos` is not -1, it means 't=' has been located.
-    if equals_pos != -1:
-        temp_string = lines[1][equals_pos+2:]
-        temp_c = float(temp_string) / 1000.0
-        temp_f = temp_c * 9.0 / 5.0 + 32.0
-        return TemperatureInfo(celcius=temp_c, fahrenheit=temp_f)
-    
+            millidegrees = self._read_millidegrees(resolved_id)
+        except Exception:
+            if sensor_id is None:
+                self._default_sensor_id = None
+            raise
+        if millidegrees == POWER_ON_RESET_MILLIDEGREES:
+            raise IOError("Sensor returned its power-on reset value; is the temperature sensor getting enough power?")
+        temp_c = millidegrees / 1000.0
+        return TemperatureInfo(celcius=temp_c, fahrenheit=temp_c * 9.0 / 5.0 + 32.0)
+
+    def _read_millidegrees(self, sensor_id: str) -> int:
+        if self._has_temperature_attribute:
+            try:
+                data = _read_file(os.path.join(self._base_dir, sensor_id, 'temperature'))
+            except FileNotFoundError:
+                if not os.path.isdir(os.path.join(self._base_dir, sensor_id)):
+                    raise IOError(f"Temperature sensor {sensor_id} not found; is it wired correctly?")
+                self._logger.info("The kernel doesn't provide the 'temperature' attribute; reading 'w1_slave' instead.")
+                self._has_temperature_attribute = False
+            except OSError as e:
+                # The kernel checks the CRC itself, and fails the read if it doesn't match.
+                raise IOError(f"Failed to read temperature sensor {sensor_id}; is it wired correctly? Error: {e}")
+            else:
+                try:
+                    return int(data)
+                except ValueError:
+                    raise IOError(f"Unexpected data from temperature sensor {sensor_id}: {data!r}")
+        return self._read_w1_slave(sensor_id)
+
+    def _read_w1_slave(self, sensor_id: str) -> int:
+        # The raw temperature comes over two lines in the following format:
+        # 54 01 4b 46 7f ff 0c 10 fd : crc=fd YES
+        # 54 01 4b 46 7f ff 0c 10 fd t=21250
+        # The first line is a checksum to indicate if the measurement is valid. If it ends in 'NO', the sensor is not ready so we wait and retry.
+        path = os.path.join(self._base_dir, sensor_id, 'w1_slave')
+        for attempt in range(self._crc_retries + 1):
+            if attempt:
+                SENSOR_CRC_RETRIES.inc(sensor_id)
+                self._sleep(self._crc_retry_delay)
+            try:
+                lines = _read_file(path).decode('ascii', errors='replace').splitlines()
+            except OSError as e:
+                raise IOError(f"Failed to read device file; is the temperature sensor wired correctly? Error: {e}")
+            if len(lines) < 2:
+                raise IOError("Unexpected data format from sensor; is the temperature sensor wired correctly?")
+            if lines[0].strip().endswith('YES'):
+                equals_pos = lines[1].find('t=')
+                if equals_pos == -1:
+                    raise IOError("Unexpected data format from sensor; is the temperature sensor wired correctly?")
+                return int(lines[1][equals_pos + 2:])
+        raise TimeoutError("Sensor read attempt exceeded maximum retries.")
+
+def _read_file(path: str) -> bytes:
+    # One syscall: every w1-therm file fits comfortably in a single read.
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        return os.read(fd, 256)
+    finally:
+        os.close(fd)
+
+def _write_file(path: str, data: bytes):
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        os.write(fd, data)
+    finally:
+        os.close(fd)
+
+# The backend used by `read_temp()`, for callers that read one sensor at a time.
+default_backend = SysfsBackend()
+
+def discover_sensors() -> list:
+    """
+    Returns the IDs of every DS18B20 on the 1-Wire bus (i.e. ['28-0123456789ab']), sorted so the order is stable between boots.
+
+    Raises:
+    FileNotFoundError: If no sensors are found.
+    """
+    return default_backend.discover()
+
+async def read_temp(sensor_id=None) -> TemperatureInfo:
+    return await default_backend.read(sensor_id)
+
 async def main():
     try:
-        temperature_info = await read_temp()
-        print(f"Temperature: {temperature_info.celcius}°C, {temperature_info.fahrenheit}°F")
+        for sensor_id in discover_sensors():
+            temperature_info = await read_temp(sensor_id)
+            print(f"{sensor_id} temperature: {temperature_info.celcius}°C, {temperature_info.fahrenheit}°F")
     except Exception as e:
         print(f"Error reading temperature: {e}")
 
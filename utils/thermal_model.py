@@ -0,0 +1,300 @@
+import argparse
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Iterable, NamedTuple, Optional
+import numpy as np
+
+"""
+Fits a first-order RC thermal model to each zone's logged history, so the control loop knows how quickly a room loses and gains heat.
+
+The model is:
+
+    dT/dt = -heat_loss * (T - T_outdoor) + heating_gain * heating(t - lag)
+
+where temperatures are in °C, time is in hours and `heating` is 1 while the relay is on. The lag captures how long underfloor heating takes
+to warm the room after the relay switches (and to stop warming it after it switches off).
+
+For each candidate lag the model is linear in its coefficients, so it's solved with least squares. Rather than keeping the rows, we keep the
+normal equations (XᵀX, Xᵀy) for every candidate lag; new rows are added to them incrementally and the model is re-solved in microseconds.
+History is streamed from the database a chunk at a time, so even a full fit of months of readings needs only a few megabytes.
+
+Fitting runs offline rather than in the thermostat service: schedule the incremental fit (i.e. from a nightly cron job) and restart the
+service, or let it pick the models up at its next start.
+
+Usage:
+    python -m utils.thermal_model --zone 3               # Fit from the zone's full history.
+    python -m utils.thermal_model --zone 3 --incremental # Add rows logged since the last fit.
+"""
+
+DEFAULT_MODELS_FILE = 'thermal_models.json'
+
+class ThermalModelParameters(NamedTuple):
+    heat_loss_per_hour: float # Fraction of the indoor/outdoor difference lost per hour.
+    heating_gain_per_hour: float # °C per hour added while the relay is on.
+    lag_minutes: float # Delay between the relay switching and the room responding.
+    rmse: float # Root mean squared error of the fitted dT/dt, in °C per hour.
+    samples: int # Number of readings the model was fitted from.
+
+    def rate_of_change(self, indoor_temperature: float, outdoor_temperature: float, heating: bool) -> float:
+        """The modelled rate of change in °C per hour, assuming the relay has been in its current state for at least the lag."""
+        return -self.heat_loss_per_hour * (indoor_temperature - outdoor_temperature) + (self.heating_gain_per_hour if heating else 0.0)
+
+class ThermalModelFitter:
+    """
+    Fits `ThermalModelParameters` from arrays of logged history, fully vectorized with NumPy so months of readings fit in seconds on a Pi.
+
+    Key Attributes:
+        _lag_steps (np.ndarray): The candidate lags in minutes.
+        _max_gap_minutes (float): Readings further apart than this (i.e. the thermostat was off) aren't used to estimate dT/dt.
+        _xtx (np.ndarray): XᵀX for every candidate lag, shape (lags, 2, 2).
+        _xty (np.ndarray): Xᵀy for every candidate lag, shape (lags, 2).
+        _yty (float): yᵀy, used to calculate the residual error.
+        _count (int): Number of rows accumulated.
+        _last_timestamp (float): Unix timestamp of the newest row accumulated, so incremental fits don't count rows twice.
+
+    Methods:
+        add(timestamps, indoor, outdoor, heating): Accumulates rows into the normal equations.
+        add_batches(batches): Accumulates rows a chunk at a time, carrying context for the lag between chunks.
+        solve(): Returns the best fitting `ThermalModelParameters` across the candidate lags.
+        to_dict()/from_dict(): Serialise the fitter, including its accumulated statistics.
+    """
+
+    def __init__(self, max_lag_minutes: float = 240, lag_step_minutes: float = 10, max_gap_minutes: float = 30):
+        self._lag_steps = np.arange(0, max_lag_minutes + lag_step_minutes, lag_step_minutes, dtype=np.float64)
+        self._max_gap_minutes = max_gap_minutes
+        self._xtx = np.zeros((len(self._lag_steps), 2, 2))
+        self._xty = np.zeros((len(self._lag_steps), 2))
+        self._yty = 0.0
+        self._count = 0
+        self._last_timestamp = None
+
+    @property
+    def last_timestamp(self) -> Optional[float]:
+        return self._last_timestamp
+
+    @property
+    def max_lag_minutes(self) -> float:
+        return float(self._lag_steps[-1])
+
+    def add(self, timestamps, indoor, outdoor, heating):
+        """
+        Accumulates logged rows. Rows must be sorted by time and can include rows already added (or from before the last fit) to provide
+        context for the lag: only derivatives ending after the last accumulated row are counted.
+
+        Parameters:
+        timestamps (array): Unix timestamps in seconds.
+        indoor (array): Indoor temperatures.
+        outdoor (array): Outdoor temperatures. NaN where unknown.
+        heating (array): Relay state, truthy while on.
+        """
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        indoor = np.asarray(indoor, dtype=np.float64)
+        outdoor = np.asarray(outdoor, dtype=np.float64)
+        heating = np.asarray(heating, dtype=np.float64)
+        if len(timestamps) < 2:
+            return
+
+        # Forward differences give dT/dt in °C per hour for each interval between readings.
+        dt_hours = np.diff(timestamps) / 3600.0
+        dT_dt = np.diff(indoor) / np.where(dt_hours > 0, dt_hours, np.nan)
+        start_times = timestamps[:-1]
+        delta = indoor[:-1] - outdoor[:-1]
+
+        valid = np.isfinite(dT_dt) & np.isfinite(delta) & (dt_hours * 60.0 <= self._max_gap_minutes)
+        if self._last_timestamp is not None:
+            valid &= timestamps[1:] > self._last_timestamp
+
+        # The relay state `lag` minutes before each interval, for every candidate lag at once: shape (lags, intervals).
+        lagged_times = start_times[np.newaxis, :] - self._lag_steps[:, np.newaxis] * 60.0
+        lagged_indices = np.searchsorted(timestamps, lagged_times, side='right') - 1
+        has_history = lagged_indices >= 0
+        lagged_heating = np.where(has_history, heating[np.clip(lagged_indices, 0, None)], np.nan)
+
+        # Only use intervals where every lag has history, so each lag is fitted on the same rows and their errors are comparable.
+        valid &= np.all(has_history, axis=0)
+        if not np.any(valid):
+            self._last_timestamp = max(self._last_timestamp or timestamps[-1], timestamps[-1])
+            return
+
+        y = dT_dt[valid]
+        loss = -delta[valid]
+        gain = lagged_heating[:, valid]
+
+        # Normal equations for X = [-(T - T_outdoor), heating(t - lag)] for every lag, via einsum rather than a Python loop.
+        self._xtx[:, 0, 0] += np.dot(loss, loss)
+        self._xtx[:, 0, 1] += gain @ loss
+        self._xtx[:, 1, 0] += gain @ loss
+        self._xtx[:, 1, 1] += np.einsum('ij,ij->i', gain, gain)
+        self._xty[:, 0] += np.dot(loss, y)
+        self._xty[:, 1] += gain @ y
+        self._yty += float(np.dot(y, y))
+        self._count += int(valid.sum())
+        self._last_timestamp = float(timestamps[-1])
+
+    def add_batches(self, batches: Iterable[tuple]):
+        """
+        Accumulates time-ordered chunks of (timestamps, indoor, outdoor, heating) arrays, as `add` does for one. Each `add` builds arrays of
+        lags x rows, so chunking keeps memory bounded; the rows covering the longest lag are carried into the next chunk as context.
+        """
+        context = None
+        for batch in batches:
+            columns = [np.asarray(column, dtype=np.float64) for column in batch]
+            if len(columns[0]) == 0:
+                continue
+            if context is not None:
+                columns = [np.concatenate((previous, column)) for previous, column in zip(context, columns)]
+            self.add(*columns)
+            # From the last row at or before the longest lag behind the newest, so every interval in the next chunk has its lagged state.
+            timestamps = columns[0]
+            start = max(int(np.searchsorted(timestamps, timestamps[-1] - self.max_lag_minutes * 60, side='right')) - 1, 0)
+            context = [column[start:] for column in columns]
+
+    def solve(self) -> Optional[ThermalModelParameters]:
+        if self._count < 3:
+            return None
+
+        # Solve every lag's 2x2 system at once, skipping lags whose system is singular (i.e. the relay never switched).
+        determinants = np.linalg.det(self._xtx)
+        solvable = np.abs(determinants) > 1e-9
+        if not np.any(solvable):
+            return None
+        coefficients = np.full((len(self._lag_steps), 2), np.nan)
+        coefficients[solvable] = np.linalg.solve(self._xtx[solvable], self._xty[solvable][..., np.newaxis])[..., 0]
+
+        # Residual sum of squares from the normal equations: yᵀy - 2βᵀXᵀy + βᵀXᵀXβ.
+        residuals = self._yty - 2 * np.einsum('ij,ij->i', coefficients, self._xty) + np.einsum('ij,ijk,ik->i', coefficients, self._xtx, coefficients)
+        residuals = np.where(solvable, residuals, np.inf)
+        best = int(np.argmin(residuals))
+
+        return ThermalModelParameters(
+            heat_loss_per_hour=float(coefficients[best, 0]),
+            heating_gain_per_hour=float(coefficients[best, 1]),
+            lag_minutes=float(self._lag_steps[best]),
+            rmse=float(np.sqrt(max(residuals[best], 0.0) / self._count)),
+            samples=self._count
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            'lag_steps': self._lag_steps.tolist(),
+            'max_gap_minutes': self._max_gap_minutes,
+            'xtx': self._xtx.tolist(),
+            'xty': self._xty.tolist(),
+            'yty': self._yty,
+            'count': self._count,
+            'last_timestamp': self._last_timestamp
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'ThermalModelFitter':
+        fitter = cls()
+        fitter._lag_steps = np.asarray(data['lag_steps'], dtype=np.float64)
+        fitter._max_gap_minutes = data['max_gap_minutes']
+        fitter._xtx = np.asarray(data['xtx'], dtype=np.float64)
+        fitter._xty = np.asarray(data['xty'], dtype=np.float64)
+        fitter._yty = data['yty']
+        fitter._count = data['count']
+        fitter._last_timestamp = data['last_timestamp']
+        return fitter
+
+# Storage
+
+def _read_models_file(path: str) -> dict:
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def save_thermal_model(zone: int, parameters: ThermalModelParameters, fitter: ThermalModelFitter, path: str = DEFAULT_MODELS_FILE):
+    models = _read_models_file(path)
+    models[str(zone)] = {
+        'parameters': parameters._asdict(),
+        'fitted_at': datetime.now().isoformat(),
+        'fitter': fitter.to_dict()
+    }
+    # Write then rename so the control loop never loads a half written file.
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(models, f)
+    os.replace(temp_path, path)
+
+def load_thermal_model(zone: int, path: str = DEFAULT_MODELS_FILE) -> Optional[ThermalModelParameters]:
+    """Loads the fitted parameters for a zone, or None if the zone hasn't been fitted yet."""
+    try:
+        entry = _read_models_file(path).get(str(zone))
+    except (ValueError, OSError) as e:
+        logging.getLogger(__name__).error(f"Failed to load thermal models from {path}: {e}")
+        return None
+    return ThermalModelParameters(**entry['parameters']) if entry else None
+
+def load_thermal_model_fitter(zone: int, path: str = DEFAULT_MODELS_FILE) -> Optional[ThermalModelFitter]:
+    entry = _read_models_file(path).get(str(zone))
+    return ThermalModelFitter.from_dict(entry['fitter']) if entry else None
+
+# Fitting from the database
+
+def _history_columns(rows: list) -> tuple:
+    """Converts rows from `stream_temperature_logs` into (timestamps, indoor, outdoor, heating) arrays for the fitter."""
+    # Logged timestamps are read as UTC, as `EXTRACT(EPOCH FROM timestamp)` does, so they line up with fits saved from earlier versions.
+    timestamps = np.fromiter((row[0].replace(tzinfo=timezone.utc).timestamp() for row in rows), dtype=np.float64, count=len(rows))
+    indoor = np.fromiter((row[1] for row in rows), dtype=np.float64, count=len(rows))
+    outdoor = np.fromiter((np.nan if row[2] is None else row[2] for row in rows), dtype=np.float64, count=len(rows))
+    heating = np.fromiter((row[3] for row in rows), dtype=np.float64, count=len(rows))
+    return timestamps, indoor, outdoor, heating
+
+def fit_zone(pool, zone: int, incremental: bool = False, path: str = DEFAULT_MODELS_FILE, chunk_size: int = 10000) -> Optional[ThermalModelParameters]:
+    """
+    Fits (or incrementally refits) a zone's model from `temperature_logs` and saves it.
+
+    Parameters:
+    pool (DatabasePool): The pool to query the history from.
+    zone (int): The zone to fit.
+    incremental (bool): If True, only rows logged since the last fit (plus enough earlier rows for the lag) are fetched and added.
+    chunk_size (int): Rows streamed from the database and added at a time.
+    """
+    from .database import stream_temperature_logs
+
+    fitter = load_thermal_model_fitter(zone, path) if incremental else None
+    after = None
+    if fitter is not None and fitter.last_timestamp is not None:
+        after = datetime.fromtimestamp(fitter.last_timestamp - fitter.max_lag_minutes * 60 - 3600, timezone.utc).replace(tzinfo=None)
+    else:
+        fitter = ThermalModelFitter()
+
+    fitter.add_batches(_history_columns(rows) for rows in stream_temperature_logs(pool, zone, after=after, batch_size=chunk_size))
+    parameters = fitter.solve()
+    if parameters is not None:
+        save_thermal_model(zone, parameters, fitter, path)
+    return parameters
+
+def main():
+    from .database import DatabasePool
+
+    parser = argparse.ArgumentParser(description="Fit a zone's thermal model from its logged history.")
+    parser.add_argument('--zone', type=int, required=True, help="The zone to fit.")
+    parser.add_argument('--incremental', action='store_true', help="Only add rows logged since the last fit.")
+    parser.add_argument('--models-file', default=DEFAULT_MODELS_FILE, help="Where fitted models are stored.")
+    args = parser.parse_args()
+
+    pool = DatabasePool(max_connections=1)
+    start = time.monotonic()
+    try:
+        parameters = fit_zone(pool, args.zone, incremental=args.incremental, path=args.models_file)
+    finally:
+        pool.close()
+
+    if parameters is None:
+        print(f"Not enough history to fit zone {args.zone}.")
+    else:
+        print(f"Zone {args.zone} fitted in {time.monotonic() - start:.1f}s from {parameters.samples} readings:")
+        print(f"  Heat loss: {parameters.heat_loss_per_hour:.4f} per hour")
+        print(f"  Heating gain: {parameters.heating_gain_per_hour:.3f}°C per hour")
+        print(f"  Lag: {parameters.lag_minutes:.0f} minutes")
+        print(f"  RMSE: {parameters.rmse:.3f}°C per hour")
+
+if __name__ == "__main__":
+    main()
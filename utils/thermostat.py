@@ -1,10 +1,24 @@
-from .relay import Relay
+from .relay_protocol import RelayProtocol
 from .temperature_utils import read_temp
+from .temperature_sampler import TemperatureSampler
+from .control_strategy import ControlStrategy, HysteresisStrategy
+from .event_bus import EventBus, ControlDecision, ModeChanged, RelaySwitched, TargetTemperatureChanged, TemperatureSampled
+from .tick_scheduler import AdaptiveTickScheduler
+from . import metrics
 import time 
 import asyncio
 import logging
 import random
 
+CONTROL_TICK_SECONDS = metrics.histogram('thermopi_control_tick_seconds', "Time taken by each control loop check.", labels=('sensor',))
+CONTROL_TICK_JITTER_SECONDS = metrics.histogram('thermopi_control_tick_jitter_seconds', "How late each control loop check started.", labels=('sensor',))
+CONTROL_TICK_INTERVAL_SECONDS = metrics.histogram('thermopi_control_tick_interval_seconds', "Seconds the control loop sleeps between checks.", labels=('sensor',), buckets=(2, 5, 10, 30, 60, 120, 300, 600))
+
+# Seconds between temperature samples published by the monitor loop. With an adaptive tick scheduler it follows the control loop's interval
+# between these bounds, so an idle zone doesn't keep the sensor busy just to report a steady temperature.
+MONITOR_INTERVAL = 10
+MAX_MONITOR_INTERVAL = 60
+
 class Thermostat:
     """
     Controls a heating system through a relay based on current and target temperatures, maintaining the desired environment within a hysteresis range.
@@ -12,34 +26,46 @@ class Thermostat:
     Note: All temperature is handled in celcius.
 
     Key Attributes:
-        _heating_relay (Relay): Relay object controlling the heating element.
+        _heating_relay (RelayProtocol): Relay object controlling the heating element (a `ProtectedRelay` around a GPIO `Relay` on the Pi).
+        _sampler (TemperatureSampler): Sampler shared between zones, providing cached sensor readings.
+        _sensor_id (str): The sensor this thermostat reads from the sampler. None means the first sensor found.
         _target_temperature_celcius (float): Desired temperature in Celsius. Defaults to 20.0°C.
-        _hysteresis (float): Temperature leeway in determining when to activate/deactivate the relay. Set to 0.5°C.
+        _strategy (ControlStrategy): Decides when to activate/deactivate the relay. Defaults to bang-bang control with a 0.5°C hysteresis.
+        _control_interval (float): Seconds between control loop checks without a tick scheduler. Defaults to 5 seconds.
+        _tick_scheduler (AdaptiveTickScheduler): Chooses the time between checks from the distance to the next switching threshold, if set.
+        _zone (int): The zone identifier included in published events.
+        _event_bus (EventBus): Where temperature samples, control decisions, relay switches and target and mode changes are published, if set.
 
     Methods:
         set_target_temperature_celcius(temperature): Sets a new target temperature.
         start(): Starts the control loop in an asynchronous task to monitor and control temperature.
         stop(): Terminates the thermostat control loop if it's running.
-        register_for_temperature_did_change_notification(callback): Registers a callback to be invoked with the latest temperature reading.
-        start_monitoring_current_temperature(): If you've registed for notifcations, this starts the observation process for current temperature.
+        start_monitoring_current_temperature(): Starts publishing a `TemperatureSampled` event every 10 seconds (up to a minute for idle zones).
         shutdown(): Performs cleanup actions, particularly for GPIO resources used by the relay. Once shutdown has been called, you cannot restart.
     """
     
     # Initialization
 
-    def __init__(self, relay: Relay, target_temperature_celcius: float = 20.0):
+    def __init__(self, relay: RelayProtocol, target_temperature_celcius: float = 20.0, sampler: TemperatureSampler = None, sensor_id: str = None, strategy: ControlStrategy = None, control_interval: float = 5.0, zone: int = None, event_bus: EventBus = None, tick_scheduler: AdaptiveTickScheduler = None):
         self._logger = logging.getLogger(__name__)
         self._heating_relay = relay
+        self._sensor_id = sensor_id
+        self._sampler = sampler if sampler is not None else TemperatureSampler(read_temp, sensor_ids=[sensor_id])
         self._target_temperature_celcius = target_temperature_celcius
-        self._hysteresis = 0.5
-        self._temperature_did_change_notification = None
+        self._strategy = strategy if strategy is not None else HysteresisStrategy(hysteresis=0.5)
+        self._control_interval = control_interval
+        self._zone = zone
+        self._event_bus = event_bus
+        self._tick_scheduler = tick_scheduler
+        self._next_interval = control_interval
         self._control_loop_task = None
         self._temperature_monitor_task = None
     
     # Public Properties  
       
-    async def current_temperature_celcius(self):
-        current_temperature = await read_temp()
+    async def current_temperature_celcius(self, max_age: float = 5.0):
+        """The current temperature, using the sampler's cached reading if it's no older than `max_age` seconds."""
+        current_temperature = await self._sampler.read(self._sensor_id, max_age=max_age)
         return current_temperature.celcius
     
     def target_temperature_celcius(self):
@@ -48,19 +74,22 @@ class Thermostat:
     def is_active(self):
         """Boolean indicating if the relay (and thus the heating element) is active."""
         return self._heating_relay.is_active
+
+    def is_running(self):
+        """Boolean indicating if the control loop is regulating the temperature, i.e. heating is enabled in HomeKit."""
+        return self._control_loop_task is not None and not self._control_loop_task.done()
     
     # Public Methods
     
     def set_target_temperature_celcius(self, temperature):
         self._target_temperature_celcius = temperature
         self._logger.info("Target temperature set to: %s°C", self._target_temperature_celcius)
-
-    def register_for_temperature_did_change_notification(self, callback):
-        self._temperature_did_change_notification = callback
-        self._logger.info("Temperature change notification callback registered.")
+        self._publish(TargetTemperatureChanged(self._zone, temperature))
+        if self._tick_scheduler is not None:
+            self._tick_scheduler.wake() # Act on the new target now rather than after a long sleep.
 
     async def start_monitoring_current_temperature(self):
-        """If you've registered for current temperature notifications, this will start monitoring and notifying of the current temperature every 10 seconds."""
+        """Starts publishing the current temperature, with the target and relay state, every 10 seconds (up to a minute for idle zones)."""
         if self._temperature_monitor_task is None:
             self._temperature_monitor_task = asyncio.create_task(self._temperature_monitor_loop())
             self._logger.info("Temperature monitor loop started.")
@@ -77,6 +106,7 @@ class Thermostat:
         # Start a new control loop task
         self._control_loop_task = asyncio.create_task(self._control_loop())
         self._logger.info("Control loop started.")
+        self._publish(ModeChanged(self._zone, True))
     
     async def stop(self):
         """Stops regulating the temperature."""
@@ -92,8 +122,9 @@ class Thermostat:
             
             self._control_loop_task = None  # Clear the task reference after it's finished
             
-        self._heating_relay.turn_off()
+        self._switch_relay(self._heating_relay.force_off)
         self._logger.info("Thermostat stopped.")
+        self._publish(ModeChanged(self._zone, False))
     
     async def shutdown(self):
         """Shuts down the thermostat by cleaning up the relay and cancelling notification. Once this is called, you can't restart."""
@@ -116,35 +147,100 @@ class Thermostat:
     async def _temperature_monitor_loop(self):
         try:
             while True:
-                current_temperature = await self.current_temperature_celcius()
-                if self._temperature_did_change_notification:
-                    self._temperature_did_change_notification(current_temperature)
-                await asyncio.sleep(10) # Sleep for 10 seconds between checks
+                try:
+                    interval = self._monitor_interval()
+                    current_temperature = await self.current_temperature_celcius(max_age=interval)
+                    self._publish(TemperatureSampled(self._zone, current_temperature, self._target_temperature_celcius, self.is_active(), time.time()))
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # i.e. the sensor hasn't appeared on the bus yet after boot; try again next time.
+                    self._logger.error(f"Unexpected error in temperature monitor loop: {e}")
+                await asyncio.sleep(interval)
         except asyncio.CancelledError:
             self._logger.info("Temperature monitor loop stopped.")
-        except Exception as e:
-            self._logger.error(f"Unexpected error in temperature monitor loop: {e}")
             
     async def _control_loop(self):
+        label = self._sensor_id or 'default'
+        scheduled_time = None
         try:
             while True:  # Keep the loop running indefinitely
-                await self._check_and_control_temperature()
-                await asyncio.sleep(5)  # Sleep for 5 seconds between checks
+                start_time = time.monotonic()
+                if scheduled_time is not None:
+                    CONTROL_TICK_JITTER_SECONDS.observe(max(start_time - scheduled_time, 0.0), label)
+                try:
+                    with CONTROL_TICK_SECONDS.time(label):
+                        await self._check_and_control_temperature()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # Without a reading we can't know the room isn't overheating, so fail safe with the heating off and retry next tick.
+                    self._logger.error(f"Unable to read the temperature, heating held off: {e}")
+                    self._switch_relay(self._heating_relay.force_off)
+                    self._next_interval = self._control_interval
+                scheduled_time = time.monotonic() + self._next_interval
+                if self._tick_scheduler is None:
+                    await asyncio.sleep(self._control_interval)  # Sleep for 5 seconds (by default) between checks
+                else:
+                    CONTROL_TICK_INTERVAL_SECONDS.observe(self._next_interval, label)
+                    if await self._tick_scheduler.sleep(self._next_interval):
+                        scheduled_time = None # Woken early, so the check isn't late.
         except asyncio.CancelledError:
             self._logger.info("Control loop stopped.")
-        except Exception as e:
-            self._logger.error(f"Unexpected error while stopping the control loop: {e}")
                          
     async def _check_and_control_temperature(self):
-        current_temperature = await self.current_temperature_celcius()
-        if not self.is_active() and current_temperature < (self._target_temperature_celcius - self._hysteresis):
-            self._logger.info("Current temperature (%s°C) below target (%s°C). Turning ON.", current_temperature, self._target_temperature_celcius)
-            self._heating_relay.turn_on()
-        elif self.is_active() and current_temperature > (self._target_temperature_celcius + self._hysteresis):
-            self._logger.info("Current temperature (%s°C) above target (%s°C). Turning OFF.", current_temperature, self._target_temperature_celcius)
-            self._heating_relay.turn_off()
+        max_age = self._control_interval if self._tick_scheduler is None else self._tick_scheduler.min_interval
+        current_temperature = await self.current_temperature_celcius(max_age=max_age)
+        reading = self._sampler.latest_reading(self._sensor_id)
+        timestamp = reading.timestamp if reading is not None else time.monotonic()
+        is_active = self.is_active()
+        should_heat = self._strategy.should_heat(current_temperature, self._target_temperature_celcius, is_active, timestamp)
+        self._publish(ControlDecision(self._zone, should_heat, current_temperature, timestamp))
+
+        fields = {'zone': self._zone, 'temperature': current_temperature, 'target': self._target_temperature_celcius}
+        if not is_active and should_heat:
+            if self._switch_relay(self._heating_relay.turn_on):
+                self._logger.info("Current temperature (%s°C) below target (%s°C). Turning ON.", current_temperature, self._target_temperature_celcius, extra=fields)
+            else:
+                # Held by the relay's minimum off time, so this repeats every tick until it's released.
+                self._logger.debug("Current temperature (%s°C) below target (%s°C). Held OFF for the minimum off time.", current_temperature, self._target_temperature_celcius,
+                                   extra={**fields, 'steady_state': (self._zone, 'held_off')})
+        elif is_active and not should_heat:
+            if self._switch_relay(self._heating_relay.turn_off):
+                self._logger.info("Current temperature (%s°C) reached target (%s°C). Turning OFF.", current_temperature, self._target_temperature_celcius, extra=fields)
+            else:
+                self._logger.debug("Current temperature (%s°C) reached target (%s°C). Held ON for the minimum on time.", current_temperature, self._target_temperature_celcius,
+                                   extra={**fields, 'steady_state': (self._zone, 'held_on')})
         else:
-            if self.is_active():
-                self._logger.info(f"Heating is ON, current temperature ({current_temperature}°C) is approaching the target ({self._target_temperature_celcius}°C).")
+            # Logged every tick while nothing changes, so these are rate limited (see `structured_logging.py`).
+            if is_active:
+                self._logger.info("Heating is ON, current temperature (%s°C) is approaching the target (%s°C).", current_temperature, self._target_temperature_celcius,
+                                  extra={**fields, 'steady_state': (self._zone, 'heating')})
             else:
-                self._logger.info(f"Heating is OFF, current temperature ({current_temperature}°C) is above the lower threshold ({self._target_temperature_celcius - self._hysteresis}°C). No action required.")
\ No newline at end of file
+                self._logger.info("Heating is OFF, current temperature (%s°C) is above the lower threshold (%s°C). No action required.", current_temperature,
+                                  self._target_temperature_celcius - self._strategy.hysteresis, extra={**fields, 'steady_state': (self._zone, 'idle')})
+
+        if self._tick_scheduler is not None:
+            self._next_interval = self._tick_scheduler.next_interval(current_temperature, self._target_temperature_celcius, self._strategy.hysteresis, self.is_active(), timestamp)
+
+    def _monitor_interval(self) -> float:
+        if self._tick_scheduler is None:
+            return MONITOR_INTERVAL
+        interval = self._tick_scheduler.interval if self.is_running() else MAX_MONITOR_INTERVAL
+        return min(max(interval, MONITOR_INTERVAL), MAX_MONITOR_INTERVAL)
+
+    def _switch_relay(self, switch) -> bool:
+        """
+        Calls a relay method, publishing a `RelaySwitched` event if the relay actually changed state (it may be held by its minimum on or off
+        time). Returns whether it changed.
+        """
+        was_active = self.is_active()
+        switch()
+        if self.is_active() == was_active:
+            return False
+        self._publish(RelaySwitched(self._zone, not was_active, time.time()))
+        return True
+
+    def _publish(self, event):
+        if self._event_bus is not None:
+            self._event_bus.publish(event)
@@ -0,0 +1,85 @@
+import asyncio
+from .control_strategy import RollingSlope
+
+"""
+Adaptive scheduling of a zone's control loop, so idle zones stop polling the sensors while zones near a switching threshold check often.
+
+After each control decision the next check is set from how far the room is from the temperature at which the relay would next switch, and
+how fast it's moving towards it (the slope of recent readings, or an assumed drift if the room is steady or moving away):
+
+    next check = safety factor * distance to threshold / rate towards it, clamped to [min interval, max interval]
+
+While the relay is off the threshold is target - hysteresis. While it's on, strategies like predictive control can switch off well before
+the room reaches target + hysteresis, so the interval is also capped at the fixed `active_interval` the loop used before. A change of target
+wakes the loop straight away rather than waiting out a long sleep.
+"""
+
+class AdaptiveTickScheduler:
+    """
+    Decides how long a zone's control loop sleeps between checks, and wakes it early when its target changes.
+
+    Key Attributes:
+        min_interval (float): The shortest sleep between checks, used at or past a threshold.
+        max_interval (float): The longest sleep between checks, used when the room is far from a threshold.
+        interval (float): The most recently chosen sleep.
+        _active_interval (float): The longest sleep while the relay is on.
+        _safety_factor (float): The fraction of the predicted time to reach a threshold to sleep for.
+        _drift_per_second (float): The rate assumed when the room is steady or moving away from the threshold.
+        _slope (RollingSlope): The rate of change of recent readings.
+        _wake (asyncio.Event): Set to end the current sleep early.
+
+    Methods:
+        next_interval(temperature, target, hysteresis, is_active, timestamp): Chooses the sleep before the next check.
+        sleep(interval): Sleeps for `interval` seconds, or until woken. Returns True if woken.
+        wake(): Ends the current sleep, so the next check happens now.
+    """
+    def __init__(self, min_interval: float = 2.0, max_interval: float = 300.0, active_interval: float = 5.0, safety_factor: float = 0.5, drift_per_hour: float = 1.0, slope_window: float = 600):
+        if not 0 < min_interval <= max_interval:
+            raise ValueError("The minimum interval must be positive and no more than the maximum interval.")
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min(max(active_interval, min_interval), max_interval)
+        self._active_interval = active_interval
+        self._safety_factor = safety_factor
+        self._drift_per_second = drift_per_hour / 3600
+        self._slope = RollingSlope(slope_window)
+        self._was_active = None
+        self._wake = asyncio.Event()
+
+    # Public Methods
+
+    def next_interval(self, temperature: float, target: float, hysteresis: float, is_active: bool, timestamp: float) -> float:
+        # Heating and cooling rates don't mix, so start a new window each time the relay switches.
+        if is_active != self._was_active:
+            self._slope.reset()
+            self._was_active = is_active
+        self._slope.add(timestamp, temperature)
+        slope = self._slope.slope
+
+        if is_active:
+            distance, rate, cap = target + hysteresis - temperature, slope, min(self._active_interval, self.max_interval)
+        else:
+            distance, rate, cap = temperature - (target - hysteresis), None if slope is None else -slope, self.max_interval
+
+        if distance <= 0:
+            # Past the threshold but the relay hasn't switched, i.e. held by its minimum on or off time.
+            interval = self.min_interval
+        elif rate is None:
+            # Not enough readings for a slope yet; keep checking at the usual rate until there are.
+            interval = min(self._active_interval, cap)
+        else:
+            interval = self._safety_factor * distance / max(rate, self._drift_per_second)
+        self.interval = min(max(interval, self.min_interval), cap)
+        return self.interval
+
+    async def sleep(self, interval: float) -> bool:
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout=interval)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._wake.clear()
+
+    def wake(self):
+        self._wake.set()
@@ -1,39 +1,247 @@
 import aiohttp
 import asyncio
-import requests
+import bisect
+import logging
+import time
 import os
+from datetime import datetime, timezone
+from typing import Optional
 from dotenv import load_dotenv
+from . import metrics
 
 # Load environment variables from .env file
 load_dotenv()
 api_key = os.getenv("WEATHER_API_KEY")
 location = os.getenv("COORDINATES")
 
-async def get_temperature():
-    try:
-        url = f"https://api.tomorrow.io/v4/timelines?location={location}&fields=temperature&timesteps=current&units=metric&apikey={api_key}"
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                response.raise_for_status()
-                data = await response.json()
-                temperature = data['data']['timelines'][0]['intervals'][0]['values']['temperature']
-                return temperature
-    except aiohttp.ClientError as e:
-        print(f"Error fetching temperature data: {e}")
-        raise  # Re-raise the exception
-    except KeyError as e:
-        print(f"Error parsing temperature data: {e}")
-        raise  # Re-raise the exception
-    except Exception as e:
-        print(f"Unexpected error: {e}")
-        raise  # Re-raise the exception
-    
+TOMORROW_IO_URL = "https://api.tomorrow.io/v4/timelines"
+
+WEATHER_REQUEST_SECONDS = metrics.histogram('thermopi_weather_request_seconds', "Time taken by each weather API request.")
+WEATHER_REQUEST_ERRORS = metrics.counter('thermopi_weather_request_errors_total', "Weather API requests that failed.")
+WEATHER_CACHE_LOOKUPS = metrics.counter('thermopi_weather_cache_lookups_total', "Outdoor temperature lookups by whether the forecast cache was fresh, stale or empty.", labels=('result',))
+
+class WeatherClient:
+    """
+    A long-lived client for outdoor temperature from tomorrow.io.
+
+    One `aiohttp.ClientSession` is kept open so DNS, TLS and connections are reused, and each request fetches the current temperature and the
+    hourly forecast together. The result is cached for `ttl` seconds and "outdoor temperature at time T" is interpolated from the cache.
+    Once the cache is stale its value is still served while a single refresh happens in the background (stale-while-revalidate), and failed
+    requests back off exponentially so we stay under the API's rate limits. If refreshes keep failing the cache isn't served forever: once it's
+older than `max_age`, or the time asked for is past the end of the forecast, there's no outdoor temperature rather than an outdated one.
+
+    Key Attributes:
+        _ttl (float): Seconds the forecast is considered fresh.
+        _max_age (float): Seconds a stale forecast is still served while refreshes fail.
+        _forecast_times (list): Sorted unix timestamps of the cached forecast.
+        _forecast_temperatures (list): Temperatures matching `_forecast_times`.
+        _fetched_at (float): When the cached forecast was fetched.
+        _retry_delay (float): The current backoff, doubling on each failure up to `_max_backoff`.
+
+    Methods:
+        get_temperature(): Returns the current outdoor temperature.
+        temperature_at(when): Returns the forecast outdoor temperature at a `datetime`.
+        forecast(): Returns the cached forecast as a list of (`datetime`, temperature).
+        start(): Starts prefetching the forecast in the background before it goes stale.
+        close(): Stops prefetching and closes the HTTP session.
+    """
+
+    # Initialization
+
+    def __init__(self, api_key: str = api_key, location: str = location, base_url: str = TOMORROW_IO_URL, ttl: float = 900, max_age: float = 10800, max_backoff: float = 3600, clock=time.time):
+        self._logger = logging.getLogger(__name__)
+        self._api_key = api_key
+        self._location = location
+        self._base_url = base_url
+        self._ttl = ttl
+        self._max_age = max_age
+        self._max_backoff = max_backoff
+        self._clock = clock
+        self._session = None
+        self._forecast_times = []
+        self._forecast_temperatures = []
+        self._fetched_at = None
+        self._retry_delay = 0.0
+        self._next_attempt_at = 0.0
+        self._refresh_task = None
+        self._prefetch_task = None
+
+    # Public Methods
+
+    async def get_temperature(self) -> float:
+        return await self.temperature_at(datetime.fromtimestamp(self._clock(), timezone.utc))
+
+    async def temperature_at(self, when: datetime) -> float:
+        """
+        The outdoor temperature at `when`, linearly interpolated between forecast points. Raises `RuntimeError` if the cached forecast is older
+        than `max_age` or ends before `when`, so callers log no outdoor temperature rather than the last one fetched.
+        """
+        await self._ensure_forecast()
+        timestamp = when.timestamp()
+        age = self._clock() - self._fetched_at
+        if age > self._max_age:
+            raise RuntimeError(f"Weather forecast is {age:.0f}s old and couldn't be refreshed.")
+        if timestamp > self._forecast_times[-1]:
+            raise RuntimeError(f"{when:%Y-%m-%d %H:%M} is past the end of the weather forecast.")
+        return self._interpolate(timestamp)
+
+    def cached_temperature(self, when: Optional[datetime] = None) -> Optional[float]:
+        """
+        The outdoor temperature at `when` (now by default) from the cached forecast without fetching, or None if nothing is cached yet, the
+        cache is older than `max_age`, or `when` is past the end of the forecast, so callers planning ahead know they're beyond it rather than
+        getting its last hour.
+        """
+        timestamp = (when or datetime.fromtimestamp(self._clock(), timezone.utc)).timestamp()
+        if self._fetched_at is None or self._clock() - self._fetched_at > self._max_age or timestamp > self._forecast_times[-1]:
+            return None
+        return self._interpolate(timestamp)
+
+    async def forecast(self) -> list:
+        await self._ensure_forecast()
+        return [(datetime.fromtimestamp(timestamp, timezone.utc), temperature) for timestamp, temperature in zip(self._forecast_times, self._forecast_temperatures)]
+
+    async def start(self):
+        """Refreshes the forecast just before it goes stale, so callers are always served from the cache."""
+        if self._prefetch_task is None:
+            self._prefetch_task = asyncio.create_task(self._prefetch_loop())
+
+    async def close(self):
+        for task in (self._prefetch_task, self._refresh_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        self._prefetch_task = None
+        self._refresh_task = None
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    # Private Methods
+
+    def _interpolate(self, timestamp: float) -> float:
+        times = self._forecast_times
+        index = bisect.bisect_left(times, timestamp)
+        if index == 0:
+            return self._forecast_temperatures[0]
+        if index == len(times):
+            return self._forecast_temperatures[-1]
+        start, end = times[index - 1], times[index]
+        fraction = (timestamp - start) / (end - start)
+        return self._forecast_temperatures[index - 1] + fraction * (self._forecast_temperatures[index] - self._forecast_temperatures[index - 1])
+
+    async def _ensure_forecast(self):
+        if self._fetched_at is None:
+            # Nothing cached, so the caller has to wait for the first fetch. Concurrent callers share one request rather than each starting their own.
+            WEATHER_CACHE_LOOKUPS.inc('miss')
+            await self._shared_refresh()
+        elif self._clock() - self._fetched_at >= self._ttl:
+            # Serve the stale forecast and refresh in the background.
+            WEATHER_CACHE_LOOKUPS.inc('stale')
+            self._refresh_in_background()
+        else:
+            WEATHER_CACHE_LOOKUPS.inc('hit')
+
+    def _refresh_in_background(self):
+        if (self._refresh_task is None or self._refresh_task.done()) and self._clock() >= self._next_attempt_at:
+            self._start_refresh()
+
+    async def _shared_refresh(self):
+        # Join the request that's already in flight rather than starting another one.
+        if self._refresh_task is None or self._refresh_task.done():
+            self._start_refresh()
+        await asyncio.shield(self._refresh_task)
+
+    def _start_refresh(self):
+        self._refresh_task = asyncio.ensure_future(self._refresh())
+        # `_refresh` logs its own failures; retrieve the exception so a refresh nobody awaited doesn't warn.
+        self._refresh_task.add_done_callback(lambda task: task.cancelled() or task.exception())
+
+    async def _refresh_quietly(self):
+        try:
+            await self._shared_refresh()
+        except Exception as e:
+            self._logger.error(f"Error refreshing weather forecast: {e}")
+
+    async def _refresh(self):
+        now = self._clock()
+        if now < self._next_attempt_at:
+            raise RuntimeError(f"Weather API backing off for another {self._next_attempt_at - now:.0f}s.")
+
+        try:
+            with WEATHER_REQUEST_SECONDS.time():
+                times, temperatures = await self._fetch_forecast()
+        except Exception as e:
+            WEATHER_REQUEST_ERRORS.inc()
+            self._retry_delay = min(max(self._retry_delay * 2, 30.0), self._max_backoff)
+            if isinstance(e, aiohttp.ClientResponseError) and e.status == 429 and e.headers and e.headers.get('Retry-After', '').isdigit():
+                self._retry_delay = max(self._retry_delay, float(e.headers['Retry-After']))
+            self._next_attempt_at = self._clock() + self._retry_delay
+            self._logger.error(f"Error fetching weather forecast, retrying in {self._retry_delay}s: {e}")
+            raise
+
+        self._forecast_times = times
+        self._forecast_temperatures = temperatures
+        self._fetched_at = self._clock()
+        self._retry_delay = 0.0
+        self._next_attempt_at = 0.0
+
+    async def _fetch_forecast(self):
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+
+        params = {
+            'location': self._location,
+            'fields': 'temperature',
+            'timesteps': 'current,1h',
+            'units': 'metric',
+            'apikey': self._api_key
+        }
+        async with self._session.get(self._base_url, params=params) as response:
+            response.raise_for_status()
+            data = await response.json()
+
+        try:
+            points = {}
+            for timeline in data['data']['timelines']:
+                for interval in timeline['intervals']:
+                    start_time = datetime.fromisoformat(interval['startTime'].replace('Z', '+00:00')).timestamp()
+                    points[start_time] = interval['values']['temperature']
+        except (KeyError, TypeError, ValueError) as e:
+            raise KeyError(f"Error parsing temperature data: {e}")
+
+        if not points:
+            raise KeyError("Error parsing temperature data: no intervals returned.")
+
+        times = sorted(points)
+        return times, [points[timestamp] for timestamp in times]
+
+    async def _prefetch_loop(self):
+        try:
+            while True:
+                if self._fetched_at is None or self._clock() - self._fetched_at >= self._ttl * 0.9:
+                    await self._refresh_quietly()
+                if self._fetched_at is None:
+                    delay = max(self._next_attempt_at - self._clock(), 1.0)
+                else:
+                    delay = max(self._fetched_at + self._ttl * 0.9 - self._clock(), self._next_attempt_at - self._clock(), 1.0)
+                await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            pass
+
 async def main():
-    current_temperature = await get_temperature()
-    if current_temperature is not None:
+    client = WeatherClient()
+    try:
+        current_temperature = await client.get_temperature()
         print(f"The current temperature at {location} is {current_temperature}°C")
-    else:
-        print("Failed to fetch temperature data.")
+        for when, temperature in await client.forecast():
+            print(f"{when:%a %H:%M}: {temperature}°C")
+    except Exception as e:
+        print(f"Failed to fetch temperature data: {e}")
+    finally:
+        await client.close()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
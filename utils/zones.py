@@ -0,0 +1,109 @@
+import inspect
+import json
+import logging
+import os
+from typing import NamedTuple, Optional
+from .control_strategy import STRATEGIES
+
+"""
+The zone registry maps each temperature sensor to the relay channel it controls and the HomeKit accessory it's exposed as.
+
+Zones are configured in a JSON file (`zones.json` by default, or the path in the `ZONES_FILE` environment variable), for example:
+
+[
+    {"zone": 3, "name": "Office Thermostat", "sensor_id": "28-0123456789ab", "relay_pin": 26},
+    {"zone": 1, "name": "Kitchen Thermostat", "sensor_id": "28-0123456789ac", "relay_pin": 20, "strategy": "predictive", "strategy_options": {"coast_time": 2400}}
+]
+
+Each zone can choose its control strategy (see `control_strategy.py`); it defaults to the original hysteresis control. `min_on_time` and
+`min_off_time` (5 minutes each by default) stop the relay switching faster than the boiler should cycle (see `protected_relay.py`). Set
+`optimal_start` to pre-heat a scheduled zone so it reaches each rise in target on time (see `optimal_start.py`). The control loop checks
+the zone every `min_interval` to `max_interval` seconds (2 and 300 by default), more often the closer it is to switching (see
+`tick_scheduler.py`); set both to 5 for the original fixed tick.
+
+If there's no zones file, we fall back to the original single zone setup: the first sensor found driving CH1 as zone 3. The sensor is
+discovered on its first read rather than here, so the thermostat starts even if the 1-Wire bus hasn't appeared yet.
+
+`ZONES_FILE` is read before `.env` is loaded (see `smart_thermostat.py`), so set it in the service's environment rather than `.env`.
+"""
+
+# The BCM pins for CH1-CH3 on the Waveshare relay board (see documentation/relay.md).
+RELAY_CHANNEL_PINS = (26, 20, 21)
+
+DEFAULT_ZONES_FILE = 'zones.json'
+
+class Zone(NamedTuple):
+    zone: int # The zone identifier used when logging to the database.
+    name: str # The HomeKit accessory name.
+    sensor_id: Optional[str] # The 1-Wire ID of the zone's DS18B20, or None for the first sensor found.
+    relay_pin: int # The BCM pin of the relay channel driving the zone's heating.
+    strategy: str = 'hysteresis' # The name of the zone's control strategy.
+    strategy_options: Optional[dict] = None # Options passed to the control strategy, i.e. {"hysteresis": 0.3}.
+    min_on_time: float = 300 # Seconds the relay must stay on before switching off, to stop the boiler short cycling.
+    min_off_time: float = 300 # Seconds the relay must stay off before switching back on.
+    optimal_start: bool = False # Whether to start heating early for scheduled rises in target (see `optimal_start.py`).
+    min_interval: float = 2 # The shortest time between control loop checks, used near a switching threshold.
+    max_interval: float = 300 # The longest time between control loop checks, used when the zone is far from switching.
+
+def default_zones() -> list:
+    return [Zone(zone=3, name="Office Thermostat", sensor_id=None, relay_pin=RELAY_CHANNEL_PINS[0])]
+
+def load_zones(path: Optional[str] = None) -> list:
+    """
+    Loads the zone registry from a JSON file.
+
+    Parameters:
+    path (str): The zones file to load. Defaults to the `ZONES_FILE` environment variable, then `zones.json`.
+
+    Raises:
+    ValueError: If the file is invalid, two zones share a zone number, sensor or relay pin, or a zone has options its strategy doesn't take.
+    """
+    logger = logging.getLogger(__name__)
+    path = path or os.getenv("ZONES_FILE", DEFAULT_ZONES_FILE)
+
+    if not os.path.exists(path):
+        logger.info("No zones file found at %s. Using the default single zone.", path)
+        return default_zones()
+
+    try:
+        with open(path, 'r') as f:
+            zones = [Zone(
+                zone=int(entry['zone']),
+                name=entry['name'],
+                sensor_id=entry.get('sensor_id'),
+                relay_pin=int(entry['relay_pin']),
+                strategy=entry.get('strategy', 'hysteresis'),
+                strategy_options=entry.get('strategy_options'),
+                min_on_time=float(entry.get('min_on_time', Zone._field_defaults['min_on_time'])),
+                min_off_time=float(entry.get('min_off_time', Zone._field_defaults['min_off_time'])),
+                optimal_start=bool(entry.get('optimal_start', False)),
+                min_interval=float(entry.get('min_interval', Zone._field_defaults['min_interval'])),
+                max_interval=float(entry.get('max_interval', Zone._field_defaults['max_interval']))
+            ) for entry in json.load(f)]
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid zones file {path}: {e}")
+
+    _validate_zones(zones)
+    logger.info("Loaded %s zone(s) from %s.", len(zones), path)
+    return zones
+
+def _validate_zones(zones):
+    if not zones:
+        raise ValueError("At least one zone must be configured.")
+    for field in ('zone', 'sensor_id', 'relay_pin'):
+        values = [getattr(zone, field) for zone in zones]
+        if len(values) != len(set(values)):
+            raise ValueError(f"Each zone must have a unique {field}.")
+    for zone in zones:
+        if zone.strategy not in STRATEGIES:
+            raise ValueError(f"Zone {zone.zone} has an unknown control strategy '{zone.strategy}'.")
+        if zone.strategy_options is not None:
+            if not isinstance(zone.strategy_options, dict):
+                raise ValueError(f"Zone {zone.zone} must have strategy_options as an object, i.e. {{\"hysteresis\": 0.3}}.")
+            # Caught when the file is loaded, rather than as a TypeError partway through setting up the zones.
+            accepted = [name for name in inspect.signature(STRATEGIES[zone.strategy]).parameters]
+            unknown = sorted(set(zone.strategy_options) - set(accepted))
+            if unknown:
+                raise ValueError(f"Zone {zone.zone} has unknown {zone.strategy} strategy option(s) {', '.join(unknown)}. Choose from: {', '.join(accepted)}.")
+        if not 0 < zone.min_interval <= zone.max_interval:
+            raise ValueError(f"Zone {zone.zone} must have 0 < min_interval <= max_interval.")